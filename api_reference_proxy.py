@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Main API Reference Data Caching Proxy
+Reverse proxy for the read-mostly reference endpoints of the Main API.
+
+Endpoints such as /api/levels/, /api/meetingpoints/, /api/choices/*,
+/api/faqs/, /api/strings/ and /api/globalsettings/ rarely change but are
+fetched by every probe script and on every app start. This proxy serves them
+from an in-memory cache with:
+
+- a per-endpoint TTL (fresh responses are served directly)
+- stale-while-revalidate (stale responses are served immediately while one
+  background request refreshes them)
+- request coalescing (concurrent misses for the same URL share one upstream call)
+
+Everything else under the prefix is passed straight through to Django.
+
+Per-endpoint hit rates are served at /main-api/__cache_stats and printed when
+the proxy stops.
+
+Usage:
+    python3 api_reference_proxy.py [--port 5061]
+    python3 nocache_server.py --api-proxy      (mounted at /main-api/*)
+
+Point scripts at http://localhost:5061 instead of https://ap.ad4x4.com.
+"""
+
+import argparse
+import hashlib
+import http.server
+import json
+import re
+import socketserver
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+# API Configuration
+MAIN_API = "https://ap.ad4x4.com"
+PROXY_PREFIX = "/main-api"
+STATS_PATH = "/__cache_stats"
+PORT = 5061
+UPSTREAM_TIMEOUT = 30
+
+# (endpoint, path pattern, ttl seconds, stale-while-revalidate seconds)
+CACHE_POLICIES = (
+    ("/api/levels/", re.compile(r"^/api/levels/?$"), 3600, 6 * 3600),
+    ("/api/meetingpoints/", re.compile(r"^/api/meetingpoints/?$"), 3600, 6 * 3600),
+    ("/api/choices/*", re.compile(r"^/api/choices/[^/]+/?$"), 6 * 3600, 24 * 3600),
+    ("/api/faqs/", re.compile(r"^/api/faqs/?$"), 6 * 3600, 24 * 3600),
+    ("/api/strings/", re.compile(r"^/api/strings/?$"), 6 * 3600, 24 * 3600),
+    ("/api/globalsettings/", re.compile(r"^/api/globalsettings/?$"), 900, 3600),
+)
+
+FORWARDED_REQUEST_HEADERS = ("Authorization", "Accept", "Accept-Language", "Content-Type")
+FORWARDED_RESPONSE_HEADERS = ("Content-Type", "Content-Language", "ETag", "Last-Modified")
+
+
+def policy_for(path):
+    """Return (endpoint, ttl, swr) for cacheable paths, otherwise None"""
+    for endpoint, pattern, ttl, swr in CACHE_POLICIES:
+        if pattern.match(path):
+            return endpoint, ttl, swr
+    return None
+
+
+class CacheEntry:
+    __slots__ = ("status", "headers", "body", "fetched_at", "auth_required")
+
+    def __init__(self, status, headers, body, auth_required):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.fetched_at = time.monotonic()
+        self.auth_required = auth_required
+
+    def age(self):
+        return time.monotonic() - self.fetched_at
+
+
+class Flight:
+    """One in-progress upstream call that other requests can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class EndpointStats:
+    __slots__ = ("hits", "stale", "misses", "coalesced", "upstream", "errors")
+
+    def __init__(self):
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream = 0
+        self.errors = 0
+
+    def as_dict(self):
+        served = self.hits + self.stale + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "stale": self.stale,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "upstream_calls": self.upstream,
+            "errors": self.errors,
+            "hit_rate": ((self.hits + self.stale + self.coalesced) / served) if served else 0.0,
+        }
+
+
+class ReferenceDataProxy:
+    """TTL + stale-while-revalidate cache with single-flight upstream calls"""
+
+    def __init__(self, upstream=MAIN_API, prefix=PROXY_PREFIX):
+        self.upstream = upstream.rstrip("/")
+        self.prefix = prefix
+        self._entries = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = defaultdict(EndpointStats)
+
+    def handles(self, path):
+        return path == self.prefix or path.startswith(self.prefix + "/")
+
+    @staticmethod
+    def _cache_key(path, query, headers):
+        # Query order must not split the cache; language does change the body
+        normalized_query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(query, keep_blank_values=True)))
+        language = headers.get("Accept-Language", "")
+        return hashlib.sha1(f"{path}?{normalized_query}|{language}".encode("utf-8")).hexdigest()
+
+    def _fetch(self, method, path_and_query, headers, body=None):
+        """Call the Main API, returns a CacheEntry (even for error statuses)"""
+        request = urllib.request.Request(
+            self.upstream + path_and_query, data=body, headers=headers, method=method
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=UPSTREAM_TIMEOUT) as response:
+                status, response_headers, payload = response.status, dict(response.headers), response.read()
+        except urllib.error.HTTPError as e:
+            status, response_headers, payload = e.code, dict(e.headers), e.read()
+        return CacheEntry(status, response_headers, payload, "Authorization" in headers)
+
+    def _fetch_shared(self, key, endpoint, path_and_query, headers):
+        """
+        Fetch through the single-flight table.
+
+        Returns (entry, leader). Only the first caller for a key talks to the
+        Main API; everyone arriving while it is in flight waits for its result.
+        Authenticated and anonymous callers never share a flight, so nobody
+        gets a body fetched with someone else's credentials (or their 401).
+        """
+        flight_key = (key, "Authorization" in headers)
+        with self._lock:
+            flight = self._flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[flight_key] = Flight()
+
+        if not leader:
+            if not flight.done.wait(UPSTREAM_TIMEOUT + 5):
+                raise TimeoutError(f"Timed out waiting for shared request to {path_and_query}")
+            if flight.error:
+                raise flight.error
+            return flight.entry, False
+
+        try:
+            with self._lock:
+                self._stats[endpoint].upstream += 1
+            entry = self._fetch("GET", path_and_query, headers)
+            if entry.status == 200:
+                with self._lock:
+                    self._entries[key] = entry
+            flight.entry = entry
+            return entry, True
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(flight_key, None)
+            flight.done.set()
+
+    def _revalidate(self, key, endpoint, path_and_query, headers):
+        try:
+            self._fetch_shared(key, endpoint, path_and_query, headers)
+        except Exception as e:
+            with self._lock:
+                self._stats[endpoint].errors += 1
+            print(f"⚠️  Background refresh failed for {path_and_query}: {e}")
+
+    def handle(self, handler, method):
+        """Serve one proxied request on a BaseHTTPRequestHandler"""
+        parsed = urllib.parse.urlsplit(handler.path)
+        upstream_path = parsed.path[len(self.prefix):] or "/"
+        path_and_query = upstream_path + (f"?{parsed.query}" if parsed.query else "")
+        headers = {
+            name: handler.headers[name]
+            for name in FORWARDED_REQUEST_HEADERS
+            if handler.headers.get(name)
+        }
+
+        if upstream_path == STATS_PATH:
+            body = json.dumps(self.report(), indent=2).encode()
+            self._respond(handler, CacheEntry(200, {"Content-Type": "application/json"}, body, False), "BYPASS")
+            return
+
+        policy = policy_for(upstream_path) if method == "GET" else None
+        try:
+            if policy is None:
+                body = None
+                length = int(handler.headers.get("Content-Length") or 0)
+                if length:
+                    body = handler.rfile.read(length)
+                self._respond(handler, self._fetch(method, path_and_query, headers, body), "BYPASS")
+                return
+
+            endpoint, ttl, swr = policy
+            key = self._cache_key(upstream_path, parsed.query, headers)
+            authorized = "Authorization" in headers
+
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and entry.auth_required and not authorized:
+                    entry = None
+                age = entry.age() if entry else None
+                if entry and age < ttl:
+                    self._stats[endpoint].hits += 1
+                    state = "HIT"
+                elif entry and age < ttl + swr:
+                    self._stats[endpoint].stale += 1
+                    state = "STALE"
+                else:
+                    entry = None
+                    state = "MISS"
+
+            if state == "STALE":
+                threading.Thread(
+                    target=self._revalidate, args=(key, endpoint, path_and_query, headers), daemon=True
+                ).start()
+            elif state == "MISS":
+                entry, leader = self._fetch_shared(key, endpoint, path_and_query, headers)
+                with self._lock:
+                    if leader:
+                        self._stats[endpoint].misses += 1
+                    else:
+                        self._stats[endpoint].coalesced += 1
+                        state = "COALESCED"
+
+            self._respond(handler, entry, state)
+
+        except (urllib.error.URLError, OSError) as e:
+            if policy:
+                with self._lock:
+                    self._stats[policy[0]].errors += 1
+            body = json.dumps({"success": False, "error": f"Main API unreachable: {e}"}).encode()
+            self._respond(handler, CacheEntry(502, {"Content-Type": "application/json"}, body, False), "ERROR")
+
+    def _respond(self, handler, entry, cache_state):
+        handler.send_response(entry.status)
+        for name in FORWARDED_RESPONSE_HEADERS:
+            value = entry.headers.get(name)
+            if value:
+                handler.send_header(name, value)
+        handler.send_header("Content-Length", str(len(entry.body)))
+        handler.send_header("X-Reference-Cache", cache_state)
+        if cache_state in ("HIT", "STALE"):
+            handler.send_header("Age", str(int(entry.age())))
+        handler.end_headers()
+        handler.wfile.write(entry.body)
+
+    def report(self):
+        """Per-endpoint hit-rate report"""
+        with self._lock:
+            return {endpoint: stats.as_dict() for endpoint, stats in sorted(self._stats.items())}
+
+    def print_report(self):
+        report = self.report()
+        print("\n" + "=" * 90)
+        print("📊 REFERENCE DATA CACHE REPORT")
+        print("=" * 90)
+        if not report:
+            print("No cacheable requests served")
+            return
+        print(f"{'Endpoint':<32} {'Hits':>6} {'Stale':>6} {'Miss':>6} {'Coal.':>6} {'Upstr.':>7} {'Err':>5} {'Hit %':>7}")
+        print("-" * 90)
+        for endpoint, stats in report.items():
+            print(f"{endpoint:<32} {stats['hits']:>6} {stats['stale']:>6} {stats['misses']:>6} "
+                  f"{stats['coalesced']:>6} {stats['upstream_calls']:>7} {stats['errors']:>5} "
+                  f"{stats['hit_rate'] * 100:>6.1f}%")
+
+
+class ReferenceProxyHandler(http.server.BaseHTTPRequestHandler):
+    """Standalone handler: every path is forwarded, mounted at the root"""
+
+    proxy = None
+
+    def end_headers(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        super().end_headers()
+
+    def do_GET(self):
+        self.proxy.handle(self, "GET")
+
+    def do_POST(self):
+        self.proxy.handle(self, "POST")
+
+    def do_PUT(self):
+        self.proxy.handle(self, "PUT")
+
+    def do_PATCH(self):
+        self.proxy.handle(self, "PATCH")
+
+    def do_DELETE(self):
+        self.proxy.handle(self, "DELETE")
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.end_headers()
+
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Caching proxy for Main API reference data")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--upstream", default=MAIN_API)
+    args = parser.parse_args()
+
+    ReferenceProxyHandler.proxy = ReferenceDataProxy(upstream=args.upstream, prefix="")
+
+    print(f"🚀 Reference data proxy on http://localhost:{args.port}/ -> {args.upstream}")
+    print(f"📊 Stats: http://localhost:{args.port}{STATS_PATH}")
+    print(f"\nPress Ctrl+C to stop the proxy\n")
+
+    with ThreadingTCPServer(("0.0.0.0", args.port), ReferenceProxyHandler) as httpd:
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            ReferenceProxyHandler.proxy.print_report()
+            print("\n👋 Proxy stopped")
+            sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,10 @@ Check Username Storage in Gallery API
 Investigate if Gallery stores user_id or username for creator information
 """
 
-import requests
 import json
 
+from probe_client import client
+
 # Configuration
 MAIN_API_BASE = "https://ap.ad4x4.com"
 GALLERY_API_BASE = "https://media.ad4x4.com"
@@ -16,7 +17,7 @@ PASSWORD = "3213Plugin?"
 def authenticate():
     """Authenticate with both APIs"""
     # Main API
-    response = requests.post(
+    response = client.post(
         f"{MAIN_API_BASE}/api/auth/login/",
         json={"login": USERNAME, "password": PASSWORD}
     )
@@ -28,7 +29,7 @@ def authenticate():
     main_token = response.json().get('token')
     
     # Get profile
-    profile_response = requests.get(
+    profile_response = client.get(
         f"{MAIN_API_BASE}/api/auth/profile/",
         headers={"Authorization": f"Bearer {main_token}"}
     )
@@ -50,7 +51,7 @@ def main():
     
     # Fetch galleries
     print("🔍 Analyzing Gallery Creator Data...\n")
-    response = requests.get(
+    response = client.get(
         f"{GALLERY_API_BASE}/api/galleries?limit=10",
         headers={"Authorization": f"Bearer {gallery_token}"}
     )
@@ -139,5 +140,7 @@ def main():
 🎯 No action needed - system is designed correctly!
     """)
 
+    client.print_metrics()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+OpenAPI Contract Validator
+Checks recorded (or live) Main API responses against the response schemas in
+MAIN-API-DOCUMENTATION.yaml and reports every mismatch per endpoint and field,
+e.g. the `level` object that is really a string (see TYPE_CAST_ERROR_FIX.md).
+
+How it stays fast:
+- The component and response schemas are compiled once into plain Python
+  validator functions (generated source, no per-value schema interpretation).
+  The compiled code object is marshalled to .openapi_cache/ keyed on the spec
+  file's hash, so later runs skip both YAML parsing and code generation.
+- Responses are validated in parallel across cores (multiprocessing); each
+  worker loads the compiled validators from the disk cache.
+
+What is checked: JSON type, nullable, required properties (writeOnly ones are
+skipped), enum values and date / date-time formats. Array positions are
+folded to [] so one bad field in 50 list items is one row in the report.
+
+Inputs are any mix of:
+- response example files ({"name": {"endpoint", "method", "status", "response"}}),
+  e.g. api_response_examples.json
+- JSON lists / JSONL files of such records, or of results_sink records
+  (endpoint, method, status_code, response_data)
+
+Usage:
+    python3 contract_validator.py                                  # api_response_examples.json
+    python3 contract_validator.py api_response_examples.json gallery_api_response_examples.json
+    python3 contract_validator.py --live                           # re-fetch the same endpoints now
+    python3 contract_validator.py --workers 1 --report contract_validation_report.json
+"""
+
+import argparse
+import hashlib
+import json
+import marshal
+import multiprocessing
+import os
+import re
+import sys
+import time
+from collections import OrderedDict, defaultdict
+
+from openapi_diff import DEFAULT_CACHE_DIR, HTTP_METHODS, load_spec
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SPEC = os.path.join(BASE_DIR, "MAIN-API-DOCUMENTATION.yaml")
+DEFAULT_INPUTS = (os.path.join(BASE_DIR, "api_response_examples.json"),)
+DEFAULT_REPORT = os.path.join(BASE_DIR, "contract_validation_report.json")
+CODEGEN_VERSION = 1
+
+# Below this many responses a process pool costs more than it saves
+PARALLEL_THRESHOLD = 64
+
+# API Configuration (live mode)
+MAIN_API = "https://ap.ad4x4.com"
+USERNAME = os.environ.get("AD4X4_USERNAME", "Hani AMJ")
+PASSWORD = os.environ.get("AD4X4_PASSWORD", "")
+
+REF_PREFIX = "#/components/schemas/"
+TYPE_CHECKS = {
+    "integer": "type({v}) is int",
+    "number": "type({v}) in (int, float)",
+    "string": "type({v}) is str",
+    "boolean": "type({v}) is bool",
+    "array": "type({v}) is list",
+    "object": "type({v}) is dict",
+}
+FORMAT_CHECKS = {
+    "date": "_DATE({v})",
+    "date-time": "_DATETIME({v})",
+}
+
+
+# ============================================================================
+# CODE GENERATION
+# ============================================================================
+
+def _json_type(value):
+    if value is None:
+        return "null"
+    return {bool: "boolean", int: "integer", float: "number", str: "string",
+            list: "array", dict: "object"}.get(type(value), type(value).__name__)
+
+
+def _matches(check, value):
+    errors = []
+    check(value, "", errors)
+    return not errors
+
+
+# Globals available to the generated validators
+RUNTIME = {
+    "_MISSING": object(),
+    "_json_type": _json_type,
+    "_matches": _matches,
+    "_DATE": re.compile(r"^\d{4}-\d{2}-\d{2}$").match,
+    "_DATETIME": re.compile(r"^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?$").match,
+}
+
+
+class _ValidatorCompiler:
+    """
+    Turns OpenAPI 3.0 schemas into Python source.
+
+    Every generated function has the signature f(value, path, errors) and
+    appends (field path, kind, expected, actual) tuples to errors. Field paths
+    below the function entry are static suffixes, so nothing is concatenated
+    unless a check fails or a $ref function is called.
+    """
+
+    def __init__(self, schemas):
+        self.schemas = schemas
+        self.lines = []
+        self.names = {}
+        self._anonymous = 0
+
+    def component(self, name):
+        """Function name for a component schema (compiled on first use)"""
+        if name not in self.names:
+            function = f"s_{len(self.names)}"
+            self.names[name] = function
+            schema = self.schemas.get(name)
+            if schema is None:
+                self.lines.extend([f"def {function}(value, path, errors):",
+                                   f"    errors.append((path, 'schema', {name!r}, 'undefined $ref'))", ""])
+            else:
+                self.function(function, schema, label=name)
+        return self.names[name]
+
+    def function(self, function, schema, label=None):
+        body = []
+        self.emit(schema, "value", "", "    ", body, depth=0, label=label)
+        self.lines.append(f"def {function}(value, path, errors):")
+        self.lines.extend(body or ["    pass"])
+        self.lines.append("")
+        return function
+
+    def anonymous(self, schema):
+        self._anonymous += 1
+        return self.function(f"a_{self._anonymous}", schema)
+
+    def emit(self, schema, var, suffix, ind, out, depth, label=None):
+        if not isinstance(schema, dict):
+            return
+        where = f"path + {suffix!r}" if suffix else "path"
+
+        ref = schema.get("$ref")
+        if isinstance(ref, str) and ref.startswith(REF_PREFIX):
+            function = self.component(ref[len(REF_PREFIX):])
+            if schema.get("nullable"):
+                out.append(f"{ind}if {var} is not None:")
+                out.append(f"{ind}    {function}({var}, {where}, errors)")
+            else:
+                out.append(f"{ind}{function}({var}, {where}, errors)")
+            return
+
+        schema_type = schema.get("type")
+        all_of = schema.get("allOf") or []
+        any_of = schema.get("oneOf") or schema.get("anyOf") or []
+        expected = schema_type or (self._ref_label(all_of[0]) if all_of else "value")
+        if label:
+            expected = f"{expected} ({label})"
+
+        # An untyped schema without composition accepts anything, null included
+        if not schema_type and not all_of and not any_of and "enum" not in schema:
+            return
+
+        null_branch = "pass" if (schema.get("nullable") or not schema_type and not all_of and not any_of) \
+            else f"errors.append(({where}, 'null', {expected!r}, 'null'))"
+        out.append(f"{ind}if {var} is None:")
+        out.append(f"{ind}    {null_branch}")
+
+        if schema_type in TYPE_CHECKS:
+            check = TYPE_CHECKS[schema_type].format(v=var)
+            out.append(f"{ind}elif not ({check}):")
+            out.append(f"{ind}    errors.append(({where}, 'type', {expected!r}, _json_type({var})))")
+        if "enum" in schema:
+            allowed = tuple(value for value in schema["enum"] if value is not None)
+            out.append(f"{ind}elif {var} not in {allowed!r}:")
+            out.append(f"{ind}    errors.append(({where}, 'enum', {list(allowed)!r}, repr({var})[:60]))")
+        if schema_type == "string" and schema.get("format") in FORMAT_CHECKS:
+            check = FORMAT_CHECKS[schema["format"]].format(v=var)
+            out.append(f"{ind}elif not {check}:")
+            out.append(f"{ind}    errors.append(({where}, 'format', {schema['format']!r}, repr({var})[:60]))")
+        if any_of:
+            alternatives = ", ".join(self.anonymous(alternative) for alternative in any_of)
+            out.append(f"{ind}elif not any(_matches(check, {var}) for check in ({alternatives},)):")
+            out.append(f"{ind}    errors.append(({where}, 'type', 'oneOf', _json_type({var})))")
+
+        nested = []
+        inner = ind + "    "
+        for part in all_of:
+            self.emit(part, var, suffix, inner, nested, depth)
+        if schema_type == "object" or "properties" in schema:
+            self._emit_object(schema, var, suffix, inner, nested, depth)
+        if schema_type == "array" and isinstance(schema.get("items"), dict):
+            item = f"v{depth}"
+            loop = []
+            self.emit(schema["items"], item, suffix + "[]", inner + "    ", loop, depth + 1)
+            if loop:
+                nested.append(f"{inner}for {item} in {var}:")
+                nested.extend(loop)
+        if nested:
+            out.append(f"{ind}else:")
+            out.extend(nested)
+
+    def _emit_object(self, schema, var, suffix, ind, out, depth):
+        properties = schema.get("properties") or {}
+        for name in schema.get("required") or []:
+            if (properties.get(name) or {}).get("writeOnly"):
+                continue
+            out.append(f"{ind}if {name!r} not in {var}:")
+            out.append(f"{ind}    errors.append((path + {suffix + '.' + name!r}, 'required', "
+                       f"{self._ref_label(properties.get(name) or {})!r}, 'missing'))")
+        value = f"v{depth}"
+        for name, subschema in properties.items():
+            if (subschema or {}).get("writeOnly"):
+                continue
+            checks = []
+            self.emit(subschema, value, f"{suffix}.{name}", ind + "    ", checks, depth + 1)
+            if checks:
+                out.append(f"{ind}{value} = {var}.get({name!r}, _MISSING)")
+                out.append(f"{ind}if {value} is not _MISSING:")
+                out.extend(checks)
+        extra = schema.get("additionalProperties")
+        if isinstance(extra, dict) and extra:
+            checks = []
+            self.emit(extra, value, f"{suffix}.*", ind + "    ", checks, depth + 1)
+            if checks:
+                out.append(f"{ind}for {value} in {var}.values():")
+                out.extend(checks)
+
+    @staticmethod
+    def _ref_label(schema):
+        ref = schema.get("$ref", "")
+        if ref.startswith(REF_PREFIX):
+            return ref[len(REF_PREFIX):]
+        return schema.get("type", "value")
+
+
+def generate_validators(spec):
+    """Return (python source, routes); routes are (METHOD, path template, status, function)"""
+    compiler = _ValidatorCompiler((spec.get("components") or {}).get("schemas") or {})
+    routes = []
+    for template, item in (spec.get("paths") or {}).items():
+        for method, operation in item.items():
+            if method not in HTTP_METHODS:
+                continue
+            for status, response in (operation.get("responses") or {}).items():
+                schema = ((response.get("content") or {}).get("application/json") or {}).get("schema")
+                if schema is None:
+                    continue
+                ref = schema.get("$ref", "")
+                if ref.startswith(REF_PREFIX) and len(schema) == 1:
+                    function = compiler.component(ref[len(REF_PREFIX):])
+                else:
+                    function = compiler.anonymous(schema)
+                routes.append((method.upper(), template, str(status), function))
+    return "\n".join(compiler.lines) + "\n", routes
+
+
+# ============================================================================
+# COMPILED VALIDATOR SET (with disk cache)
+# ============================================================================
+
+class ContractValidator:
+    """Compiled response validators for one spec, plus path-template routing"""
+
+    def __init__(self, code, routes):
+        namespace = dict(RUNTIME)
+        exec(code, namespace)
+        self._functions = {function: namespace[function] for _m, _t, _s, function in routes}
+        self._routes = defaultdict(list)  # method -> [(regex, template, {status: function})]
+        by_template = OrderedDict()
+        for method, template, status, function in routes:
+            by_template.setdefault((method, template), {})[status] = self._functions[function]
+        # Literal paths before parameterized ones (/api/members/leadsearch vs /api/members/{id}/)
+        for (method, template), statuses in sorted(by_template.items(), key=lambda item: item[0][1].count("{")):
+            pattern = re.sub(r"\\\{[^}]+\\\}", "[^/]+", re.escape(template))
+            self._routes[method].append((re.compile(f"^{pattern}$"), template, statuses))
+
+    @classmethod
+    def for_spec(cls, spec_path=DEFAULT_SPEC, cache_dir=DEFAULT_CACHE_DIR):
+        """Load compiled validators from the disk cache, generating them if needed"""
+        with open(spec_path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        tag = f"{CODEGEN_VERSION}-{sys.implementation.cache_tag}-{digest}"
+        cache_path = os.path.join(cache_dir, f"validators-{tag}.marshal") if cache_dir else None
+
+        if cache_path:
+            try:
+                with open(cache_path, "rb") as f:
+                    code, routes = marshal.load(f)
+                return cls(code, routes)
+            except (OSError, EOFError, ValueError, TypeError):
+                pass
+
+        source, routes = generate_validators(load_spec(spec_path, cache_dir))
+        code = compile(source, f"<validators {os.path.basename(spec_path)}>", "exec")
+        if cache_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                marshal.dump((code, routes), f)
+            os.replace(tmp_path, cache_path)
+        return cls(code, routes)
+
+    def route(self, method, path):
+        """(template, {status: validator}) for a concrete request path, or (None, None)"""
+        path = path.split("?", 1)[0]
+        for regex, template, statuses in self._routes.get(method.upper(), ()):
+            if regex.match(path):
+                return template, statuses
+        return None, None
+
+    def validate(self, method, path, status, body):
+        """
+        Validate one response body.
+
+        Returns (template, outcome, errors); outcome is "checked", "no-route"
+        (path not in the spec) or "no-schema" (status not documented).
+        """
+        template, statuses = self.route(method, path)
+        if template is None:
+            return None, "no-route", []
+        check = statuses.get(str(status))
+        if check is None:
+            return template, "no-schema", []
+        errors = []
+        check(body, "", errors)
+        return template, "checked", errors
+
+
+# ============================================================================
+# INPUTS
+# ============================================================================
+
+def _normalize_record(record, source):
+    if not isinstance(record, dict):
+        return None
+    if "response" in record:
+        body, status = record["response"], record.get("status", 200)
+    elif "response_data" in record:
+        body, status = record["response_data"], record.get("status_code", 200)
+    else:
+        return None
+    endpoint = record.get("endpoint") or record.get("url")
+    if not endpoint or not status:
+        return None
+    if "://" in endpoint:
+        endpoint = "/" + endpoint.split("://", 1)[1].split("/", 1)[-1]
+    return {"source": source, "method": (record.get("method") or "GET").upper(),
+            "path": endpoint, "status": status, "body": body}
+
+
+def load_records(paths):
+    """Yield normalized {source, method, path, status, body} records from any supported file"""
+    for path in paths:
+        source = os.path.basename(path)
+        with open(path, "r", encoding="utf-8") as f:
+            head = f.read(1)
+            f.seek(0)
+            if path.endswith(".jsonl"):
+                rows = (json.loads(line) for line in f if line.strip())
+            elif head == "[":
+                rows = json.load(f)
+            else:
+                data = json.load(f)
+                if isinstance(data.get("tests"), list):
+                    rows = data["tests"]
+                else:
+                    rows = list(data.values())
+            for row in rows:
+                record = _normalize_record(row, source)
+                if record is not None:
+                    yield record
+
+
+def fetch_live(records):
+    """Re-fetch each recorded GET endpoint from the Main API and use the live body"""
+    from probe_client import client  # live mode only
+
+    print("🔐 Authenticating with Main API...")
+    response = client.post(f"{MAIN_API}/api/auth/login/",
+                           json={"login": USERNAME, "password": PASSWORD}, timeout=15)
+    if response.status_code != 200:
+        print(f"❌ Authentication failed: {response.status_code}")
+        sys.exit(1)
+    headers = {"Authorization": f"Bearer {response.json().get('token')}"}
+
+    seen = set()
+    for record in records:
+        if record["method"] != "GET" or record["path"] in seen:
+            continue
+        seen.add(record["path"])
+        live = client.get(f"{MAIN_API}{record['path']}", headers=headers, timeout=30)
+        try:
+            body = live.json()
+        except ValueError:
+            continue
+        yield {"source": "live", "method": "GET", "path": record["path"],
+               "status": live.status_code, "body": body}
+
+
+# ============================================================================
+# PARALLEL VALIDATION
+# ============================================================================
+
+_worker_validator = None
+
+
+def _init_worker(spec_path, cache_dir):
+    global _worker_validator
+    _worker_validator = ContractValidator.for_spec(spec_path, cache_dir)
+
+
+def _validate_record(record):
+    template, outcome, errors = _worker_validator.validate(
+        record["method"], record["path"], record["status"], record["body"]
+    )
+    return record["source"], record["method"], record["path"], record["status"], template, outcome, errors
+
+
+def validate_all(records, spec_path=DEFAULT_SPEC, cache_dir=DEFAULT_CACHE_DIR, workers=None):
+    """Validate records (in a process pool when there are enough of them)"""
+    global _worker_validator
+    records = list(records)
+    workers = workers or os.cpu_count() or 1
+    _init_worker(spec_path, cache_dir)  # also makes sure the disk cache exists for the workers
+
+    if workers <= 1 or len(records) < PARALLEL_THRESHOLD:
+        return [_validate_record(record) for record in records]
+
+    chunksize = max(1, len(records) // (workers * 4))
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(spec_path, cache_dir)) as pool:
+        return pool.map(_validate_record, records, chunksize=chunksize)
+
+
+def build_report(results):
+    endpoints = OrderedDict()
+    for source, method, path, status, template, outcome, errors in results:
+        key = f"{method} {template or path}"
+        entry = endpoints.setdefault(key, {"responses": 0, "outcome": outcome, "sources": [],
+                                           "fields": OrderedDict()})
+        entry["responses"] += 1
+        if source not in entry["sources"]:
+            entry["sources"].append(source)
+        if outcome == "checked":
+            entry["outcome"] = "checked"
+        for field, kind, expected, actual in errors:
+            field_key = f"{field or '<body>'} [{kind}]"
+            row = entry["fields"].setdefault(field_key, {"field": field or "<body>", "kind": kind,
+                                                         "expected": expected, "actual": {}, "count": 0})
+            row["count"] += 1
+            row["actual"][actual] = row["actual"].get(actual, 0) + 1
+
+    summary = {
+        "responses": len(results),
+        "checked": sum(1 for r in results if r[5] == "checked"),
+        "with_errors": sum(1 for r in results if r[6]),
+        "no_route": sum(1 for r in results if r[5] == "no-route"),
+        "no_schema": sum(1 for r in results if r[5] == "no-schema"),
+    }
+    for entry in endpoints.values():
+        entry["fields"] = list(entry["fields"].values())
+    return {"summary": summary, "endpoints": endpoints}
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate API responses against the OpenAPI spec")
+    parser.add_argument("inputs", nargs="*", default=list(DEFAULT_INPUTS),
+                        help="Response example / JSONL files (default: api_response_examples.json)")
+    parser.add_argument("--spec", default=DEFAULT_SPEC)
+    parser.add_argument("--live", action="store_true", help="Re-fetch the recorded GET endpoints and validate those")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: all cores)")
+    parser.add_argument("--report", default=DEFAULT_REPORT)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="Recompile the validators")
+    args = parser.parse_args()
+
+    for path in [args.spec] + args.inputs:
+        if not os.path.exists(path):
+            print(f"❌ Not found: {path}")
+            sys.exit(1)
+
+    print("=" * 80)
+    print("OPENAPI CONTRACT VALIDATION")
+    print("=" * 80)
+
+    started = time.perf_counter()
+    records = load_records(args.inputs)
+    if args.live:
+        records = list(fetch_live(list(records)))
+    results = validate_all(records, args.spec, None if args.no_cache else args.cache_dir, args.workers)
+    elapsed = time.perf_counter() - started
+    report = build_report(results)
+
+    for key, entry in report["endpoints"].items():
+        if entry["outcome"] != "checked":
+            print(f"⚪ {key}: {entry['outcome']} ({entry['responses']} response(s))")
+            continue
+        if not entry["fields"]:
+            print(f"✅ {key}: {entry['responses']} response(s) match the spec")
+            continue
+        print(f"❌ {key}: {len(entry['fields'])} mismatching field(s)")
+        for row in sorted(entry["fields"], key=lambda r: -r["count"]):
+            actual = ", ".join(f"{name} x{count}" for name, count in row["actual"].items())
+            print(f"   {row['field']:<45} {row['kind']:<8} expected {row['expected']}, got {actual}")
+
+    summary = report["summary"]
+    print("\n" + "=" * 80)
+    print(f"Responses: {summary['responses']}  Checked: {summary['checked']}  "
+          f"With mismatches: {summary['with_errors']}  Not in spec: {summary['no_route']}  "
+          f"Undocumented status: {summary['no_schema']}")
+    print(f"⏱️  {elapsed * 1000:.0f}ms")
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Report saved to: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Gallery Backup Mirror
+Keeps a local backup of every original photo in the Gallery API, downloading
+only what changed since the last run:
+
+1. Galleries are enumerated like trip_gallery_reconcile.py (admin listing,
+   including soft-deleted galleries, falling back to /api/galleries), and the
+   photos of every gallery via /api/photos/gallery/:galleryId, pages in
+   parallel.
+2. Each photo is diffed against the local manifest by id and fingerprint:
+   the server checksum when the listing (or /api/admin/backup/photos)
+   provides one, otherwise filename + file_size. Unchanged photos whose
+   object is on disk cost no request.
+3. New and changed originals are fetched from /api/photos/:photoId/download
+   concurrently (--concurrency). Bytes go to partial/<photo id>.part; a
+   retry or the next run resumes it with a Range request (If-Range on the
+   ETag, so a changed file restarts from zero; a 416 for a partial file
+   that is already whole discards it and downloads again).
+4. Finished files are hashed (SHA-256, while downloading) and moved with
+   os.replace into the content-addressed store objects/<aa>/<sha256>, so an
+   object is either complete or absent, and identical photos are stored once.
+
+The manifest (<backup dir>/manifest.json, written atomically every
+--save-every downloads and at the end) maps photo id -> sha256, gallery and
+metadata, which is all a restore needs. Photos gone from the server are
+marked removed; --prune deletes objects no photo references anymore. Both
+need the admin listing: the public one hides soft-deleted galleries.
+
+Usage:
+    python3 gallery_backup.py --dest /backups/gallery
+    python3 gallery_backup.py --dest /backups/gallery --galleries gallery-abc123,gallery-def456
+    python3 gallery_backup.py --dest /backups/gallery --verify --prune
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import requests
+
+from probe_client import (DEFAULT_RETRIES, GALLERY_API, MAIN_API, RETRY_STATUSES, AuthenticationError, Index,
+                          ProbeClient, authenticate, call_with_retry, client, load_galleries, stream_pages)
+
+DEFAULT_DEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gallery_backup")
+PHOTO_PAGE_SIZE = 200
+DEFAULT_CONCURRENCY = 8
+DEFAULT_SAVE_EVERY = 50
+CHUNK_SIZE = 256 * 1024
+DOWNLOAD_TIMEOUT = 120
+# Photo fields a server-side checksum may appear under
+CHECKSUM_FIELDS = ("sha256", "checksum", "file_hash", "hash", "md5")
+
+
+def server_checksum(photo):
+    for field in CHECKSUM_FIELDS:
+        if photo.get(field):
+            return f"{field}:{photo[field]}"
+    return None
+
+
+def fingerprint(photo):
+    """What identifies a photo's content version without downloading it"""
+    return server_checksum(photo) or f"{photo.get('filename')}:{photo.get('file_size')}"
+
+
+def sha256_of(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BackupStore:
+    """Content-addressed object store plus manifest under one directory"""
+
+    def __init__(self, root):
+        self.root = root
+        self.objects = os.path.join(root, "objects")
+        self.partial = os.path.join(root, "partial")
+        self.manifest_path = os.path.join(root, "manifest.json")
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.partial, exist_ok=True)
+        self.photos = {}
+        self.galleries = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                data = json.load(f)
+            self.photos = data.get("photos", {})
+            self.galleries = data.get("galleries", {})
+        self._lock = threading.Lock()
+
+    def object_path(self, sha256):
+        return os.path.join(self.objects, sha256[:2], sha256)
+
+    def has_object(self, sha256):
+        return bool(sha256) and os.path.exists(self.object_path(sha256))
+
+    def part_path(self, photo_id):
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(photo_id))
+        return os.path.join(self.partial, f"{safe}.part")
+
+    def commit_object(self, part_path, sha256):
+        """Move a finished download into the store; returns False if the object already existed"""
+        target = self.object_path(sha256)
+        if os.path.exists(target):
+            os.remove(part_path)
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(part_path, target)
+        return True
+
+    def record(self, photo_id, entry):
+        with self._lock:
+            self.photos[photo_id] = entry
+
+    def save(self):
+        with self._lock:
+            data = {"saved_at": datetime.now().isoformat(), "galleries": self.galleries, "photos": self.photos}
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=1, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.manifest_path)
+
+    def prune(self):
+        """Delete objects no live photo references; returns (files, bytes)"""
+        referenced = {entry.get("sha256") for entry in self.photos.values() if not entry.get("removed_at")}
+        files = size = 0
+        for directory, _dirs, names in os.walk(self.objects):
+            for name in names:
+                if name not in referenced:
+                    path = os.path.join(directory, name)
+                    size += os.path.getsize(path)
+                    os.remove(path)
+                    files += 1
+        return files, size
+
+
+# ============================================================================
+# ENUMERATION
+# ============================================================================
+
+def list_photos(gallery_url, headers, gallery_id, pool):
+    url = f"{gallery_url}/api/photos/gallery/{gallery_id}"
+
+    def fetch_page(page):
+        response = call_with_retry("GET", url, headers=headers,
+                                   params={"page": page, "limit": PHOTO_PAGE_SIZE, "sort_by": "oldest"})
+        if response.status_code != 200:
+            raise RuntimeError(f"photos of {gallery_id} page {page}: {response.status_code}")
+        return response.json()
+
+    def page_count(data):
+        pagination = data.get("pagination") or {}
+        return pagination.get("total_pages") or math.ceil((pagination.get("total") or 0) / PHOTO_PAGE_SIZE)
+
+    photos = []
+    for data in stream_pages(fetch_page, page_count, pool):
+        photos.extend(data.get("photos", []))
+    return photos
+
+
+def backup_checksums(gallery_url, headers):
+    """photo id -> checksum from /api/admin/backup/photos, when it lists any"""
+    response = call_with_retry("GET", f"{gallery_url}/api/admin/backup/photos", headers=headers)
+    if response.status_code != 200:
+        return {}
+    data = response.json()
+    listed = data.get("photos") if isinstance(data, dict) else data
+    if not isinstance(listed, list):
+        return {}
+    return {str(photo["id"]): server_checksum(photo) for photo in listed
+            if isinstance(photo, dict) and photo.get("id") and server_checksum(photo)}
+
+
+# ============================================================================
+# DOWNLOAD
+# ============================================================================
+
+class Downloader:
+    """Resumable Range downloads into the store, shared by all workers"""
+
+    def __init__(self, gallery_url, headers, store):
+        self.gallery_url = gallery_url
+        self.headers = headers
+        self.store = store
+        # Every download is a distinct streamed body; nothing to coalesce or memoize
+        self.http = ProbeClient(coalesce=False, memo_ttl=0)
+        self.stats = {"downloaded": 0, "bytes": 0, "resumed_bytes": 0, "deduplicated": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self.stats[key] += value
+
+    def fetch(self, photo):
+        """Download one original; returns its sha256"""
+        photo_id = str(photo["id"])
+        part = self.store.part_path(photo_id)
+        meta_path = part + ".json"
+        url = f"{self.gallery_url}/api/photos/{photo_id}/download"
+        for attempt in range(DEFAULT_RETRIES + 1):
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            headers = dict(self.headers)
+            etag = None
+            if offset and os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                etag = meta.get("etag")
+                if meta.get("fingerprint") == fingerprint(photo):
+                    headers["Range"] = f"bytes={offset}-"
+                    if etag:
+                        headers["If-Range"] = etag
+            try:
+                response = self.http.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT)
+                if response.status_code == 416 and "Range" in headers:
+                    # The partial file is already whole (e.g. a crash before the move): start from zero
+                    response.close()
+                    for path in (part, meta_path):
+                        if os.path.exists(path):
+                            os.remove(path)
+                    headers.pop("Range")
+                    headers.pop("If-Range", None)
+                    response = self.http.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT)
+                if response.status_code in RETRY_STATUSES and attempt < DEFAULT_RETRIES:
+                    response.close()
+                    retry_after = response.headers.get("Retry-After", "")
+                    time.sleep(float(retry_after) if retry_after.isdigit() else min(30, 0.5 * 2 ** attempt))
+                    continue
+                if response.status_code not in (200, 206):
+                    response.close()
+                    raise RuntimeError(f"HTTP {response.status_code}")
+                return self._write(photo, part, meta_path, response)
+            except (requests.exceptions.RequestException, OSError):
+                if attempt == DEFAULT_RETRIES:
+                    raise
+                time.sleep(min(30, 0.5 * 2 ** attempt) * random.uniform(0.8, 1.2))
+        raise RuntimeError("retries exhausted")
+
+    def _write(self, photo, part, meta_path, response):
+        digest = hashlib.sha256()
+        resumed = response.status_code == 206
+        if resumed:
+            # Content-Range must start where our partial file ends, or we start over
+            start = response.headers.get("Content-Range", "").replace("bytes ", "").split("-")[0]
+            if not start.isdigit() or int(start) != os.path.getsize(part):
+                resumed = False
+        if resumed:
+            with open(part, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            self._count(resumed_bytes=os.path.getsize(part))
+        with open(meta_path, "w") as f:
+            json.dump({"etag": response.headers.get("ETag"), "fingerprint": fingerprint(photo)}, f)
+        try:
+            with open(part, "ab" if resumed else "wb") as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    self._count(bytes=len(chunk))
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            response.close()
+        sha256 = digest.hexdigest()
+        if not self.store.commit_object(part, sha256):
+            self._count(deduplicated=1)
+        os.remove(meta_path)
+        self._count(downloaded=1)
+        return sha256
+
+
+# ============================================================================
+# BACKUP
+# ============================================================================
+
+def plan(store, photos, verify):
+    """Split listed photos into (to download, unchanged) against the manifest"""
+    todo, unchanged = [], 0
+    for photo in photos:
+        entry = store.photos.get(str(photo["id"]))
+        current = (entry is not None and not entry.get("removed_at")
+                   and entry.get("fingerprint") == fingerprint(photo)
+                   and store.has_object(entry.get("sha256")))
+        if current and verify and sha256_of(store.object_path(entry["sha256"])) != entry["sha256"]:
+            print(f"   ⚠️  {photo['id']}: object is corrupt, downloading again")
+            os.remove(store.object_path(entry["sha256"]))
+            current = False
+        if current:
+            unchanged += 1
+        else:
+            todo.append(photo)
+    return todo, unchanged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental backup of all Gallery originals")
+    parser.add_argument("--base-url", default=MAIN_API, help="Main API base URL (login)")
+    parser.add_argument("--gallery-url", default=GALLERY_API, help="Gallery API base URL")
+    parser.add_argument("--dest", default=DEFAULT_DEST, help="Backup directory")
+    parser.add_argument("--galleries", help="Comma-separated gallery ids (default: all)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--save-every", type=int, default=DEFAULT_SAVE_EVERY,
+                        help="Save the manifest after this many downloads")
+    parser.add_argument("--verify", action="store_true", help="Re-hash stored objects and refetch corrupt ones")
+    parser.add_argument("--prune", action="store_true", help="Delete objects of photos removed from the server")
+    parser.add_argument("--dry-run", action="store_true", help="Only show what would be downloaded")
+    args = parser.parse_args()
+    gallery_url = args.gallery_url.rstrip("/")
+
+    started = time.monotonic()
+    store = BackupStore(args.dest)
+    complete_listing = False
+    try:
+        headers, _user_id = authenticate(args.base_url.rstrip("/"))
+    except AuthenticationError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print("📚 Listing galleries and photos...")
+    # Gallery listings and their later pages get separate pools, so listings never wait on themselves
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool, \
+            ThreadPoolExecutor(max_workers=args.concurrency) as page_pool:
+        if args.galleries:
+            gallery_ids = [gallery_id.strip() for gallery_id in args.galleries.split(",") if gallery_id.strip()]
+            galleries = {gallery_id: store.galleries.get(gallery_id, {}) for gallery_id in gallery_ids}
+        else:
+            index = Index()
+            load_galleries(gallery_url, headers, index, pool)
+            if index.errors:
+                print(f"❌ {'; '.join(index.errors)}")
+                sys.exit(1)
+            # The public fallback hides soft-deleted galleries, so their photos would look removed
+            complete_listing = index.gallery_source == "/api/admin/content/galleries"
+            if not complete_listing:
+                if args.prune:
+                    print(f"❌ --prune needs the admin gallery listing, only {index.gallery_source} is available")
+                    sys.exit(1)
+                print(f"   ⚠️  Listing from {index.gallery_source}: soft-deleted galleries are hidden, "
+                      f"nothing will be marked removed")
+            galleries = {gallery_id: {"name": gallery.get("name"), "source_trip_id": gallery.get("source_trip_id"),
+                                      "soft_deleted_at": gallery.get("soft_deleted_at")}
+                         for gallery_id, gallery in index.galleries_by_id.items()}
+        checksums = backup_checksums(gallery_url, headers)
+        listings = {pool.submit(list_photos, gallery_url, headers, gallery_id, page_pool): gallery_id
+                    for gallery_id in galleries}
+        photos, failed_listings = [], []
+        for future in as_completed(listings):
+            try:
+                gallery_photos = future.result()
+            except Exception as e:
+                failed_listings.append(listings[future])
+                print(f"   ❌ {e}")
+                continue
+            galleries[listings[future]]["photo_count"] = len(gallery_photos)
+            photos.extend(gallery_photos)
+    for photo in photos:
+        if not server_checksum(photo) and str(photo["id"]) in checksums:
+            photo["checksum"] = checksums[str(photo["id"])].split(":", 1)[1]
+
+    todo, unchanged = plan(store, photos, args.verify)
+    new = sum(1 for photo in todo if str(photo["id"]) not in store.photos)
+    todo_bytes = sum(photo.get("file_size") or 0 for photo in todo)
+    print(f"🖼️  {len(galleries)} galleries, {len(photos)} photos: {unchanged} unchanged, "
+          f"{new} new, {len(todo) - new} changed or missing ({todo_bytes / 1e6:.1f} MB to fetch)")
+    if args.dry_run:
+        return
+
+    store.galleries.update(galleries)
+    downloader = Downloader(gallery_url, headers, store)
+    failures = {}
+    done = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = {pool.submit(downloader.fetch, photo): photo for photo in todo}
+        for future in as_completed(futures):
+            photo = futures[future]
+            try:
+                sha256 = future.result()
+            except Exception as e:
+                failures[str(photo["id"])] = str(e)
+                downloader.stats["failed"] += 1
+                print(f"   ❌ {photo['id']}: {e}")
+                continue
+            store.record(str(photo["id"]), {
+                "gallery_id": photo.get("gallery_id"), "filename": photo.get("filename"),
+                "original_filename": photo.get("original_filename"), "file_size": photo.get("file_size"),
+                "created_at": photo.get("created_at"), "fingerprint": fingerprint(photo), "sha256": sha256,
+                "backed_up_at": datetime.now().isoformat(),
+            })
+            done += 1
+            if done % args.save_every == 0:
+                store.save()
+                print(f"   ... {done}/{len(todo)} downloaded")
+
+    # Photos missing from a complete listing are gone from the server
+    removed = 0
+    if complete_listing and not failed_listings:
+        listed = {str(photo["id"]) for photo in photos}
+        for photo_id, entry in store.photos.items():
+            if photo_id not in listed and not entry.get("removed_at"):
+                entry["removed_at"] = datetime.now().isoformat()
+                removed += 1
+    store.save()
+
+    stats = downloader.stats
+    print("\n" + "=" * 80)
+    print("💾 GALLERY BACKUP")
+    print("=" * 80)
+    print(f"   Downloaded:   {stats['downloaded']} photos, {stats['bytes'] / 1e6:.1f} MB "
+          f"({stats['resumed_bytes'] / 1e6:.1f} MB resumed from partial files)")
+    print(f"   Unchanged:    {unchanged} (no request)")
+    print(f"   Deduplicated: {stats['deduplicated']} (identical content already stored)")
+    print(f"   Removed:      {removed} photos no longer on the server")
+    print(f"   Failed:       {len(failures)} downloads, {len(failed_listings)} gallery listings")
+    if args.prune:
+        files, size = store.prune()
+        print(f"   Pruned:       {files} objects, {size / 1e6:.1f} MB")
+    print(f"   Elapsed:      {time.monotonic() - started:.1f}s")
+    print(f"📁 {args.dest}")
+    client.print_metrics()
+    sys.exit(1 if failures or failed_listings else 0)
+
+
+if __name__ == "__main__":
+    main()
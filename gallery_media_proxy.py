@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""
+Gallery Media Caching Proxy
+Optional reverse-proxy mode for nocache_server.py.
+
+Requests under /gallery-media/* are forwarded to the Gallery API
+(https://media.ad4x4.com). Image responses (thumbnails, full images and
+downloads) are stored in a size-bounded on-disk LRU cache keyed by photo id
+(or filename) and size, so scrolling a web build's gallery grid does not
+refetch the same thumbnails over and over.
+
+When a photo listing (GET /api/photos/gallery/:galleryId) passes through, the
+grid thumbnails of the *next* page are prefetched in the background with the
+caller's Authorization header. Cache statistics are served at
+/gallery-media/__cache_stats.
+
+Media fetched with an Authorization header is cached per user: the token is
+checked against the Gallery API's /api/auth/profile (cached for a few
+minutes) and the entry is keyed by the user id, so it is only served to
+that user. Requests with a token that does not validate neither read nor
+fill per-user entries. Entries expire after --cache-max-age-hours, and a
+rotate or delete (single or batch) passing through the proxy evicts every
+cached size of the photos it names. Images fetched by filename
+(/uploads/<filename>, /thumbs/<size>/<filename>) are evicted too once a
+listing or detail response naming that filename has passed through since the
+proxy started; otherwise they only expire.
+
+Only cached media (HIT / MISS with status 200) may be kept by the browser
+(private, max-age=3600); listings, writes, errors and the stats page are
+sent with no-cache.
+
+Enable it with:
+    python3 nocache_server.py --gallery-proxy [--cache-dir DIR] [--cache-size-mb 512] [--cache-max-age-hours 24]
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# API Configuration
+GALLERY_API = "https://media.ad4x4.com"
+PROXY_PREFIX = "/gallery-media"
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".gallery_media_cache")
+DEFAULT_CACHE_SIZE_MB = 512
+DEFAULT_MAX_AGE_HOURS = 24
+PREFETCH_WORKERS = 4
+STATS_PATH = "/__cache_stats"
+UPSTREAM_TIMEOUT = 30
+PROFILE_PATH = "/api/auth/profile"
+TOKEN_TTL = 300
+INVALID_TOKEN_TTL = 30
+MAX_TOKENS = 1000
+BROWSER_MAX_AGE = 3600  # Cache-Control max-age of media served from / stored in the cache
+
+# Request headers passed through to the Gallery API
+FORWARDED_REQUEST_HEADERS = ("Authorization", "Accept", "Accept-Language", "Content-Type", "Range")
+
+# Response headers passed back to the browser
+FORWARDED_RESPONSE_HEADERS = ("Content-Type", "Content-Disposition", "ETag", "Last-Modified", "Content-Range")
+
+# Cacheable media paths -> (photo key, size)
+CACHEABLE_PATHS = (
+    (re.compile(r"^/api/photos/(?P<key>[^/]+)/thumbnail/(?P<size>grid|card|list)$"), None),
+    (re.compile(r"^/api/photos/(?P<key>[^/]+)/download$"), "full"),
+    (re.compile(r"^/thumbs/(?P<size>grid|card|list)/(?P<key>[^/]+)$"), None),
+    (re.compile(r"^/uploads/(?P<key>[^/]+)$"), "full"),
+)
+
+GALLERY_LISTING_PATH = re.compile(r"^/api/photos/gallery/(?P<gallery_id>[^/]+)$")
+
+# Requests that change a photo's image (see changed_photos)
+ROTATE_PATH = re.compile(r"^/api/photos/(?P<key>[^/]+)/rotate$")
+DELETE_PATH = re.compile(r"^/api/photos/(?P<key>[^/]+)$")
+BATCH_CHANGE_PATH = re.compile(r"^/api/photos/batch/(rotate|delete)$")
+
+
+def cache_key_for(path):
+    """Return (photo_key, size) for cacheable media paths, otherwise None"""
+    for pattern, fixed_size in CACHEABLE_PATHS:
+        match = pattern.match(path)
+        if match:
+            return match.group("key"), fixed_size or match.group("size")
+    return None
+
+
+def changed_photos(method, path, body):
+    """Photo ids whose image a request rotates or deletes"""
+    if BATCH_CHANGE_PATH.match(path):
+        if method != "POST" or not body:
+            return []
+        try:
+            return [str(photo_id) for photo_id in json.loads(body).get("photo_ids") or []]
+        except (ValueError, AttributeError):
+            return []
+    match = ROTATE_PATH.match(path)
+    if match and method in ("POST", "PATCH"):
+        return [match.group("key")]
+    match = DELETE_PATH.match(path)
+    if match and method == "DELETE":
+        return [match.group("key")]
+    return []
+
+
+def photo_stem(key):
+    """Photo id or filename -> the id part ("abc.jpg" and "abc" are the same photo)"""
+    return os.path.splitext(str(key))[0]
+
+
+def photo_aliases(payload):
+    """(photo id, filename) pairs of the photo objects in a JSON response"""
+    try:
+        data = json.loads(payload)
+    except (ValueError, UnicodeDecodeError):
+        return []
+    pairs = []
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, dict):
+            if value.get("id") and isinstance(value.get("filename"), str):
+                pairs.append((str(value["id"]), value["filename"]))
+            stack.extend(item for item in value.values() if isinstance(item, (dict, list)))
+    return pairs
+
+
+class TokenValidator:
+    """Authorization header -> user id, checked against /api/auth/profile and cached briefly"""
+
+    def __init__(self, upstream=GALLERY_API, ttl=TOKEN_TTL, invalid_ttl=INVALID_TOKEN_TTL):
+        self.upstream = upstream.rstrip("/")
+        self.ttl = ttl
+        self.invalid_ttl = invalid_ttl
+        self._tokens = {}  # sha256 of the header -> (expires_at, user id or None)
+        self._lock = threading.Lock()
+
+    def identity(self, authorization):
+        """User id of a valid token, otherwise None"""
+        if not authorization:
+            return None
+        digest = hashlib.sha256(authorization.encode("utf-8")).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._tokens.get(digest)
+            if entry and entry[0] > now:
+                return entry[1]
+        try:
+            identity = self._lookup(authorization)
+        except (urllib.error.URLError, OSError, ValueError):
+            # Upstream unreachable: not validated, but do not remember it as invalid
+            return None
+        with self._lock:
+            if len(self._tokens) >= MAX_TOKENS:
+                self._tokens = {k: v for k, v in self._tokens.items() if v[0] > now}
+            self._tokens[digest] = (now + (self.ttl if identity else self.invalid_ttl), identity)
+        return identity
+
+    def _lookup(self, authorization):
+        request = urllib.request.Request(self.upstream + PROFILE_PATH,
+                                         headers={"Authorization": authorization, "Accept": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=UPSTREAM_TIMEOUT) as response:
+                payload = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code in (401, 403):
+                return None
+            raise
+        user = payload.get("user") or payload.get("data") or payload
+        user_id = user.get("id") if isinstance(user, dict) else None
+        return str(user_id) if user_id is not None else None
+
+
+class MediaDiskCache:
+    """
+    Size-bounded on-disk LRU cache for image bodies.
+
+    Each entry is a body file plus a small JSON sidecar with the content type,
+    the user it was fetched for (None for anonymous fetches) and when it was
+    stored. Recency is tracked in an in-memory OrderedDict and persisted
+    through file mtimes, so the LRU order survives restarts.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_SIZE_MB * 1024 * 1024,
+                 max_age=DEFAULT_MAX_AGE_HOURS * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self._entries = OrderedDict()  # digest -> size in bytes
+        self._stems = {}  # digest -> photo stems it is stored under
+        self._by_photo = {}  # photo stem -> digests
+        self._aliases = {}  # photo id stem -> filename stems seen in listings (in memory only)
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _paths(self, digest):
+        base = os.path.join(self.cache_dir, digest)
+        return base + ".bin", base + ".json"
+
+    @staticmethod
+    def _digest(photo_key, size, identity=None):
+        return hashlib.sha1(f"{photo_key}:{size}:{identity or ''}".encode("utf-8")).hexdigest()
+
+    def _load_index(self):
+        """Rebuild the LRU order and the photo index from the files already on disk"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".bin"):
+                continue
+            digest = name[:-4]
+            body_path, meta_path = self._paths(digest)
+            try:
+                stat = os.stat(body_path)
+                with open(meta_path) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                # Entries from before per-user keys have no stored_at and are dropped too
+                meta = {}
+            if "stored_at" not in meta:
+                for path in (body_path, meta_path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                continue
+            entries.append((stat.st_mtime, digest, stat.st_size, meta))
+
+        for _mtime, digest, size, meta in sorted(entries, key=lambda entry: entry[0]):
+            self._add(digest, size, meta)
+        self._evict()
+
+    def _add(self, digest, size, meta):
+        self.total_bytes -= self._entries.pop(digest, 0)
+        self._entries[digest] = size
+        self.total_bytes += size
+        stems = {photo_stem(key) for key in (meta.get("photo_key"), meta.get("photo_id")) if key}
+        self._stems[digest] = stems
+        for stem in stems:
+            self._by_photo.setdefault(stem, set()).add(digest)
+
+    def get(self, photo_key, size, identity=None):
+        """
+        Return (body, meta) or None.
+
+        The caller's own entry (identity = validated user id) is preferred,
+        then the anonymous one. Entries older than max_age are dropped.
+        """
+        with self._lock:
+            for owner in ((identity, None) if identity else (None,)):
+                digest = self._digest(photo_key, size, owner)
+                if digest not in self._entries:
+                    continue
+                body_path, meta_path = self._paths(digest)
+                try:
+                    with open(meta_path) as f:
+                        meta = json.load(f)
+                    if time.time() - meta["stored_at"] > self.max_age:
+                        self._remove(digest)
+                        continue
+                    with open(body_path, "rb") as f:
+                        body = f.read()
+                    os.utime(body_path)
+                except (OSError, ValueError, KeyError):
+                    self._remove(digest)
+                    continue
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return body, meta
+            self.misses += 1
+            return None
+
+    def contains(self, photo_key, size, identity=None):
+        with self._lock:
+            return self._digest(photo_key, size, identity) in self._entries
+
+    def put(self, photo_key, size, body, content_type, identity=None, photo_id=None):
+        """Store a body atomically and evict least recently used entries"""
+        if len(body) > self.max_bytes:
+            return
+        digest = self._digest(photo_key, size, identity)
+        body_path, meta_path = self._paths(digest)
+        meta = {
+            "photo_key": photo_key,
+            "photo_id": photo_id,
+            "size": size,
+            "content_type": content_type,
+            "identity": identity,
+            "stored_at": time.time(),
+        }
+        with self._lock:
+            tmp_body = f"{body_path}.{threading.get_ident()}.tmp"
+            tmp_meta = f"{meta_path}.{threading.get_ident()}.tmp"
+            with open(tmp_body, "wb") as f:
+                f.write(body)
+            with open(tmp_meta, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, meta_path)
+            os.replace(tmp_body, body_path)
+
+            self._add(digest, len(body), meta)
+            self._evict()
+
+    def alias(self, photo_id, filename):
+        """Remember that filename belongs to photo_id, so /uploads/<filename> entries are invalidated too"""
+        with self._lock:
+            if photo_stem(filename) != photo_stem(photo_id):
+                self._aliases.setdefault(photo_stem(photo_id), set()).add(photo_stem(filename))
+
+    def invalidate(self, photo_ids):
+        """Drop every cached size, user and alias of the given photos; returns how many"""
+        removed = 0
+        with self._lock:
+            for photo_id in photo_ids:
+                stems = {photo_stem(photo_id)} | self._aliases.get(photo_stem(photo_id), set())
+                for stem in stems:
+                    for digest in list(self._by_photo.get(stem, ())):
+                        self._remove(digest)
+                        removed += 1
+            self.invalidated += removed
+        return removed
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._entries:
+            digest = next(iter(self._entries))
+            self._remove(digest)
+
+    def _remove(self, digest):
+        self.total_bytes -= self._entries.pop(digest, 0)
+        for stem in self._stems.pop(digest, ()):
+            digests = self._by_photo.get(stem)
+            if digests:
+                digests.discard(digest)
+                if not digests:
+                    del self._by_photo[stem]
+        for path in self._paths(digest):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "max_age": self.max_age,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidated": self.invalidated,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+class GalleryMediaProxy:
+    """Forwards /gallery-media/* requests and caches image responses"""
+
+    def __init__(self, cache, upstream=GALLERY_API, prefix=PROXY_PREFIX, validator=None):
+        self.cache = cache
+        self.upstream = upstream.rstrip("/")
+        self.prefix = prefix
+        self.validator = validator or TokenValidator(upstream)
+        self._prefetcher = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
+        self._prefetching = set()
+        self._prefetch_lock = threading.Lock()
+
+    def handles(self, path):
+        return path == self.prefix or path.startswith(self.prefix + "/")
+
+    def _fetch(self, method, path_and_query, headers, body=None):
+        """Call the Gallery API, returns (status, headers, body)"""
+        request = urllib.request.Request(
+            self.upstream + path_and_query, data=body, headers=headers, method=method
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=UPSTREAM_TIMEOUT) as response:
+                return response.status, dict(response.headers), response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, dict(e.headers), e.read()
+
+    def handle(self, handler, method):
+        """Serve one proxied request on a BaseHTTPRequestHandler"""
+        parsed = urllib.parse.urlsplit(handler.path)
+        upstream_path = parsed.path[len(self.prefix):] or "/"
+        if upstream_path == STATS_PATH:
+            body = json.dumps(self.cache.stats(), indent=2).encode()
+            self._respond(handler, 200, {"Content-Type": "application/json"}, body, "BYPASS")
+            return
+        path_and_query = upstream_path + (f"?{parsed.query}" if parsed.query else "")
+
+        headers = {
+            name: handler.headers[name]
+            for name in FORWARDED_REQUEST_HEADERS
+            if handler.headers.get(name)
+        }
+        key = cache_key_for(upstream_path) if method == "GET" and "Range" not in headers else None
+        identity = None
+        if key and "Authorization" in headers:
+            identity = self.validator.identity(headers["Authorization"])
+        # A token that does not validate may only read anonymous entries and never fills the cache
+        storable = "Authorization" not in headers or identity is not None
+
+        if key:
+            cached = self.cache.get(key[0], key[1], identity)
+            if cached:
+                body, meta = cached
+                self._respond(handler, 200, {"Content-Type": meta.get("content_type")}, body, "HIT")
+                return
+
+        body = None
+        if method in ("POST", "PUT", "PATCH"):
+            length = int(handler.headers.get("Content-Length") or 0)
+            body = handler.rfile.read(length) if length else None
+
+        try:
+            status, upstream_headers, payload = self._fetch(method, path_and_query, headers, body)
+        except (urllib.error.URLError, OSError) as e:
+            self._respond(handler, 502, {"Content-Type": "application/json"},
+                          json.dumps({"success": False, "error": f"Gallery API unreachable: {e}"}).encode(), "ERROR")
+            return
+
+        changed = changed_photos(method, upstream_path, body)
+        if changed:
+            # Evict even on errors: a failed batch may still have changed some photos
+            self.cache.invalidate(changed)
+
+        if method == "GET" and status == 200 and not key and "json" in (upstream_headers.get("Content-Type") or ""):
+            for photo_id, filename in photo_aliases(payload):
+                self.cache.alias(photo_id, filename)
+
+        if key and status == 200 and storable:
+            self.cache.put(key[0], key[1], payload, upstream_headers.get("Content-Type"), identity)
+
+        self._respond(handler, status, upstream_headers, payload, "MISS" if key else "BYPASS")
+
+        if method == "GET" and status == 200:
+            match = GALLERY_LISTING_PATH.match(upstream_path)
+            if match:
+                self._schedule_prefetch(match.group("gallery_id"), parsed.query, payload, headers)
+
+    def _respond(self, handler, status, headers, body, cache_state):
+        handler.send_response(status)
+        for name in FORWARDED_RESPONSE_HEADERS:
+            value = headers.get(name)
+            if value:
+                handler.send_header(name, value)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.send_header("X-Gallery-Cache", cache_state)
+        if status == 200 and cache_state in ("HIT", "MISS"):
+            handler.send_header("Cache-Control", f"private, max-age={BROWSER_MAX_AGE}")
+        else:
+            handler.send_header("Cache-Control", "no-cache")
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _schedule_prefetch(self, gallery_id, query, payload, headers):
+        """Prefetch grid thumbnails of the next listing page in the background"""
+        try:
+            pagination = json.loads(payload).get("pagination") or {}
+        except (ValueError, AttributeError):
+            return
+        if not pagination.get("has_more"):
+            return
+
+        params = dict(urllib.parse.parse_qsl(query))
+        params["page"] = str(int(pagination.get("page") or params.get("page") or 1) + 1)
+        next_page = f"/api/photos/gallery/{gallery_id}?{urllib.parse.urlencode(params)}"
+
+        identity = None
+        if "Authorization" in headers:
+            identity = self.validator.identity(headers["Authorization"])
+            if identity is None:
+                return
+        with self._prefetch_lock:
+            if (next_page, identity) in self._prefetching:
+                return
+            self._prefetching.add((next_page, identity))
+        self._prefetcher.submit(self._prefetch_page, next_page, headers, identity)
+
+    def _prefetch_page(self, next_page, headers, identity):
+        auth_headers = {k: v for k, v in headers.items() if k in ("Authorization", "Accept")}
+        try:
+            status, _headers, payload = self._fetch("GET", next_page, auth_headers)
+            if status != 200:
+                return
+            photos = json.loads(payload).get("photos") or []
+            for photo in photos:
+                photo_id = photo.get("id")
+                if not photo_id or self.cache.contains(photo_id, "grid", identity):
+                    continue
+                thumb_status, thumb_headers, thumb = self._fetch(
+                    "GET", f"/api/photos/{photo_id}/thumbnail/grid", auth_headers
+                )
+                if thumb_status != 200:
+                    continue
+                # The app also loads /thumbs/grid/{filename} directly, so the
+                # same body is stored under the filename key as well.
+                for key in (photo_id, photo.get("filename")):
+                    if key:
+                        self.cache.put(key, "grid", thumb, thumb_headers.get("Content-Type"), identity,
+                                       photo_id=photo_id)
+        except Exception as e:
+            print(f"⚠️  Prefetch failed for {next_page}: {e}")
+        finally:
+            with self._prefetch_lock:
+                self._prefetching.discard((next_page, identity))
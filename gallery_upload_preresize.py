@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Gallery Upload Pre-Resize Pipeline
+Downscales photos on the client before they are sent to the Gallery API.
+
+Phones hand us 12-50 MB originals, while the Gallery API resizes everything to
+1920/2560/3840 px anyway. This script:
+1. Creates an upload session for the target gallery (with max_resolution)
+2. Resizes + re-encodes every photo in a multiprocessing pool (EXIF kept)
+3. Streams the processed photos into batches that respect max_batch_bytes
+4. Uploads each batch to POST /api/photos/upload as soon as it is full
+
+Usage:
+    python3 gallery_upload_preresize.py <gallery_id> <photo or folder> [...]
+        [--resolution 2560] [--quality 85] [--workers 4] [--dry-run]
+"""
+
+import argparse
+import io
+import mimetypes
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import requests
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is only needed for this script
+    Image = None
+
+# API Configuration
+MAIN_API = "https://ap.ad4x4.com"
+GALLERY_API = "https://media.ad4x4.com"
+
+# Credentials (override with environment variables)
+USERNAME = os.environ.get("AD4X4_USERNAME", "Hani AMJ")
+PASSWORD = os.environ.get("AD4X4_PASSWORD", "")
+
+# Gallery upload limits (see docs/GALLERY-API-DOCUMENTATION.md - Upload System)
+ALLOWED_RESOLUTIONS = (1920, 2560, 3840)
+DEFAULT_RESOLUTION = 2560  # Matches UploadResolution.medium in the app
+DEFAULT_QUALITY = 85
+DEFAULT_MAX_BATCH_BYTES = 95 * 1024 * 1024  # 95MB Cloudflare Free limit
+DEFAULT_MAX_FILES_PER_BATCH = 500
+
+# Multipart framing overhead we reserve per file inside a batch
+MULTIPART_OVERHEAD_BYTES = 1024
+
+SUPPORTED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".tif", ".tiff", ".heic", ".heif"}
+
+
+def authenticate():
+    """Authenticate with Main API (Gallery API accepts the same token)"""
+    print("🔐 Authenticating with Main API...")
+    response = requests.post(
+        f"{MAIN_API}/api/auth/login/",
+        json={"login": USERNAME, "password": PASSWORD},
+        timeout=15
+    )
+
+    if response.status_code == 200:
+        token = response.json().get('token')
+        print(f"✅ Authenticated as {USERNAME}")
+        return token
+
+    print(f"❌ Authentication failed: {response.status_code}")
+    print(f"   Response: {response.text[:200]}")
+    return None
+
+
+def create_upload_session(token, gallery_id, resolution):
+    """Create an upload session and return (session_id, max_batch_bytes, max_files)"""
+    response = requests.post(
+        f"{GALLERY_API}/api/photos/upload/session",
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        },
+        json={"gallery_id": gallery_id, "max_resolution": resolution},
+        timeout=15
+    )
+
+    if response.status_code not in [200, 201]:
+        print(f"❌ Could not create upload session: {response.status_code}")
+        print(f"   Response: {response.text[:200]}")
+        return None, DEFAULT_MAX_BATCH_BYTES, DEFAULT_MAX_FILES_PER_BATCH
+
+    data = response.json()
+    session_id = data.get('session_id')
+    max_batch_bytes = data.get('max_batch_bytes') or DEFAULT_MAX_BATCH_BYTES
+    max_files = data.get('max_files_per_batch') or DEFAULT_MAX_FILES_PER_BATCH
+    print(f"✅ Upload session: {session_id}")
+    print(f"   Max batch: {max_batch_bytes / 1024 / 1024:.0f}MB, {max_files} files")
+    return session_id, max_batch_bytes, max_files
+
+
+def collect_photos(paths):
+    """Expand files and folders into a sorted list of supported photo paths"""
+    photos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _dirs, files in os.walk(path):
+                for name in files:
+                    if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                        photos.append(os.path.join(root, name))
+        elif os.path.isfile(path):
+            photos.append(path)
+        else:
+            print(f"⚠️  Skipping missing path: {path}")
+    return sorted(photos)
+
+
+def resize_photo(job):
+    """
+    Downscale and re-encode a single photo (runs inside a worker process).
+
+    The long edge is capped at max_edge; smaller photos are only re-encoded if
+    that actually makes them smaller. EXIF is carried over as-is; the pixels
+    are not transposed, so the Orientation tag still describes them correctly.
+
+    Returns a dict with the encoded bytes, or the original bytes on failure.
+    """
+    path, max_edge, quality = job
+    original_size = os.path.getsize(path)
+    filename = os.path.basename(path)
+
+    try:
+        with Image.open(path) as img:
+            exif = img.info.get('exif')
+            icc_profile = img.info.get('icc_profile')
+            width, height = img.size
+
+            # Orientation 5-8 means the stored pixels are rotated 90 degrees,
+            # so the displayed long edge is the stored long edge either way.
+            if max(width, height) > max_edge:
+                img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+
+            save_kwargs = {"quality": quality, "optimize": True}
+            if exif:
+                save_kwargs["exif"] = exif
+            if icc_profile:
+                save_kwargs["icc_profile"] = icc_profile
+
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", **save_kwargs)
+            data = buffer.getvalue()
+            new_width, new_height = img.size
+
+        if len(data) >= original_size and max(width, height) <= max_edge:
+            # Already small enough - keep the original file untouched
+            with open(path, 'rb') as f:
+                data = f.read()
+            return {
+                "path": path, "filename": filename, "data": data,
+                "original_size": original_size, "size": len(data),
+                "dimensions": (width, height), "resized": False, "error": None
+            }
+
+        return {
+            "path": path, "filename": os.path.splitext(filename)[0] + ".jpg",
+            "data": data, "original_size": original_size, "size": len(data),
+            "dimensions": (new_width, new_height), "resized": True, "error": None
+        }
+
+    except Exception as e:
+        # Fall back to the original file; the server will still resize it
+        with open(path, 'rb') as f:
+            data = f.read()
+        return {
+            "path": path, "filename": filename, "data": data,
+            "original_size": original_size, "size": len(data),
+            "dimensions": None, "resized": False, "error": str(e)
+        }
+
+
+def iter_batches(processed, max_batch_bytes, max_files):
+    """Group processed photos into batches that fit the session limits"""
+    batch = []
+    batch_bytes = 0
+
+    for item in processed:
+        item_bytes = item["size"] + MULTIPART_OVERHEAD_BYTES
+        if batch and (batch_bytes + item_bytes > max_batch_bytes or len(batch) >= max_files):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(item)
+        batch_bytes += item_bytes
+
+    if batch:
+        yield batch
+
+
+def upload_batch(token, gallery_id, session_id, resolution, batch):
+    """Upload one batch of processed photos, returns (uploaded, failed)"""
+    files = [
+        ("photos", (item["filename"], item["data"],
+                    mimetypes.guess_type(item["filename"])[0] or "application/octet-stream"))
+        for item in batch
+    ]
+    form = {"gallery_id": gallery_id, "resolution": str(resolution)}
+    if session_id:
+        form["session_id"] = session_id
+
+    response = requests.post(
+        f"{GALLERY_API}/api/photos/upload",
+        headers={"Authorization": f"Bearer {token}"},
+        data=form,
+        files=files,
+        timeout=300
+    )
+
+    if response.status_code not in [200, 201]:
+        print(f"   ❌ Batch upload failed: {response.status_code} {response.text[:200]}")
+        return 0, len(batch)
+
+    result = response.json()
+    uploaded = result.get('total_uploaded', len(result.get('uploaded', [])))
+    failed = result.get('total_failed', len(result.get('failed', [])))
+    for failure in result.get('failed', []):
+        print(f"   ⚠️  {failure}")
+    return uploaded, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-resize photos and upload them to a gallery")
+    parser.add_argument("gallery_id", help="Target gallery ID (e.g. gallery-abc123)")
+    parser.add_argument("paths", nargs="+", help="Photo files or folders")
+    parser.add_argument("--resolution", type=int, default=DEFAULT_RESOLUTION, choices=ALLOWED_RESOLUTIONS,
+                        help="Max long edge in pixels (default: %(default)s)")
+    parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY,
+                        help="JPEG quality 1-95 (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2,
+                        help="Resize worker processes (default: CPU count)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Resize and report savings without uploading")
+    args = parser.parse_args()
+
+    if Image is None:
+        print("❌ Pillow is required: pip install Pillow")
+        sys.exit(1)
+
+    print("=" * 70)
+    print("📸 GALLERY UPLOAD PRE-RESIZE PIPELINE")
+    print("=" * 70)
+
+    photos = collect_photos(args.paths)
+    if not photos:
+        print("❌ No photos found")
+        sys.exit(1)
+    print(f"📁 {len(photos)} photos, max {args.resolution}px @ quality {args.quality}, {args.workers} workers")
+
+    token = None
+    session_id = None
+    max_batch_bytes = DEFAULT_MAX_BATCH_BYTES
+    max_files = DEFAULT_MAX_FILES_PER_BATCH
+    if not args.dry_run:
+        token = authenticate()
+        if not token:
+            sys.exit(1)
+        session_id, max_batch_bytes, max_files = create_upload_session(token, args.gallery_id, args.resolution)
+
+    total_original = 0
+    total_sent = 0
+    total_uploaded = 0
+    total_failed = 0
+    started = time.time()
+
+    jobs = [(path, args.resolution, args.quality) for path in photos]
+    with Pool(processes=args.workers) as pool:
+        # imap keeps input order and yields as soon as each photo is done,
+        # so uploads start while later photos are still being resized.
+        processed = pool.imap(resize_photo, jobs, chunksize=1)
+
+        def tracked():
+            nonlocal total_original, total_sent
+            for item in processed:
+                total_original += item["original_size"]
+                total_sent += item["size"]
+                if item["error"]:
+                    print(f"   ⚠️  {item['filename']}: kept original ({item['error']})")
+                yield item
+
+        for index, batch in enumerate(iter_batches(tracked(), max_batch_bytes, max_files), start=1):
+            batch_mb = sum(item["size"] for item in batch) / 1024 / 1024
+            print(f"\n📦 Batch {index}: {len(batch)} photos, {batch_mb:.1f}MB")
+            if args.dry_run:
+                continue
+            uploaded, failed = upload_batch(token, args.gallery_id, session_id, args.resolution, batch)
+            total_uploaded += uploaded
+            total_failed += failed
+            print(f"   ✅ Uploaded {uploaded}, failed {failed}")
+
+    elapsed = time.time() - started
+    saved = total_original - total_sent
+
+    print("\n" + "=" * 70)
+    print("📊 SUMMARY")
+    print("=" * 70)
+    print(f"Photos: {len(photos)}")
+    print(f"Original size: {total_original / 1024 / 1024:.1f}MB")
+    print(f"Sent size: {total_sent / 1024 / 1024:.1f}MB")
+    if total_original:
+        print(f"Saved: {saved / 1024 / 1024:.1f}MB ({saved / total_original * 100:.1f}%)")
+    if not args.dry_run:
+        print(f"Uploaded: {total_uploaded} ✅  Failed: {total_failed} ❌")
+    print(f"Elapsed: {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Capture-and-Amplify Load Replay
+Replays a captured probe traffic sequence at N x speed and M x concurrency
+against staging or a local stand-in server, and reports throughput and
+latency.
+
+1. Capture: run any probe script that goes through the shared client
+   (probe_client.client) with a cassette recording (see probe_vcr.py). Every
+   request is stored with its body, Authorization header, start offset and
+   duration:
+
+       PROBE_VCR=record PROBE_CASSETTE=cassettes/trip_flow.json python3 test_trip_date_sync.py
+
+   Scripts that call requests directly (e.g. create_test_trip.py) record
+   nothing.
+
+2. Amplify: replay it with M virtual users, each running the whole sequence
+   with the original inter-arrival gaps divided by N:
+
+       python3 load_replay.py cassettes/trip_flow.json --target http://localhost:8000 \\
+           --speed 4 --concurrency 20
+
+Each virtual user rewrites identifiers on the fly. Whenever a live response
+returns a different token / trip id / gallery id / photo id than the
+recording did (under a resource-typed key, or the id of the object a POST
+created), later requests of that user get the live value in path segments,
+in query and JSON body values under the same typed keys, and in the
+Authorization header. Other values that merely look alike are left alone.
+The recorded run clock (probe_client.run_clock()) in usernames/emails is
+replaced by a per-user stamp so generated accounts do not collide. A
+request never starts before the previous request of the same user has
+finished, so values produced by a response are known before they are used.
+Redirects are followed, as they were while recording, so the final status is
+compared with the recorded final status.
+
+Cassettes hold redacted secrets (see probe_vcr.py). Redacted tokens are
+swapped for live ones like any other identifier; redacted password fields
+are filled from AD4X4_PASSWORD (the account used against the target).
+
+Production hosts are never targeted: every captured host must be mapped to
+a --target / --map destination.
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict, defaultdict
+
+import requests
+
+from results_history import normalize_endpoint, percentile
+
+PRODUCTION_HOSTS = {"ap.ad4x4.com", "media.ad4x4.com"}
+
+# Resource-typed fields whose values later requests refer to. A generic "id"
+# is only learned from the object a create (POST) returns.
+ID_FIELDS = {"token", "access", "refresh", "trip", "trip_id", "tripId", "trip_ids", "tripIds", "gallery",
+             "gallery_id", "galleryId", "photo_id", "photoId", "photo_ids", "photoIds", "session_id",
+             "sessionId", "upload_session_id"}
+CREATED_CONTAINERS = ("message", "data")  # where create responses nest the new object
+
+DEFAULT_TIMEOUT = 30
+REDACTED_PREFIX = "redacted-"
+PASSWORD = os.environ.get("AD4X4_PASSWORD", "")
+
+
+# ============================================================================
+# CAPTURE LOADING
+# ============================================================================
+
+def load_capture(path):
+    """Interactions of a cassette in start order, with request/response bodies inlined"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        data = json.load(f)
+    bodies = data.get("bodies", {})
+
+    steps = []
+    for interaction in data.get("interactions", []):
+        request, response = interaction["request"], interaction["response"]
+        if "at" not in interaction:
+            print("❌ This cassette was recorded without timing; re-record it to replay it as load")
+            sys.exit(1)
+        request_body = base64.b64decode(bodies.get(request["body"], "")) if request["body"] in bodies else b""
+        steps.append({
+            "method": request["method"],
+            "host_path": request["host_path"],
+            "query": request["query"],
+            "body": request_body,
+            "content_type": request.get("content_type", ""),
+            "authorization": request.get("authorization", ""),
+            "at": interaction["at"],
+            "recorded_status": response["status"],
+            "recorded_body": base64.b64decode(bodies.get(response["body"], "")),
+        })
+    steps.sort(key=lambda step: step["at"])
+    if steps:
+        first = steps[0]["at"]
+        for step in steps:
+            step["at"] -= first
+    return steps, data.get("clock")
+
+
+# ============================================================================
+# IDENTIFIER REWRITING
+# ============================================================================
+
+def _learn(recorded, live, mapping):
+    if isinstance(recorded, (dict, list)) or recorded is None or live is None or isinstance(live, (dict, list)):
+        return
+    if str(recorded) != str(live):
+        mapping[str(recorded)] = str(live)
+
+
+def learn_identifiers(recorded, live, mapping):
+    """Walk recorded and live JSON side by side and map changed typed identifier values.
+
+    Lists are not paired item by item: listings need not come back in the
+    recorded order, so only ids under typed keys of objects are learned.
+    """
+    if not (isinstance(recorded, dict) and isinstance(live, dict)):
+        return
+    for key, value in recorded.items():
+        if key not in live:
+            continue
+        if key in ID_FIELDS:
+            if isinstance(value, list) and isinstance(live[key], list) and len(value) == len(live[key]):
+                for recorded_item, live_item in zip(value, live[key]):
+                    _learn(recorded_item, live_item, mapping)
+            else:
+                _learn(value, live[key], mapping)
+        elif isinstance(value, dict):
+            learn_identifiers(value, live[key], mapping)
+
+
+def learn_created(recorded, live, mapping):
+    """Map the id of the object a create response returned (top level, "message" or "data")"""
+    if not (isinstance(recorded, dict) and isinstance(live, dict)):
+        return
+    for container in CREATED_CONTAINERS:
+        if isinstance(recorded.get(container), dict) and isinstance(live.get(container), dict):
+            recorded, live = recorded[container], live[container]
+            break
+    if "id" in recorded and "id" in live:
+        _learn(recorded["id"], live["id"], mapping)
+
+
+def _map_scalar(value, mapping):
+    if isinstance(value, bool) or value is None or str(value) not in mapping:
+        return value
+    replacement = mapping[str(value)]
+    if isinstance(value, int):
+        try:
+            return int(replacement)
+        except ValueError:
+            return replacement
+    return replacement
+
+
+def _rewrite_value(value, mapping, stamp, key=None):
+    """Map values under typed id keys; swap the run stamp inside any string"""
+    if isinstance(value, dict):
+        return {name: _rewrite_value(item, mapping, stamp, name) for name, item in value.items()}
+    if isinstance(value, list):
+        return [_rewrite_value(item, mapping, stamp, key) for item in value]
+    if key in ID_FIELDS:
+        value = _map_scalar(value, mapping)
+    if isinstance(value, str) and stamp and stamp[0] in value:
+        return value.replace(stamp[0], stamp[1])
+    return value
+
+
+def _fill_passwords(value):
+    """Put the configured password back into redacted password fields"""
+    if isinstance(value, dict):
+        return {key: PASSWORD if "password" in key.lower() and isinstance(item, str)
+                and item.startswith(REDACTED_PREFIX) else _fill_passwords(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_fill_passwords(item) for item in value]
+    return value
+
+
+def rewrite_request(step, mapping, stamp, base_url):
+    """(url, headers, body) of a captured step for one virtual user"""
+    _host, _, path = step["host_path"].partition("/")
+    segments = [mapping.get(segment, segment) for segment in path.split("/")]
+    query = [(key, mapping.get(value, value) if key in ID_FIELDS else value)
+             for key, value in urllib.parse.parse_qsl(step["query"], True)]
+    url = f"{base_url}/{'/'.join(segments)}"
+    if query:
+        url += "?" + urllib.parse.urlencode(query)
+    if stamp:
+        url = url.replace(stamp[0], stamp[1])
+
+    headers = {}
+    if step["content_type"]:
+        headers["Content-Type"] = step["content_type"]
+    if step["authorization"]:
+        scheme, _, credential = step["authorization"].partition(" ")
+        headers["Authorization"] = f"{scheme} {mapping.get(credential, credential)}"
+
+    body = step["body"]
+    if body and "json" in step["content_type"]:
+        try:
+            body = json.dumps(_fill_passwords(_rewrite_value(json.loads(body), mapping, stamp))).encode("utf-8")
+        except ValueError:
+            pass
+    elif body and stamp:
+        body = body.replace(stamp[0].encode("utf-8"), stamp[1].encode("utf-8"))
+    return url, headers, body
+
+
+# ============================================================================
+# REPLAY
+# ============================================================================
+
+class LoadReport:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)  # "METHOD /path/{id}/" -> [latency ms]
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.mismatches = defaultdict(int)
+
+    def add(self, label, latency_ms, status, recorded_status):
+        with self.lock:
+            self.samples[label].append(latency_ms)
+            self.statuses[label][status] += 1
+            if status != recorded_status:
+                self.mismatches[label] += 1
+
+    def error(self, label, error):
+        with self.lock:
+            self.errors[f"{label}: {type(error).__name__}"] += 1
+
+
+def run_virtual_user(user, steps, args, hosts, clock, started_at, report):
+    session = requests.Session()
+    mapping = {}
+    stamp = None
+    if clock:
+        recorded = str(int(clock))
+        stamp = (recorded, f"{int(time.time())}{user:03d}")
+
+    for step in steps:
+        # Original inter-arrival timing, scaled, but never ahead of the previous response
+        delay = started_at + step["at"] / args.speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        host = step["host_path"].split("/", 1)[0]
+        base_url = hosts.get(host) or hosts.get("*")
+        url, headers, body = rewrite_request(step, mapping, stamp, base_url)
+        label = f"{step['method']} {normalize_endpoint(url)}"
+
+        sent = time.perf_counter()
+        try:
+            response = session.request(step["method"], url, headers=headers, data=body or None,
+                                       timeout=args.timeout)
+        except requests.exceptions.RequestException as e:
+            report.error(label, e)
+            continue
+        report.add(label, (time.perf_counter() - sent) * 1000, response.status_code, step["recorded_status"])
+
+        if step["recorded_body"] and "json" in response.headers.get("Content-Type", ""):
+            try:
+                recorded_json, live_json = json.loads(step["recorded_body"]), response.json()
+            except ValueError:
+                continue
+            learn_identifiers(recorded_json, live_json, mapping)
+            if step["method"] == "POST" and 200 <= response.status_code < 300:
+                learn_created(recorded_json, live_json, mapping)
+
+
+def replay(steps, clock, hosts, args):
+    report = LoadReport()
+    started_at = time.monotonic() + 0.05
+    threads = []
+    for user in range(args.concurrency):
+        # Optional ramp-up: spread virtual user starts over --ramp seconds
+        offset = args.ramp * user / args.concurrency if args.ramp else 0.0
+        thread = threading.Thread(target=run_virtual_user, daemon=True,
+                                  args=(user, steps, args, hosts, clock, started_at + offset, report))
+        threads.append(thread)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return report, time.monotonic() - started_at
+
+
+def summarize(report, wall_seconds):
+    endpoints = OrderedDict()
+    all_latencies = []
+    for label in sorted(report.samples, key=lambda name: -len(report.samples[name])):
+        latencies = sorted(report.samples[label])
+        all_latencies.extend(latencies)
+        endpoints[label] = {
+            "requests": len(latencies),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "max_ms": round(latencies[-1], 1),
+            "statuses": dict(report.statuses[label]),
+            "status_mismatches": report.mismatches.get(label, 0),
+        }
+    all_latencies.sort()
+    total = len(all_latencies)
+    return {
+        "requests": total,
+        "errors": sum(report.errors.values()),
+        "wall_seconds": round(wall_seconds, 2),
+        "throughput_rps": round(total / wall_seconds, 1) if wall_seconds else 0.0,
+        "p50_ms": round(percentile(all_latencies, 50), 1) if total else None,
+        "p95_ms": round(percentile(all_latencies, 95), 1) if total else None,
+        "p99_ms": round(percentile(all_latencies, 99), 1) if total else None,
+        "endpoints": endpoints,
+        "error_breakdown": dict(report.errors),
+    }
+
+
+def parse_hosts(args, steps):
+    hosts = {}
+    for item in args.map or []:
+        host, _, target = item.partition("=")
+        hosts[host] = target.rstrip("/")
+    if args.target:
+        hosts["*"] = args.target.rstrip("/")
+
+    for step in steps:
+        host = step["host_path"].split("/", 1)[0]
+        target = hosts.get(host) or hosts.get("*")
+        if not target:
+            print(f"❌ No target for captured host {host} (use --target or --map {host}=URL)")
+            sys.exit(1)
+        if urllib.parse.urlsplit(target).hostname in PRODUCTION_HOSTS:
+            print(f"❌ Refusing to load-test production ({target})")
+            sys.exit(1)
+    return hosts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured probe traffic as amplified load")
+    parser.add_argument("cassette", help="Cassette recorded with PROBE_VCR=record")
+    parser.add_argument("--target", help="Base URL every captured host is sent to (e.g. http://localhost:8000)")
+    parser.add_argument("--map", action="append", metavar="HOST=URL",
+                        help="Per-host target, e.g. media.ad4x4.com=http://localhost:5000 (repeatable)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time compression factor N (default: 1)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Virtual users M (default: 1)")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds over which virtual users start")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--report", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.cassette):
+        print(f"❌ Not found: {args.cassette}")
+        sys.exit(1)
+    if args.speed <= 0 or args.concurrency < 1:
+        print("❌ --speed must be > 0 and --concurrency >= 1")
+        sys.exit(1)
+
+    steps, clock = load_capture(args.cassette)
+    if not steps:
+        print("❌ The cassette has no interactions")
+        sys.exit(1)
+    hosts = parse_hosts(args, steps)
+
+    print("=" * 80)
+    print("LOAD REPLAY")
+    print("=" * 80)
+    print(f"Capture: {args.cassette} ({len(steps)} requests over {steps[-1]['at']:.1f}s)")
+    print(f"Speed: {args.speed}x  Virtual users: {args.concurrency}  Ramp: {args.ramp}s")
+    for host, target in hosts.items():
+        print(f"   {host} -> {target}")
+
+    report, wall_seconds = replay(steps, clock, hosts, args)
+    summary = summarize(report, wall_seconds)
+
+    print(f"\n{'Endpoint':<44} {'N':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'Δstatus':>8}")
+    print("-" * 86)
+    for label, row in summary["endpoints"].items():
+        print(f"{label[:44]:<44} {row['requests']:>6} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+              f"{row['p99_ms']:>8.1f} {row['status_mismatches']:>8}")
+    print("-" * 86)
+    print(f"Requests: {summary['requests']}  Errors: {summary['errors']}  "
+          f"Wall: {summary['wall_seconds']}s  Throughput: {summary['throughput_rps']} req/s")
+    if summary["requests"]:
+        print(f"Latency: p50 {summary['p50_ms']}ms  p95 {summary['p95_ms']}ms  p99 {summary['p99_ms']}ms")
+    for error, count in summary["error_breakdown"].items():
+        print(f"   ❌ {error} x{count}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"📄 Report saved to: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
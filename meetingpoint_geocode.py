@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Meeting Point Reverse-Geocoding Batch Resolver
+Resolves the area name of every /api/meetingpoints/ coordinate through
+/api/geocoding/reverse/ (new_features/here_maps_geocoding) without spending
+geocoder quota on coordinates that were already resolved:
+
+- Coordinates are snapped to a lat/lon grid (--precision decimals, default 4
+  = ~11 m) and each grid cell is geocoded once, however many meeting points
+  share it.
+- Results persist in a local SQLite cache (.geocode_cache.db) keyed by grid
+  cell, with a TTL (--ttl, default 24h like the backend geocoding_cache) and
+  LRU eviction beyond --max-entries.
+- Cache misses are resolved concurrently (--concurrency) under a global
+  token-bucket rate limit (--rate); a 429 pauses every worker.
+- The report shows how many geocoder calls the grid and the cache saved
+  compared to one call per meeting point, for this run and all runs so far.
+
+Results are written to meetingpoint_areas.json.
+
+Usage:
+    python3 meetingpoint_geocode.py
+    python3 meetingpoint_geocode.py --precision 3 --rate 2 --concurrency 4
+    python3 meetingpoint_geocode.py --ttl 168 --max-entries 5000
+    python3 meetingpoint_geocode.py --stats
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from member_harvest import RateLimiter
+from probe_client import MAIN_API, AuthenticationError, ProbeClient, authenticate, fetch_all
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(BASE_DIR, ".geocode_cache.db")
+OUTPUT_PATH = os.path.join(BASE_DIR, "meetingpoint_areas.json")
+
+DEFAULT_PRECISION = 4
+DEFAULT_TTL_HOURS = 24
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_RATE = 5.0
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocode (
+    cell TEXT PRIMARY KEY,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    area TEXT,
+    fields TEXT,
+    resolved_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS geocode_last_used ON geocode (last_used);
+CREATE TABLE IF NOT EXISTS runs (
+    run_at TEXT NOT NULL,
+    points INTEGER,
+    cells INTEGER,
+    cache_hits INTEGER,
+    geocoder_calls INTEGER,
+    failed INTEGER
+);
+"""
+
+
+def grid_cell(lat, lon, precision):
+    """Grid cell key and its (lat, lon); None for missing/invalid coordinates"""
+    try:
+        lat, lon = round(float(lat), precision), round(float(lon), precision)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return f"{lat:.{precision}f},{lon:.{precision}f}", lat, lon
+
+
+class GeocodeCache:
+    """Grid cell -> area, with TTL on reads and LRU eviction on writes"""
+
+    def __init__(self, path=CACHE_PATH, ttl_hours=DEFAULT_TTL_HOURS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.ttl = ttl_hours * 3600
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def lookup(self, cells):
+        """Fresh entries among cells ({cell: result}) and the number of expired ones"""
+        now = time.time()
+        fresh, expired = {}, 0
+        with self._lock:
+            for cell in cells:
+                row = self.db.execute("SELECT area, fields, resolved_at FROM geocode WHERE cell = ?",
+                                      (cell,)).fetchone()
+                if row is None:
+                    continue
+                if now - row[2] > self.ttl:
+                    expired += 1
+                    continue
+                fresh[cell] = {"area": row[0], "fields": json.loads(row[1]) if row[1] else None}
+            self.db.executemany("UPDATE geocode SET last_used = ?, hits = hits + 1 WHERE cell = ?",
+                                [(now, cell) for cell in fresh])
+            self.db.commit()
+        return fresh, expired
+
+    def store(self, cell, lat, lon, result):
+        now = time.time()
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO geocode (cell, latitude, longitude, area, fields, resolved_at, last_used, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (cell, lat, lon, result["area"], json.dumps(result["fields"]) if result["fields"] else None, now, now))
+            self.db.commit()
+
+    def evict(self):
+        """Drop least recently used entries beyond max_entries; returns how many"""
+        with self._lock:
+            excess = self.db.execute("SELECT COUNT(*) FROM geocode").fetchone()[0] - self.max_entries
+            if excess <= 0:
+                return 0
+            self.db.execute("DELETE FROM geocode WHERE cell IN "
+                            "(SELECT cell FROM geocode ORDER BY last_used LIMIT ?)", (excess,))
+            self.db.commit()
+            return excess
+
+    def record_run(self, report):
+        with self._lock:
+            self.db.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?)",
+                            (datetime.now().isoformat(), report["points"], report["cells"],
+                             report["cache_hits"], report["geocoder_calls"], report["failed"]))
+            self.db.commit()
+
+    def lifetime(self):
+        return self.db.execute("SELECT COUNT(*), COALESCE(SUM(points), 0), COALESCE(SUM(cells), 0), "
+                               "COALESCE(SUM(cache_hits), 0), COALESCE(SUM(geocoder_calls), 0) FROM runs").fetchone()
+
+
+class Geocoder:
+    """Rate-limited /api/geocoding/reverse/ calls shared by all workers"""
+
+    def __init__(self, base_url, headers, limiter):
+        self.url = f"{base_url}/api/geocoding/reverse/"
+        self.headers = headers
+        self.limiter = limiter
+        self.http = ProbeClient(coalesce=False, memo_ttl=0)
+        self.calls = 0
+        self.server_cached = 0
+        self._lock = threading.Lock()
+
+    def reverse(self, lat, lon):
+        """{"area", "fields"} for a coordinate; raises on errors after retries"""
+        for attempt in range(DEFAULT_RETRIES + 1):
+            self.limiter.acquire()
+            with self._lock:
+                self.calls += 1
+            try:
+                response = self.http.post(self.url, headers=self.headers,
+                                          json={"latitude": lat, "longitude": lon}, timeout=30)
+            except requests.exceptions.RequestException:
+                if attempt == DEFAULT_RETRIES:
+                    raise
+                time.sleep(min(30, 0.5 * 2 ** attempt) * random.uniform(0.8, 1.2))
+                continue
+            if response.status_code == 429 and attempt < DEFAULT_RETRIES:
+                retry_after = response.headers.get("Retry-After", "")
+                self.limiter.pause(float(retry_after) if retry_after.isdigit() else min(30, 2 ** attempt))
+                continue
+            if response.status_code >= 500 and response.status_code != 503 and attempt < DEFAULT_RETRIES:
+                time.sleep(min(30, 0.5 * 2 ** attempt) * random.uniform(0.8, 1.2))
+                continue
+            break
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:120]}")
+        data = response.json()
+        if data.get("cached"):
+            with self._lock:
+                self.server_cached += 1
+        # success: false with a 200 is an answer too (no address there) and is cached as such
+        return {"area": data.get("area") if data.get("success") else None, "fields": data.get("fields")}
+
+
+# ============================================================================
+# RESOLVE
+# ============================================================================
+
+def resolve(args):
+    base_url = args.base_url.rstrip("/")
+    try:
+        headers, _user_id = authenticate(base_url)
+    except AuthenticationError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    meeting_points = fetch_all(base_url, "/api/meetingpoints/", headers)
+
+    cells = {}  # cell -> (lat, lon)
+    point_cells = {}
+    for point in meeting_points:
+        snapped = grid_cell(point.get("lat"), point.get("lon"), args.precision)
+        if snapped is None:
+            continue
+        cell, lat, lon = snapped
+        cells[cell] = (lat, lon)
+        point_cells[point["id"]] = cell
+    print(f"📍 {len(meeting_points)} meeting points, {len(point_cells)} with coordinates, "
+          f"{len(cells)} grid cells at {args.precision} decimals")
+
+    cache = GeocodeCache(args.cache, args.ttl, args.max_entries)
+    results, expired = cache.lookup(cells) if not args.refresh else ({}, 0)
+    cache_hits = len(results)
+    missing = [cell for cell in cells if cell not in results]
+    print(f"💾 {cache_hits} cells cached, {expired} expired, {len(missing)} to geocode")
+
+    geocoder = Geocoder(base_url, headers, RateLimiter(args.rate))
+    failures = {}
+
+    def work(cell):
+        lat, lon = cells[cell]
+        try:
+            result = geocoder.reverse(lat, lon)
+        except Exception as e:
+            return cell, None, str(e)
+        cache.store(cell, lat, lon, result)
+        return cell, result, None
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for cell, result, error in pool.map(work, missing):
+            if error:
+                failures[cell] = error
+                print(f"   ❌ {cell}: {error}")
+            else:
+                results[cell] = result
+    evicted = cache.evict()
+
+    output = []
+    for point in meeting_points:
+        cell = point_cells.get(point["id"])
+        result = results.get(cell) if cell else None
+        output.append({
+            "id": point["id"],
+            "name": point.get("name"),
+            "lat": point.get("lat"),
+            "lon": point.get("lon"),
+            "cell": cell,
+            "area": result["area"] if result else None,
+            "fields": result["fields"] if result else None,
+        })
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2, ensure_ascii=False)
+
+    report = {
+        "points": len(point_cells),
+        "cells": len(cells),
+        "cache_hits": cache_hits,
+        "geocoder_calls": len(missing),
+        "failed": len(failures),
+    }
+    cache.record_run(report)
+    print_report(report, geocoder, evicted, time.monotonic() - started, cache)
+    print(f"💾 Areas saved to {args.output}")
+    return not failures
+
+
+def print_report(report, geocoder, evicted, elapsed, cache):
+    points, cells, hits, calls = report["points"], report["cells"], report["cache_hits"], report["geocoder_calls"]
+    print("\n" + "=" * 80)
+    print("📊 GEOCODER QUOTA REPORT")
+    print("=" * 80)
+    print(f"   Points with coordinates:  {points}")
+    print(f"   Saved by grid dedup:      {points - cells}  ({points} points -> {cells} cells)")
+    print(f"   Saved by local cache:     {hits}  (hit rate {hits / cells * 100 if cells else 0:.1f}%)")
+    print(f"   Geocoder calls:           {calls}  ({geocoder.calls} requests incl. retries, "
+          f"{report['failed']} failed, {elapsed:.1f}s)")
+    print(f"   Answered from backend cache: {geocoder.server_cached}")
+    print(f"   Quota saved vs 1 call/point: {points - calls} of {points} "
+          f"({(points - calls) / points * 100 if points else 0:.1f}%)")
+    if evicted:
+        print(f"   LRU evicted:              {evicted}")
+    print_lifetime(cache)
+
+
+def print_lifetime(cache):
+    runs, points, cells, hits, calls = cache.lifetime()
+    entries = cache.db.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+    print(f"\n   All runs ({runs}): {points} point lookups, {calls} geocoder calls, "
+          f"{points - calls} saved ({(points - calls) / points * 100 if points else 0:.1f}%), "
+          f"cache hit rate {hits / cells * 100 if cells else 0:.1f}%, {entries} cached cells")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch reverse-geocode meeting points through a local cache")
+    parser.add_argument("--base-url", default=MAIN_API)
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION,
+                        help="Decimals of the lat/lon grid used for deduplication")
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL_HOURS, help="Cache TTL in hours")
+    parser.add_argument("--max-entries", type=int, default=DEFAULT_MAX_ENTRIES, help="LRU cache size")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Geocoder requests per second")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached results")
+    parser.add_argument("--cache", default=CACHE_PATH)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--stats", action="store_true", help="Only print the cache statistics")
+    args = parser.parse_args()
+
+    if args.stats:
+        print_lifetime(GeocodeCache(args.cache, args.ttl, args.max_entries))
+        return
+    sys.exit(0 if resolve(args) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Meeting Point Spatial Index
+Nearest-meeting-point lookups for trip-creation tooling (and a future proxy
+endpoint) instead of taking meeting_points[0] or scanning the whole list.
+
+MeetingPointIndex buckets /api/meetingpoints/ coordinates into a uniform
+lat/lon grid (--cell degrees, default 0.05 = ~5 km):
+
+- nearest(lat, lon, k): searches rings of cells outwards from the query cell
+  and stops once the k-th best haversine distance is closer than anything
+  outside the rings searched so far could be.
+- within(lat, lon, radius_km): visits only the cells overlapping the
+  radius' bounding box and refines them with haversine.
+
+Both return (distance_km, meeting point) pairs sorted by distance, exactly
+what the linear scans (linear_nearest / linear_within) return; the bench
+command checks that on every query and compares their speed.
+
+Usage:
+    python3 meetingpoint_index.py nearest 24.4539 54.3773 -k 5
+    python3 meetingpoint_index.py within 24.4539 54.3773 --radius 25
+    python3 meetingpoint_index.py bench --queries 20000
+    python3 meetingpoint_index.py bench --synthetic 50000 --json meetingpoint_areas.json
+
+As a module:
+    from meetingpoint_index import MeetingPointIndex
+    index = MeetingPointIndex(meeting_points)
+    distance_km, point = index.nearest(24.45, 54.38)[0]
+"""
+
+import argparse
+import heapq
+import json
+import math
+import random
+import sys
+import time
+from collections import defaultdict
+
+from probe_client import MAIN_API
+from results_history import percentile
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+DEFAULT_CELL_DEGREES = 0.05
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def coordinates(point):
+    """(lat, lon) floats of a meeting point, or None (lat/lon are nullable decimal strings)"""
+    try:
+        lat, lon = float(point["lat"]), float(point["lon"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+class MeetingPointIndex:
+    """Uniform lat/lon grid over meeting points with haversine refinement"""
+
+    def __init__(self, meeting_points, cell_degrees=DEFAULT_CELL_DEGREES):
+        self.cell = cell_degrees
+        self.cells = defaultdict(list)  # (row, col) -> [(lat, lon, point)]
+        self.size = 0
+        for point in meeting_points:
+            position = coordinates(point)
+            if position is None:
+                continue
+            self.cells[self._key(*position)].append((position[0], position[1], point))
+            self.size += 1
+        rows = [row for row, _col in self.cells] or [0]
+        cols = [col for _row, col in self.cells] or [0]
+        self.bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def _key(self, lat, lon):
+        return math.floor(lat / self.cell), math.floor(lon / self.cell)
+
+    def __len__(self):
+        return self.size
+
+    def nearest(self, lat, lon, k=1):
+        """The k nearest meeting points as [(distance_km, point)], nearest first"""
+        if not self.size:
+            return []
+        k = min(k, self.size)
+        row, col = self._key(lat, lon)
+        min_row, max_row, min_col, max_col = self.bounds
+        max_ring = max(row - min_row, max_row - row, col - min_col, max_col - col, 0)
+        best = []  # max-heap of (-distance, tiebreak, point)
+        for ring in range(max_ring + 1):
+            for key in self._ring(row, col, ring):
+                for point_lat, point_lon, point in self.cells.get(key, ()):
+                    distance = haversine_km(lat, lon, point_lat, point_lon)
+                    entry = (-distance, -point["id"], point)
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+            if len(best) == k and -best[0][0] <= self._outside_km(lat, lon, row, col, ring):
+                break
+        return sorted(((-distance, point) for distance, _tiebreak, point in best),
+                      key=lambda item: (item[0], item[1]["id"]))
+
+    def within(self, lat, lon, radius_km):
+        """Meeting points within radius_km as [(distance_km, point)], nearest first"""
+        lat_span = radius_km / KM_PER_DEGREE
+        cos_lat = math.cos(math.radians(min(89.9, abs(lat) + lat_span)))
+        lon_span = min(180.0, lat_span / cos_lat)
+        first_row, first_col = self._key(lat - lat_span, lon - lon_span)
+        last_row, last_col = self._key(lat + lat_span, lon + lon_span)
+        found = []
+        if (last_row - first_row + 1) * (last_col - first_col + 1) > len(self.cells):
+            candidates = (entry for entries in self.cells.values() for entry in entries)
+        else:
+            candidates = (entry for r in range(first_row, last_row + 1) for c in range(first_col, last_col + 1)
+                          for entry in self.cells.get((r, c), ()))
+        for point_lat, point_lon, point in candidates:
+            distance = haversine_km(lat, lon, point_lat, point_lon)
+            if distance <= radius_km:
+                found.append((distance, point))
+        found.sort(key=lambda item: (item[0], item[1]["id"]))
+        return found
+
+    @staticmethod
+    def _ring(row, col, ring):
+        if ring == 0:
+            yield row, col
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield row - ring, c
+            yield row + ring, c
+        for r in range(row - ring + 1, row + ring):
+            yield r, col - ring
+            yield r, col + ring
+
+    def _outside_km(self, lat, lon, row, col, ring):
+        """Lower bound on the distance to any point outside the searched rings"""
+        south, north = (row - ring) * self.cell, (row + ring + 1) * self.cell
+        west, east = (col - ring) * self.cell, (col + ring + 1) * self.cell
+        lat_gap = min(lat - south, north - lat)
+        lon_gap = min(lon - west, east - lon)
+        # A longitude gap is shortest at the highest latitude the region reaches
+        cos_lat = math.cos(math.radians(min(89.9, max(abs(south), abs(north)))))
+        return min(lat_gap * KM_PER_DEGREE, lon_gap * KM_PER_DEGREE * cos_lat)
+
+
+# ============================================================================
+# LINEAR BASELINE
+# ============================================================================
+
+def linear_nearest(meeting_points, lat, lon, k=1):
+    scored = []
+    for point in meeting_points:
+        position = coordinates(point)
+        if position is not None:
+            scored.append((haversine_km(lat, lon, *position), point))
+    scored.sort(key=lambda item: (item[0], item[1]["id"]))
+    return scored[:k]
+
+
+def linear_within(meeting_points, lat, lon, radius_km):
+    found = []
+    for point in meeting_points:
+        position = coordinates(point)
+        if position is None:
+            continue
+        distance = haversine_km(lat, lon, *position)
+        if distance <= radius_km:
+            found.append((distance, point))
+    found.sort(key=lambda item: (item[0], item[1]["id"]))
+    return found
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def load_meeting_points(args):
+    if args.json:
+        with open(args.json) as f:
+            data = json.load(f)
+        return data if isinstance(data, list) else data.get("results", [])
+    from probe_client import AuthenticationError, authenticate, fetch_all
+    try:
+        headers, _user_id = authenticate(args.base_url)
+    except AuthenticationError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    return fetch_all(args.base_url, "/api/meetingpoints/", headers)
+
+
+def synthetic_points(meeting_points, count, seed=42):
+    """count fake meeting points scattered around the real ones (or the UAE)"""
+    rng = random.Random(seed)
+    centres = [coordinates(point) for point in meeting_points]
+    centres = [centre for centre in centres if centre] or [(24.45, 54.38), (25.2, 55.27), (24.2, 55.75)]
+    points = []
+    for index in range(count):
+        lat, lon = rng.choice(centres)
+        points.append({"id": 1_000_000 + index, "name": f"synthetic {index}",
+                       "lat": f"{lat + rng.gauss(0, 0.3):.6f}", "lon": f"{lon + rng.gauss(0, 0.3):.6f}"})
+    return points
+
+
+def print_results(results):
+    for distance, point in results:
+        print(f"   {distance:8.2f} km  #{point['id']:<6} {point.get('name')}")
+    if not results:
+        print("   (none)")
+
+
+def timed(queries, run):
+    """Per-query times in microseconds, and the results"""
+    times, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(run(*query))
+        times.append((time.perf_counter() - started) * 1e6)
+    times.sort()
+    return times, results
+
+
+def command_bench(args, meeting_points):
+    if args.synthetic:
+        meeting_points = meeting_points + synthetic_points(meeting_points, args.synthetic)
+    started = time.perf_counter()
+    index = MeetingPointIndex(meeting_points, args.cell)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f"🗺️  {len(index)} points in {len(index.cells)} cells of {args.cell}° (built in {build_ms:.1f}ms)")
+
+    rng = random.Random(7)
+    located = [coordinates(point) for point in meeting_points]
+    located = [position for position in located if position]
+    if not located:
+        print("❌ No meeting points with coordinates")
+        return False
+    queries = [(lat + rng.gauss(0, 0.2), lon + rng.gauss(0, 0.2)) for lat, lon in
+               (rng.choice(located) for _ in range(args.queries))]
+
+    cases = [
+        (f"nearest k={args.k}", lambda lat, lon: index.nearest(lat, lon, args.k),
+         lambda lat, lon: linear_nearest(meeting_points, lat, lon, args.k)),
+        (f"within {args.radius:g} km", lambda lat, lon: index.within(lat, lon, args.radius),
+         lambda lat, lon: linear_within(meeting_points, lat, lon, args.radius)),
+    ]
+    # The linear scan is slow on large sets; compare it on a sample
+    linear_queries = queries[:max(1, min(len(queries), 2_000_000 // max(1, len(index))))]
+
+    print("\n" + "=" * 80)
+    print(f"{'Query':<18} {'Method':<8} {'Queries':>8} {'p50 µs':>10} {'p95 µs':>10} {'p99 µs':>10} {'Speedup':>9}")
+    print("=" * 80)
+    ok = True
+    for label, fast, slow in cases:
+        index_times, index_results = timed(queries, fast)
+        linear_times, linear_results = timed(linear_queries, slow)
+        mismatches = sum(1 for got, expected in zip(index_results, linear_results)
+                         if [p["id"] for _d, p in got] != [p["id"] for _d, p in expected])
+        speedup = percentile(linear_times, 50) / percentile(index_times, 50)
+        for method, times in (("index", index_times), ("linear", linear_times)):
+            print(f"{label:<18} {method:<8} {len(times):>8} {percentile(times, 50):>10.1f} "
+                  f"{percentile(times, 95):>10.1f} {percentile(times, 99):>10.1f} "
+                  f"{(f'{speedup:.1f}x' if method == 'index' else ''):>9}")
+        if mismatches:
+            ok = False
+            print(f"   ❌ {mismatches} of {len(linear_results)} results differ from the linear scan")
+    print("=" * 80)
+    if ok:
+        print("✅ Index results identical to the linear scan")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nearest meeting point queries over a spatial grid index")
+    parser.add_argument("--base-url", default=MAIN_API)
+    parser.add_argument("--json", help="Read meeting points from a JSON file instead of the API")
+    parser.add_argument("--cell", type=float, default=DEFAULT_CELL_DEGREES, help="Grid cell size in degrees")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    nearest = commands.add_parser("nearest", help="k nearest meeting points")
+    nearest.add_argument("lat", type=float)
+    nearest.add_argument("lon", type=float)
+    nearest.add_argument("-k", type=int, default=5)
+
+    within = commands.add_parser("within", help="Meeting points within a radius")
+    within.add_argument("lat", type=float)
+    within.add_argument("lon", type=float)
+    within.add_argument("--radius", type=float, default=25.0, help="Radius in km")
+
+    bench = commands.add_parser("bench", help="Benchmark the index against the linear scan")
+    bench.add_argument("--queries", type=int, default=10000)
+    bench.add_argument("-k", type=int, default=5)
+    bench.add_argument("--radius", type=float, default=25.0, help="Radius in km")
+    bench.add_argument("--synthetic", type=int, default=0, help="Add this many synthetic points")
+
+    args = parser.parse_args()
+    args.base_url = args.base_url.rstrip("/")
+    meeting_points = load_meeting_points(args)
+
+    if args.command == "bench":
+        sys.exit(0 if command_bench(args, meeting_points) else 1)
+    index = MeetingPointIndex(meeting_points, args.cell)
+    print(f"🗺️  {len(index)} meeting points indexed")
+    if args.command == "nearest":
+        print_results(index.nearest(args.lat, args.lon, args.k))
+    else:
+        print_results(index.within(args.lat, args.lon, args.radius))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Parallel Member Activity Harvester
+Fetches the per-member sub-resources the member investigations were built on
+(MEMBER_259_INVESTIGATION_REPORT.md, USER259_TRIP_STATS_FIX.md) for a list or
+range of members at once, instead of one member and one endpoint at a time:
+
+    /api/members/{id}/tripcounts        /api/members/{id}/logbookskills
+    /api/members/{id}/triphistory       /api/members/{id}/feedback
+    /api/members/{id}/logbookentries    /api/members/{id}/upgraderequests
+
+- Worker threads pull (member, resource) jobs from one queue, so calls for
+  different members and resources run concurrently (--concurrency).
+- A global token bucket caps the request rate across all workers (--rate).
+  A 429 pauses the whole bucket for Retry-After, not just one worker.
+- tripcounts is fetched first per member; a 404 there (no such member, e.g.
+  a gap in an id range) skips that member's other resources.
+- Paginated resources are followed to the last page and stored whole.
+- Results stream into SQLite (member_harvest.db) through one writer thread
+  with batched commits. A rerun skips what is already stored, so an
+  interrupted harvest resumes where it stopped (--refresh / --max-age to
+  fetch again).
+
+Usage:
+    python3 member_harvest.py harvest --ids 259,10613
+    python3 member_harvest.py harvest --range 10000-11000 --rate 15 --concurrency 24
+    python3 member_harvest.py harvest --all --resources tripcounts,triphistory
+    python3 member_harvest.py summary
+    python3 member_harvest.py show 259 tripcounts
+"""
+
+import argparse
+import json
+import os
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+from probe_client import MAIN_API, AuthenticationError, ProbeClient, authenticate
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "member_harvest.db")
+
+# Resource -> paginated?  tripcounts comes first: it decides whether the member exists
+RESOURCES = {
+    "tripcounts": False,
+    "triphistory": True,
+    "logbookentries": True,
+    "logbookskills": True,
+    "feedback": True,
+    "upgraderequests": True,
+}
+PAGE_SIZE = 100
+DEFAULT_RATE = 10.0
+DEFAULT_CONCURRENCY = 16
+DEFAULT_RETRIES = 4
+COMMIT_EVERY = 50
+COMMIT_INTERVAL = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS harvest (
+    member_id INTEGER NOT NULL,
+    resource TEXT NOT NULL,
+    status_code INTEGER,
+    item_count INTEGER,
+    payload TEXT,
+    fetched_at TEXT NOT NULL,
+    PRIMARY KEY (member_id, resource)
+);
+CREATE INDEX IF NOT EXISTS harvest_resource ON harvest (resource, status_code);
+"""
+
+
+class RateLimiter:
+    """Token bucket shared by every worker; pause() stops the whole bucket"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate / 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+class HarvestStore:
+    """SQLite store written by a single thread with batched commits"""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self._queue = queue.Queue()
+        self._writer = None
+
+    def done_pairs(self, max_age_hours=None):
+        """(member, resource) pairs that need no new fetch"""
+        query = "SELECT member_id, resource FROM harvest WHERE status_code IN (200, 404)"
+        params = ()
+        if max_age_hours is not None:
+            query += " AND fetched_at >= ?"
+            params = (datetime.fromtimestamp(time.time() - max_age_hours * 3600).isoformat(),)
+        return set(self.db.execute(query, params).fetchall())
+
+    def start(self):
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def put(self, member_id, resource, status_code, items, payload):
+        self._queue.put((member_id, resource, status_code, items,
+                         json.dumps(payload, ensure_ascii=False) if payload is not None else None,
+                         datetime.now().isoformat()))
+
+    def close(self):
+        if self._writer:
+            self._queue.put(None)
+            self._writer.join()
+        self.db.close()
+
+    def _write_loop(self):
+        pending = []
+        last_commit = time.monotonic()
+        while True:
+            try:
+                row = self._queue.get(timeout=COMMIT_INTERVAL)
+            except queue.Empty:
+                row = False
+            if row:
+                pending.append(row)
+            if pending and (row is None or len(pending) >= COMMIT_EVERY
+                            or time.monotonic() - last_commit >= COMMIT_INTERVAL):
+                with self.db:
+                    self.db.executemany(
+                        "INSERT OR REPLACE INTO harvest (member_id, resource, status_code, item_count, payload, "
+                        "fetched_at) VALUES (?, ?, ?, ?, ?, ?)", pending)
+                pending = []
+                last_commit = time.monotonic()
+            if row is None:
+                return
+
+
+# ============================================================================
+# HARVEST
+# ============================================================================
+
+class Harvester:
+    def __init__(self, base_url, headers, store, limiter, resources, concurrency):
+        self.base_url = base_url
+        self.headers = headers
+        self.store = store
+        self.limiter = limiter
+        self.resources = resources
+        self.concurrency = concurrency
+        # Every URL is distinct, so coalescing / memo / disk cache would only cost memory
+        self.http = ProbeClient(coalesce=False, memo_ttl=0)
+        self.jobs = queue.Queue()
+        self.stats = {"requests": 0, "stored": 0, "missing": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None):
+        """Rate-limited GET with retries; a 429 pauses every worker"""
+        for attempt in range(DEFAULT_RETRIES + 1):
+            self.limiter.acquire()
+            with self._lock:
+                self.stats["requests"] += 1
+            try:
+                response = self.http.get(url, headers=self.headers, params=params)
+            except requests.exceptions.RequestException:
+                if attempt == DEFAULT_RETRIES:
+                    raise
+                time.sleep(min(30, 0.5 * 2 ** attempt) * random.uniform(0.8, 1.2))
+                continue
+            if response.status_code == 429 and attempt < DEFAULT_RETRIES:
+                retry_after = response.headers.get("Retry-After", "")
+                self.limiter.pause(float(retry_after) if retry_after.isdigit() else min(30, 2 ** attempt))
+                continue
+            if response.status_code >= 500 and attempt < DEFAULT_RETRIES:
+                time.sleep(min(30, 0.5 * 2 ** attempt) * random.uniform(0.8, 1.2))
+                continue
+            return response
+        return response
+
+    def fetch(self, member_id, resource):
+        """(status, item count, payload) for one member sub-resource, all pages joined"""
+        url = f"{self.base_url}/api/members/{member_id}/{resource}"
+        if not RESOURCES[resource]:
+            response = self.get(url)
+            if response.status_code != 200:
+                return response.status_code, None, None
+            return 200, 1, response.json()
+
+        items = []
+        page = 1
+        while True:
+            response = self.get(url, params={"page": page, "pageSize": PAGE_SIZE})
+            if response.status_code != 200:
+                # A failing later page must not be stored as a complete result
+                return response.status_code, None, None
+            data = response.json()
+            if isinstance(data, list):
+                items.extend(data)
+                break
+            items.extend(data.get("results", []))
+            if not data.get("next"):
+                break
+            page += 1
+        return 200, len(items), items
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+            member_id, resource, followups = job
+            try:
+                self._harvest(member_id, resource, followups)
+            except Exception as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                print(f"   ❌ member {member_id} {resource}: {e}")
+            finally:
+                self.jobs.task_done()
+
+    def _harvest(self, member_id, resource, followups):
+        status, count, payload = self.fetch(member_id, resource)
+        self.store.put(member_id, resource, status, count, payload)
+        with self._lock:
+            if status == 200:
+                self.stats["stored"] += 1
+            elif status == 404:
+                self.stats["missing"] += 1
+            else:
+                self.stats["errors"] += 1
+        if status == 404 and resource == "tripcounts":
+            # No such member: the other sub-resources would 404 as well
+            for other in followups:
+                self.store.put(member_id, other, 404, None, None)
+            return
+        for other in followups:
+            self.jobs.put((member_id, other, ()))
+
+    def run(self, member_ids, done):
+        workers = [threading.Thread(target=self._work, daemon=True) for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+
+        queued = 0
+        for member_id in member_ids:
+            todo = [r for r in self.resources if (member_id, r) not in done]
+            if not todo:
+                continue
+            queued += 1
+            if todo[0] == "tripcounts":
+                self.jobs.put((member_id, "tripcounts", tuple(todo[1:])))
+            else:
+                for resource in todo:
+                    self.jobs.put((member_id, resource, ()))
+
+        started = time.monotonic()
+        reporter = threading.Thread(target=self._report, args=(started,), daemon=True)
+        reporter.start()
+        self.jobs.join()
+        for _ in workers:
+            self.jobs.put(None)
+        for worker in workers:
+            worker.join()
+        return queued, time.monotonic() - started
+
+    def _report(self, started):
+        while True:
+            time.sleep(5)
+            elapsed = time.monotonic() - started
+            with self._lock:
+                stats = dict(self.stats)
+            print(f"   {stats['requests']} requests ({stats['requests'] / elapsed:.1f}/s), "
+                  f"{stats['stored']} stored, {stats['missing']} missing, {stats['errors']} errors, "
+                  f"{self.jobs.unfinished_tasks} jobs left")
+
+
+def member_ids_from_args(args, base_url, headers):
+    ids = []
+    if args.ids:
+        ids.extend(int(value) for value in args.ids.split(",") if value.strip())
+    if args.range:
+        first, _, last = args.range.partition("-")
+        ids.extend(range(int(first), int(last or first) + 1))
+    if args.file:
+        with open(args.file) as f:
+            ids.extend(int(line.split(",")[0]) for line in f if line.strip() and line.strip()[0].isdigit())
+    if args.all:
+        page = 1
+        http = ProbeClient(coalesce=False, memo_ttl=0)
+        while True:
+            response = http.get(f"{base_url}/api/members/", headers=headers,
+                                params={"page": page, "pageSize": PAGE_SIZE})
+            if response.status_code != 200:
+                print(f"❌ /api/members/ page {page}: {response.status_code}")
+                sys.exit(1)
+            data = response.json()
+            ids.extend(member["id"] for member in data.get("results", []))
+            if not data.get("next"):
+                break
+            page += 1
+    return list(dict.fromkeys(ids))
+
+
+# ============================================================================
+# COMMANDS
+# ============================================================================
+
+def command_harvest(args):
+    base_url = args.base_url.rstrip("/")
+    resources = list(RESOURCES)
+    if args.resources:
+        wanted = [r.strip() for r in args.resources.split(",") if r.strip()]
+        unknown = set(wanted) - set(RESOURCES)
+        if unknown:
+            print(f"❌ Unknown resource(s): {', '.join(sorted(unknown))} (expected {', '.join(RESOURCES)})")
+            sys.exit(1)
+        resources = [r for r in RESOURCES if r in wanted]
+
+    print("=" * 80)
+    print("MEMBER ACTIVITY HARVEST")
+    print("=" * 80)
+    try:
+        headers, _user_id = authenticate(base_url)
+    except AuthenticationError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    member_ids = member_ids_from_args(args, base_url, headers)
+    if not member_ids:
+        print("❌ No members given (use --ids, --range, --file or --all)")
+        sys.exit(1)
+
+    store = HarvestStore(args.db)
+    done = set() if args.refresh else store.done_pairs(args.max_age)
+    limiter = RateLimiter(args.rate)
+    harvester = Harvester(base_url, headers, store, limiter, resources, args.concurrency)
+    print(f"👥 {len(member_ids)} members x {len(resources)} resources, "
+          f"{args.rate:g} req/s, concurrency {args.concurrency}")
+
+    store.start()
+    try:
+        members, elapsed = harvester.run(member_ids, done)
+    finally:
+        store.close()
+
+    stats = harvester.stats
+    print(f"\n✅ {members} members harvested in {elapsed:.1f}s "
+          f"({len(member_ids) - members} already stored)")
+    print(f"   Requests: {stats['requests']} ({stats['requests'] / max(elapsed, 1e-6):.1f}/s)  "
+          f"Stored: {stats['stored']}  Missing: {stats['missing']}  Errors: {stats['errors']}")
+    print(f"💾 {args.db}")
+    return not stats["errors"]
+
+
+def command_summary(args):
+    store = HarvestStore(args.db)
+    rows = store.db.execute(
+        "SELECT resource, COUNT(*), SUM(status_code = 200), SUM(status_code = 404), "
+        "SUM(status_code NOT IN (200, 404)), SUM(item_count), MAX(fetched_at) "
+        "FROM harvest GROUP BY resource ORDER BY resource").fetchall()
+    members = store.db.execute("SELECT COUNT(DISTINCT member_id) FROM harvest WHERE status_code = 200").fetchone()[0]
+    print(f"\n{'Resource':<18} {'Rows':>7} {'OK':>7} {'404':>6} {'Error':>6} {'Items':>9}  Last fetch")
+    print("-" * 80)
+    for resource, total, ok, missing, errors, items, last in rows:
+        print(f"{resource:<18} {total:>7} {ok or 0:>7} {missing or 0:>6} {errors or 0:>6} {items or 0:>9}  {last}")
+    print("-" * 80)
+    print(f"Members with data: {members}")
+    return True
+
+
+def command_show(args):
+    store = HarvestStore(args.db)
+    row = store.db.execute("SELECT status_code, item_count, payload, fetched_at FROM harvest "
+                           "WHERE member_id = ? AND resource = ?", (args.member_id, args.resource)).fetchone()
+    if not row:
+        print(f"❌ Nothing stored for member {args.member_id} {args.resource}")
+        return False
+    status, count, payload, fetched_at = row
+    print(f"Member {args.member_id} {args.resource}: HTTP {status}, {count} items, fetched {fetched_at}")
+    if payload:
+        print(json.dumps(json.loads(payload), indent=2, ensure_ascii=False))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Harvest per-member sub-resources in parallel")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    harvest = commands.add_parser("harvest", help="Fetch sub-resources into the store")
+    harvest.add_argument("--base-url", default=MAIN_API)
+    harvest.add_argument("--ids", help="Comma-separated member ids")
+    harvest.add_argument("--range", help="Member id range, e.g. 10000-11000")
+    harvest.add_argument("--file", help="File with one member id per line")
+    harvest.add_argument("--all", action="store_true", help="Every member listed by /api/members/")
+    harvest.add_argument("--resources", help=f"Comma-separated subset of: {', '.join(RESOURCES)}")
+    harvest.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Global request rate limit (req/s)")
+    harvest.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    harvest.add_argument("--refresh", action="store_true", help="Fetch again even if already stored")
+    harvest.add_argument("--max-age", type=float, help="Refetch stored results older than this many hours")
+
+    commands.add_parser("summary", help="Per-resource counts in the store")
+
+    show = commands.add_parser("show", help="Print one stored result")
+    show.add_argument("member_id", type=int)
+    show.add_argument("resource", choices=list(RESOURCES))
+
+    args = parser.parse_args()
+    command = {"harvest": command_harvest, "summary": command_summary, "show": command_show}[args.command]
+    sys.exit(0 if command(args) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+Trip Rating / MSI Batch Engine
+Precomputes everything the Trip Rating & MSI endpoints
+(new_features/trip_rating_msi_system/BACKEND_API_DOCUMENTATION.md) compute
+per request behind cache_page(60 * 15), so the cache can be filled from a
+fresh snapshot instead of running the aggregation on a cold request:
+
+    trip_summary        per trip: reviews, average trip / leader rating,
+                        overall score and colour band (ratings-summary,
+                        admin trip-ratings list)
+    leader_performance  per period and leader: trips led, reviews, MSI
+                        (overall score over all ratings of their trips), band
+    leader_trend        per period, leader and month: average score
+    band_distribution   per period: trips and leaders per colour band
+    rating_histogram    per period: 1..5 star counts of trip / leader ratings
+    dashboard           per period: msi-dashboard-stats response (club-wide
+                        average, trend vs the previous period, top leaders
+                        and reviewers)
+
+Periods are the ones the endpoints accept without dates: all, ytd and
+last6months. Scores follow the documented SQL: (AVG(trip_rating) +
+AVG(leader_rating)) / 2, 0 when there are no ratings; bands use the
+thresholds and colours of /api/settings/rating-config/ (documented defaults
+when that endpoint is missing).
+
+All ratings are loaded once into columns (NumPy arrays when NumPy is
+installed, array() otherwise) and every table is a grouped count / sum over
+those columns - np.bincount per grouping key, masked by period - instead of
+one query per trip or leader.
+
+Data source: the admin rating endpoints (trip list + per-trip reviews,
+fetched concurrently), or a database export with --ratings-csv
+(trip_ratings: trip_id, user_id, trip_rating, leader_rating, created_at) and
+--trips-csv (trips: id, name, start_date, level, owner_id, is_event, and
+optionally leader_name).
+
+The tables are written to msi_snapshot.db (SQLite, replaced atomically).
+
+Usage:
+    python3 msi_batch.py
+    python3 msi_batch.py --ratings-csv trip_ratings.csv --trips-csv trips.csv
+    python3 msi_batch.py --output /srv/cache/msi_snapshot.db --concurrency 16
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import sqlite3
+import sys
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; array() columns and loops are used instead
+    np = None
+
+from probe_client import MAIN_API, AuthenticationError, authenticate, call_with_retry, client, stream_pages
+
+OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "msi_snapshot.db")
+PAGE_SIZE = 100
+DEFAULT_CONCURRENCY = 8
+PERIODS = ("all", "ytd", "last6months")
+TOP_N = 3
+
+# GET /api/settings/rating-config/ defaults from the backend documentation
+DEFAULT_CONFIG = {
+    "thresholds": {"excellent": 4.5, "good": 3.5, "needsImprovement": 0},
+    "colors": {"excellent": "#4CAF50", "good": "#FFC107", "needsImprovement": "#F44336",
+               "insufficientData": "#9E9E9E"},
+}
+BANDS = ("excellent", "good", "needsImprovement", "insufficientData")
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE trip_summary (
+    trip_id INTEGER PRIMARY KEY, trip_name TEXT, trip_date TEXT, trip_level TEXT,
+    leader_id INTEGER, leader_name TEXT, total_reviews INTEGER, average_trip_rating REAL,
+    average_leader_rating REAL, overall_score REAL, band TEXT, color TEXT
+);
+CREATE TABLE leader_performance (
+    period TEXT, leader_id INTEGER, leader_name TEXT, leader_avatar TEXT, total_trips INTEGER,
+    total_reviews INTEGER, overall_score REAL, band TEXT, color TEXT, PRIMARY KEY (period, leader_id)
+);
+CREATE TABLE leader_trend (
+    period TEXT, leader_id INTEGER, month TEXT, total_reviews INTEGER, average_score REAL,
+    PRIMARY KEY (period, leader_id, month)
+);
+CREATE TABLE band_distribution (period TEXT, subject TEXT, band TEXT, count INTEGER, PRIMARY KEY (period, subject, band));
+CREATE TABLE rating_histogram (period TEXT, kind TEXT, stars INTEGER, count INTEGER, PRIMARY KEY (period, kind, stars));
+CREATE TABLE dashboard (period TEXT PRIMARY KEY, payload TEXT);
+"""
+
+
+# ============================================================================
+# COLUMNS
+# ============================================================================
+
+def column(values):
+    codes = array("i", values)
+    return np.frombuffer(codes, dtype=np.int32).copy() if np is not None else codes
+
+
+def mask_between(values, low, high):
+    """Boolean mask of low <= value <= high (None = unbounded)"""
+    low = -math.inf if low is None else low
+    high = math.inf if high is None else high
+    if np is not None:
+        return (values >= low) & (values <= high)
+    return [low <= value <= high for value in values]
+
+
+def compress(values, mask):
+    if np is not None:
+        return values[mask]
+    return [value for value, keep in zip(values, mask) if keep]
+
+
+def take(values, index):
+    """values[index] for an index column"""
+    if np is not None:
+        return values[index]
+    return [values[i] for i in index]
+
+
+def combine(major, minor, width):
+    """Single grouping key for (major, minor) pairs"""
+    if np is not None:
+        return major * width + minor
+    return [a * width + b for a, b in zip(major, minor)]
+
+
+def group_count(keys, size):
+    if np is not None:
+        return np.bincount(keys, minlength=size).tolist()
+    counts = [0] * size
+    for key in keys:
+        counts[key] += 1
+    return counts
+
+
+def group_sum(keys, weights, size):
+    if np is not None:
+        return np.bincount(keys, weights=weights, minlength=size).tolist()
+    sums = [0] * size
+    for key, weight in zip(keys, weights):
+        sums[key] += weight
+    return sums
+
+
+class RatingTable:
+    """Trips, leaders and reviewers as lookup lists; trips and ratings as int columns"""
+
+    def __init__(self, trips, ratings, reviewer_names=None):
+        # trips: dicts with tripId, tripName, tripDate, tripLevel, leaderId, leaderName, leaderAvatar
+        # ratings: (trip id, user id, trip rating, leader rating)
+        self.trips = sorted(trips, key=lambda trip: trip["tripId"])
+        self.leaders = sorted({trip["leaderId"] for trip in self.trips if trip.get("leaderId") is not None})
+        leader_index = {leader: i for i, leader in enumerate(self.leaders)}
+        self.leader_info = {}
+        for trip in self.trips:
+            self.leader_info.setdefault(trip.get("leaderId"), (trip.get("leaderName"), trip.get("leaderAvatar")))
+        trip_index = {trip["tripId"]: i for i, trip in enumerate(self.trips)}
+
+        days = [parse_day(trip.get("tripDate")) for trip in self.trips]
+        self.first_month = min((day.year * 12 + day.month - 1 for day in days if day), default=0)
+        self.months = max((day.year * 12 + day.month - 1 for day in days if day), default=0) - self.first_month + 1
+        self.trip_leader = column(leader_index.get(trip.get("leaderId"), len(self.leaders)) for trip in self.trips)
+        self.trip_day = column((day.toordinal() if day else 0 for day in days))
+        self.trip_month = column(day.year * 12 + day.month - 1 - self.first_month if day else 0 for day in days)
+
+        ratings = [rating for rating in ratings if rating[0] in trip_index]
+        self.reviewers = sorted({rating[1] for rating in ratings})
+        reviewer_index = {reviewer: i for i, reviewer in enumerate(self.reviewers)}
+        self.reviewer_names = reviewer_names or {}
+        self.rating_trip = column(trip_index[rating[0]] for rating in ratings)
+        self.rating_user = column(reviewer_index[rating[1]] for rating in ratings)
+        self.trip_rating = column(rating[2] for rating in ratings)
+        self.leader_rating = column(rating[3] for rating in ratings)
+
+    def __len__(self):
+        return len(self.rating_trip)
+
+
+def parse_day(value):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def average(total, count):
+    """total / count to 2 decimals, rounding halves up like the database's ROUND (0 without ratings)"""
+    if not count:
+        return 0.0
+    return float((Decimal(int(total)) / Decimal(count)).quantize(Decimal("0.01"), ROUND_HALF_UP))
+
+
+def score(sum_trip, sum_leader, count):
+    """(AVG(trip_rating) + AVG(leader_rating)) / 2"""
+    return average(sum_trip + sum_leader, 2 * count)
+
+
+def band_of(value, count, config):
+    if not count:
+        return "insufficientData"
+    thresholds = config["thresholds"]
+    if value >= thresholds["excellent"]:
+        return "excellent"
+    if value >= thresholds["good"]:
+        return "good"
+    return "needsImprovement"
+
+
+def period_window(period, today):
+    """(first day, last day) ordinals of a period; None = unbounded"""
+    if period == "ytd":
+        return date(today.year, 1, 1).toordinal(), today.toordinal()
+    if period == "last6months":
+        month = today.year * 12 + today.month - 1 - 6
+        start = date(month // 12, month % 12 + 1, min(today.day, 28))
+        return start.toordinal(), today.toordinal()
+    return None, None
+
+
+# ============================================================================
+# AGGREGATION
+# ============================================================================
+
+def trip_summaries(table, config):
+    size = len(table.trips)
+    counts = group_count(table.rating_trip, size)
+    sums_trip = group_sum(table.rating_trip, table.trip_rating, size)
+    sums_leader = group_sum(table.rating_trip, table.leader_rating, size)
+    rows = []
+    for i, trip in enumerate(table.trips):
+        count = counts[i]
+        overall = score(sums_trip[i], sums_leader[i], count)
+        band = band_of(overall, count, config)
+        rows.append({
+            "tripId": trip["tripId"], "tripName": trip.get("tripName"), "tripDate": trip.get("tripDate"),
+            "tripLevel": trip.get("tripLevel"), "leaderId": trip.get("leaderId"), "leaderName": trip.get("leaderName"),
+            "totalReviews": count,
+            "averageTripRating": average(sums_trip[i], count),
+            "averageLeaderRating": average(sums_leader[i], count),
+            "overallScore": overall, "band": band, "color": config["colors"].get(band),
+        })
+    return rows
+
+
+def period_tables(table, config, low, high):
+    """Leader rollups, trends, bands and histograms for trips dated within [low, high]"""
+    leaders = len(table.leaders) + 1  # last slot: trips without a leader
+    trip_mask = mask_between(table.trip_day, low, high)
+    rating_mask = take(trip_mask, table.rating_trip)
+    rating_trip = compress(table.rating_trip, rating_mask)
+    trip_ratings = compress(table.trip_rating, rating_mask)
+    leader_ratings = compress(table.leader_rating, rating_mask)
+    rating_leader = take(table.trip_leader, rating_trip)
+
+    trips_led = group_count(compress(table.trip_leader, trip_mask), leaders)
+    reviews = group_count(rating_leader, leaders)
+    sums_trip = group_sum(rating_leader, trip_ratings, leaders)
+    sums_leader = group_sum(rating_leader, leader_ratings, leaders)
+    performance = []
+    for i, leader in enumerate(table.leaders):
+        if not trips_led[i]:
+            continue
+        overall = score(sums_trip[i], sums_leader[i], reviews[i])
+        band = band_of(overall, reviews[i], config)
+        name, avatar = table.leader_info.get(leader, (None, None))
+        performance.append({
+            "leaderId": leader, "leaderName": name, "leaderAvatar": avatar, "totalTrips": trips_led[i],
+            "totalReviews": reviews[i], "overallScore": overall, "band": band, "color": config["colors"].get(band),
+        })
+
+    # (leader, month) cells: one bincount over a combined key
+    months = table.months
+    trip_cells = group_count(combine(compress(table.trip_leader, trip_mask), compress(table.trip_month, trip_mask),
+                                     months), leaders * months)
+    rating_cells = combine(rating_leader, take(table.trip_month, rating_trip), months)
+    cell_reviews = group_count(rating_cells, leaders * months)
+    cell_trip = group_sum(rating_cells, trip_ratings, leaders * months)
+    cell_leader = group_sum(rating_cells, leader_ratings, leaders * months)
+    trend = []
+    for cell, trips in enumerate(trip_cells):
+        leader, month = divmod(cell, months)
+        if trips and leader < len(table.leaders):
+            month += table.first_month
+            trend.append({"leaderId": table.leaders[leader], "month": f"{month // 12:04d}-{month % 12 + 1:02d}",
+                          "totalReviews": cell_reviews[cell],
+                          "averageScore": score(cell_trip[cell], cell_leader[cell], cell_reviews[cell])})
+
+    histograms = {}
+    for kind, values in (("trip", trip_ratings), ("leader", leader_ratings)):
+        counts = group_count(values, 6)
+        histograms[kind] = {stars: counts[stars] for stars in range(1, 6)}
+
+    reviewer_counts = group_count(compress(table.rating_user, rating_mask), len(table.reviewers))
+    total = len(rating_trip)
+    return {
+        "performance": performance,
+        "trend": trend,
+        "histograms": histograms,
+        "reviewer_counts": reviewer_counts,
+        "total_reviews": total,
+        "club_average": score(sum(sums_trip), sum(sums_leader), total),
+    }
+
+
+def dashboard(table, result, previous):
+    leaders = sorted(result["performance"], key=lambda row: (-row["overallScore"], -row["totalTrips"]))
+    reviewers = sorted((-count, user) for user, count in zip(table.reviewers, result["reviewer_counts"]) if count)
+    return {
+        "clubWideAverage": result["club_average"],
+        "totalReviews": result["total_reviews"],
+        "trendChange": round(result["club_average"] - previous["club_average"], 2) if previous else None,
+        "topLeaders": [{key: row[key] for key in ("leaderId", "leaderName", "leaderAvatar", "overallScore",
+                                                  "totalTrips")} for row in leaders[:TOP_N]],
+        "topReviewers": [{"userId": user, "userName": table.reviewer_names.get(user), "totalReviews": -count}
+                         for count, user in reviewers[:TOP_N]],
+    }
+
+
+def band_counts(rows):
+    counts = dict.fromkeys(BANDS, 0)
+    for row in rows:
+        counts[row["band"]] += 1
+    return counts
+
+
+def compute(table, config, today):
+    snapshot = {"trip_summary": trip_summaries(table, config), "periods": {}}
+    for period in PERIODS:
+        low, high = period_window(period, today)
+        result = period_tables(table, config, low, high)
+        previous = None
+        if low is not None:
+            # Same duration immediately before the period
+            previous = period_tables(table, config, low - (high - low), low - 1)
+        trips = [row for row in snapshot["trip_summary"]
+                 if low is None or low <= (parse_day(row["tripDate"]) or date.min).toordinal() <= high]
+        result["bands"] = {"trips": band_counts(trips), "leaders": band_counts(result["performance"])}
+        result["dashboard"] = dashboard(table, result, previous)
+        snapshot["periods"][period] = result
+    return snapshot
+
+
+# ============================================================================
+# LOADING
+# ============================================================================
+
+def load_config(base_url, headers):
+    response = call_with_retry("GET", f"{base_url}/api/settings/rating-config/", headers=headers)
+    if response.status_code != 200:
+        print(f"⚠️  rating-config: HTTP {response.status_code}, using the documented default thresholds")
+        return DEFAULT_CONFIG
+    data = response.json()
+    return {"thresholds": dict(DEFAULT_CONFIG["thresholds"], **data.get("thresholds", {})),
+            "colors": dict(DEFAULT_CONFIG["colors"], **data.get("colors", {}))}
+
+
+def load_from_api(base_url, headers, concurrency):
+    url = f"{base_url}/api/admin/trip-ratings/"
+
+    def fetch_page(page):
+        response = call_with_retry("GET", url, headers=headers, params={"page": page, "pageSize": PAGE_SIZE})
+        if response.status_code != 200:
+            raise RuntimeError(f"admin/trip-ratings page {page}: {response.status_code}")
+        return response.json()
+
+    def page_count(data):
+        return math.ceil((data.get("count") or 0) / PAGE_SIZE)
+
+    def fetch_reviews(trip):
+        response = call_with_retry("GET", f"{url}{trip['tripId']}/", headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"admin/trip-ratings/{trip['tripId']}: {response.status_code}")
+        return trip, response.json().get("reviews", [])
+
+    trips = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for data in stream_pages(fetch_page, page_count, pool):
+            trips.extend(data.get("results", []))
+        print(f"📥 {len(trips)} trips, fetching reviews of {sum(1 for t in trips if t.get('totalReviews'))}...")
+        ratings, names = [], {}
+        for trip, reviews in pool.map(fetch_reviews, [t for t in trips if t.get("totalReviews")]):
+            for review in reviews:
+                ratings.append((trip["tripId"], review["userId"], int(review["tripRating"]),
+                                int(review["leaderRating"])))
+                names[review["userId"]] = review.get("userName")
+    return trips, ratings, names
+
+
+def load_from_csv(ratings_path, trips_path):
+    trips = []
+    with open(trips_path, newline="") as f:
+        for row in csv.DictReader(f):
+            if str(row.get("is_event", "")).lower() in ("1", "true", "t", "yes"):
+                continue
+            trips.append({"tripId": int(row["id"]), "tripName": row.get("name"), "tripDate": row.get("start_date"),
+                          "tripLevel": row.get("level"), "leaderId": int(row["owner_id"]) if row.get("owner_id") else None,
+                          "leaderName": row.get("leader_name")})
+    with open(ratings_path, newline="") as f:
+        ratings = [(int(row["trip_id"]), int(row["user_id"]), int(row["trip_rating"]), int(row["leader_rating"]))
+                   for row in csv.DictReader(f)]
+    return trips, ratings, {}
+
+
+# ============================================================================
+# OUTPUT
+# ============================================================================
+
+def write_snapshot(path, snapshot, config, source):
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    db = sqlite3.connect(tmp_path)
+    db.executescript(SCHEMA)
+    db.executemany("INSERT INTO meta VALUES (?, ?)", [
+        ("generated_at", datetime.now().isoformat()), ("source", source), ("config", json.dumps(config)),
+        ("engine", f"numpy {np.__version__}" if np is not None else "array")])
+    db.executemany("INSERT INTO trip_summary VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+        (r["tripId"], r["tripName"], r["tripDate"], r["tripLevel"], r["leaderId"], r["leaderName"],
+         r["totalReviews"], r["averageTripRating"], r["averageLeaderRating"], r["overallScore"], r["band"], r["color"])
+        for r in snapshot["trip_summary"]])
+    for period, result in snapshot["periods"].items():
+        db.executemany("INSERT INTO leader_performance VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+            (period, r["leaderId"], r["leaderName"], r["leaderAvatar"], r["totalTrips"], r["totalReviews"],
+             r["overallScore"], r["band"], r["color"]) for r in result["performance"]])
+        db.executemany("INSERT INTO leader_trend VALUES (?, ?, ?, ?, ?)", [
+            (period, r["leaderId"], r["month"], r["totalReviews"], r["averageScore"]) for r in result["trend"]])
+        db.executemany("INSERT INTO band_distribution VALUES (?, ?, ?, ?)", [
+            (period, subject, band, count) for subject, counts in result["bands"].items()
+            for band, count in counts.items()])
+        db.executemany("INSERT INTO rating_histogram VALUES (?, ?, ?, ?)", [
+            (period, kind, stars, count) for kind, counts in result["histograms"].items()
+            for stars, count in counts.items()])
+        db.execute("INSERT INTO dashboard VALUES (?, ?)", (period, json.dumps(result["dashboard"])))
+    db.commit()
+    db.close()
+    os.replace(tmp_path, path)
+
+
+def print_summary(snapshot, server_trips):
+    trips = snapshot["trip_summary"]
+    print("\n" + "=" * 80)
+    print("📊 MSI SNAPSHOT")
+    print("=" * 80)
+    print(f"   Trips: {len(trips)}  ({sum(1 for t in trips if t['totalReviews'])} rated)")
+    for period, result in snapshot["periods"].items():
+        board = result["dashboard"]
+        trend = f"{board['trendChange']:+.2f}" if board["trendChange"] is not None else "n/a"
+        bands = ", ".join(f"{band} {count}" for band, count in result["bands"]["leaders"].items())
+        print(f"   {period:<12} club average {board['clubWideAverage']:.2f} ({trend}), "
+              f"{board['totalReviews']} reviews, {len(result['performance'])} leaders: {bands}")
+    if server_trips:
+        # The server's list carries its own overallScore: a free consistency check
+        expected = {trip["tripId"]: trip.get("overallScore") for trip in server_trips}
+        mismatches = [t["tripId"] for t in trips
+                      if expected.get(t["tripId"]) is not None
+                      and abs(float(expected[t["tripId"]]) - t["overallScore"]) > 0.01]
+        if mismatches:
+            print(f"   ⚠️  {len(mismatches)} trip scores differ from the server list, e.g. {mismatches[:5]}")
+        else:
+            print(f"   ✅ Trip scores match the server list for {len(expected)} trips")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute trip rating / MSI tables")
+    parser.add_argument("--base-url", default=MAIN_API)
+    parser.add_argument("--ratings-csv", help="trip_ratings export (needs --trips-csv)")
+    parser.add_argument("--trips-csv", help="trips export")
+    parser.add_argument("--config", help="Rating config JSON (thresholds, colors) instead of the API")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    args = parser.parse_args()
+    base_url = args.base_url.rstrip("/")
+
+    if bool(args.ratings_csv) != bool(args.trips_csv):
+        parser.error("--ratings-csv and --trips-csv go together")
+
+    started = time.monotonic()
+    headers = None
+    if not args.ratings_csv or not args.config:
+        try:
+            headers, _user_id = authenticate(base_url)
+        except AuthenticationError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+    if args.config:
+        with open(args.config) as f:
+            data = json.load(f)
+        config = {"thresholds": dict(DEFAULT_CONFIG["thresholds"], **data.get("thresholds", {})),
+                  "colors": dict(DEFAULT_CONFIG["colors"], **data.get("colors", {}))}
+    else:
+        config = load_config(base_url, headers)
+
+    if args.ratings_csv:
+        trips, ratings, names = load_from_csv(args.ratings_csv, args.trips_csv)
+        source, server_trips = f"{args.ratings_csv} + {args.trips_csv}", None
+    else:
+        trips, ratings, names = load_from_api(base_url, headers, args.concurrency)
+        source, server_trips = f"{base_url}/api/admin/trip-ratings/", trips
+    loaded = time.monotonic()
+
+    table = RatingTable(trips, ratings, names)
+    snapshot = compute(table, config, date.today())
+    computed = time.monotonic()
+    write_snapshot(args.output, snapshot, config, source)
+
+    print(f"Engine: {'NumPy ' + np.__version__ if np is not None else 'array (NumPy not installed)'}")
+    print(f"⏱️  load {loaded - started:.2f}s, compute {(computed - loaded) * 1000:.0f}ms "
+          f"({len(table)} ratings), write {time.monotonic() - computed:.2f}s")
+    print_summary(snapshot, server_trips)
+    print(f"💾 Snapshot written to {args.output}")
+    if not args.ratings_csv:
+        client.print_metrics()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,17 @@
 """
 Simple HTTP server with no-cache headers to force browsers to fetch fresh content.
 This ensures that changes to Flutter web apps are immediately visible.
+
+Optional proxy modes:
+  --gallery-proxy  forwards /gallery-media/* to the Gallery API through an
+                   on-disk thumbnail cache (see gallery_media_proxy.py)
+  --api-proxy      forwards /main-api/* to the Main API with a reference data
+                   cache (see api_reference_proxy.py)
+  --photo-search   serves /photo-search/* from the local photo search index
+                   (see photo_search_index.py)
 """
 
+import argparse
 import http.server
 import socketserver
 import os
@@ -13,42 +22,142 @@ PORT = 5060
 
 class NoCacheHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     """HTTP request handler with aggressive no-cache headers"""
-    
+
+    # Set by --gallery-proxy / --api-proxy / --photo-search
+    gallery_proxy = None
+    api_proxy = None
+    photo_search = None
+
     def end_headers(self):
         # CORS headers
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, PATCH, DELETE, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
         self.send_header('X-Frame-Options', 'ALLOWALL')
         self.send_header('Content-Security-Policy', 'frame-ancestors *')
-        
-        # Aggressive no-cache headers
-        self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate, max-age=0')
-        self.send_header('Pragma', 'no-cache')
-        self.send_header('Expires', '0')
-        
+
+        proxy = self._proxy_for_request()
+        if proxy is not None and proxy is self.gallery_proxy:
+            # The media proxy sets Cache-Control per response (max-age only for cached media)
+            pass
+        elif proxy is not None:
+            # The reference data proxy and the search index do their own caching
+            self.send_header('Cache-Control', 'no-cache')
+        else:
+            # Aggressive no-cache headers
+            self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate, max-age=0')
+            self.send_header('Pragma', 'no-cache')
+            self.send_header('Expires', '0')
+
         # Call parent
         super().end_headers()
-    
+
+    def _proxy_for_request(self):
+        path = self.path.split('?', 1)[0]
+        for proxy in (self.gallery_proxy, self.api_proxy, self.photo_search):
+            if proxy is not None and proxy.handles(path):
+                return proxy
+        return None
+
+    def do_GET(self):
+        proxy = self._proxy_for_request()
+        if proxy is not None:
+            proxy.handle(self, "GET")
+        else:
+            super().do_GET()
+
+    def do_POST(self):
+        proxy = self._proxy_for_request()
+        if proxy is not None:
+            proxy.handle(self, "POST")
+        else:
+            self.send_error(405)
+
+    def do_PUT(self):
+        self._proxy_only("PUT")
+
+    def do_PATCH(self):
+        self._proxy_only("PATCH")
+
+    def do_DELETE(self):
+        self._proxy_only("DELETE")
+
+    def _proxy_only(self, method):
+        proxy = self._proxy_for_request()
+        if proxy is not None:
+            proxy.handle(self, method)
+        else:
+            self.send_error(405)
+
     def do_OPTIONS(self):
         """Handle OPTIONS requests for CORS"""
         self.send_response(200)
         self.end_headers()
 
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Flutter web server with no-cache headers")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--gallery-proxy', action='store_true',
+                        help="Proxy /gallery-media/* to the Gallery API with a thumbnail cache")
+    parser.add_argument('--api-proxy', action='store_true',
+                        help="Proxy /main-api/* to the Main API with a reference data cache")
+    parser.add_argument('--photo-search', action='store_true',
+                        help="Serve /photo-search/* from the local photo search index")
+    parser.add_argument('--cache-dir', default=None, help="Thumbnail cache directory")
+    parser.add_argument('--cache-size-mb', type=int, default=None, help="Thumbnail cache size limit")
+    parser.add_argument('--cache-max-age-hours', type=float, default=None, help="Thumbnail cache entry lifetime")
+    args = parser.parse_args()
+
+    server_class = socketserver.TCPServer
+    if args.gallery_proxy:
+        from gallery_media_proxy import (
+            DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE_MB, DEFAULT_MAX_AGE_HOURS, GalleryMediaProxy, MediaDiskCache,
+        )
+        cache = MediaDiskCache(
+            cache_dir=os.path.abspath(args.cache_dir or DEFAULT_CACHE_DIR),
+            max_bytes=(args.cache_size_mb or DEFAULT_CACHE_SIZE_MB) * 1024 * 1024,
+            max_age=(args.cache_max_age_hours or DEFAULT_MAX_AGE_HOURS) * 3600,
+        )
+        NoCacheHTTPRequestHandler.gallery_proxy = GalleryMediaProxy(cache)
+    if args.api_proxy:
+        from api_reference_proxy import ReferenceDataProxy
+        NoCacheHTTPRequestHandler.api_proxy = ReferenceDataProxy()
+    if args.photo_search:
+        from photo_search_index import PhotoSearchIndex, PhotoSearchProxy
+        NoCacheHTTPRequestHandler.photo_search = PhotoSearchProxy(PhotoSearchIndex())
+    if args.gallery_proxy or args.api_proxy or args.photo_search:
+        # Proxied requests block on the upstream, so serve them concurrently
+        server_class = ThreadingTCPServer
+
     # Change to build/web directory
     web_dir = os.path.join(os.path.dirname(__file__), 'build', 'web')
     os.chdir(web_dir)
-    
-    print(f"🚀 Starting Flutter web server on port {PORT}")
+
+    print(f"🚀 Starting Flutter web server on port {args.port}")
     print(f"📁 Serving directory: {os.getcwd()}")
-    print(f"🔗 URL: http://localhost:{PORT}/")
+    print(f"🔗 URL: http://localhost:{args.port}/")
     print(f"⚡ No-cache headers enabled - changes will be immediately visible")
+    if args.gallery_proxy:
+        cache = NoCacheHTTPRequestHandler.gallery_proxy.cache
+        print(f"🖼️  Gallery proxy: http://localhost:{args.port}/gallery-media/ -> Gallery API")
+        print(f"   Cache: {cache.cache_dir} ({cache.max_bytes // 1024 // 1024}MB, "
+              f"max age {cache.max_age / 3600:g}h)")
+    if args.api_proxy:
+        print(f"📚 Reference data proxy: http://localhost:{args.port}/main-api/ -> Main API")
+    if args.photo_search:
+        stats = NoCacheHTTPRequestHandler.photo_search.index.stats()
+        print(f"🔎 Photo search: http://localhost:{args.port}/photo-search/search?query= "
+              f"({stats['photos']} photos indexed)")
     print(f"\nPress Ctrl+C to stop the server\n")
-    
-    with socketserver.TCPServer(("0.0.0.0", PORT), NoCacheHTTPRequestHandler) as httpd:
+
+    with server_class(("0.0.0.0", args.port), NoCacheHTTPRequestHandler) as httpd:
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
+            if args.api_proxy:
+                NoCacheHTTPRequestHandler.api_proxy.print_report()
             print("\n\n👋 Server stopped")
             sys.exit(0)
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+OpenAPI Schema Diff Engine
+Compares MAIN-API-DOCUMENTATION.yaml (old) with API_new.yaml (new) and
+regenerates the three analysis files we keep in the repo:
+
+    schema_comparison.json       endpoints (METHOD path) added / removed / modified
+    deep_schema_comparison.json  component schemas added / removed / modified
+    new_schema_analysis.json     every endpoint of the new spec, grouped by tag
+
+Speed:
+- YAML is parsed with the libyaml CSafeLoader when available (pure-Python
+  SafeLoader otherwise), and the parsed form is pickled to .openapi_cache/
+  keyed on the file's size and mtime, so unchanged specs load instantly
+- $refs are resolved once per component, and each component gets one
+  memoized fingerprint (hash of its canonical JSON) and one memoized set of
+  transitively referenced components
+- endpoints are compared on their raw operation plus the fingerprints of the
+  components they reference, so a change to a shared schema marks every
+  endpoint that uses it as modified without re-walking the schema per endpoint
+
+Usage:
+    python3 openapi_diff.py
+    python3 openapi_diff.py --old MAIN-API-DOCUMENTATION.yaml --new API_new.yaml --output-dir .
+    python3 openapi_diff.py --no-cache
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+from collections import OrderedDict
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SpecLoader
+except ImportError:  # libyaml not compiled in
+    from yaml import SafeLoader as SpecLoader
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OLD_SPEC = os.path.join(BASE_DIR, "MAIN-API-DOCUMENTATION.yaml")
+DEFAULT_NEW_SPEC = os.path.join(BASE_DIR, "API_new.yaml")
+DEFAULT_CACHE_DIR = os.path.join(BASE_DIR, ".openapi_cache")
+CACHE_FORMAT = 1
+
+HTTP_METHODS = ("get", "post", "put", "patch", "delete", "head", "options", "trace")
+REF_PREFIX = "#/components/schemas/"
+
+# Field order and defaults of the entries in new_schema_analysis.json
+ENDPOINT_FIELDS = (
+    ("operationId", ""),
+    ("tags", []),
+    ("summary", ""),
+    ("description", ""),
+    ("parameters", []),
+    ("requestBody", {}),
+    ("responses", {}),
+    ("security", []),
+)
+
+
+# ============================================================================
+# LOADING
+# ============================================================================
+
+def load_spec(path, cache_dir=DEFAULT_CACHE_DIR):
+    """Parse an OpenAPI YAML file, reusing the pickled parse if the file is unchanged"""
+    stat = os.stat(path)
+    signature = (CACHE_FORMAT, stat.st_size, stat.st_mtime_ns)
+    cache_path = None
+    if cache_dir:
+        name = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest() + ".pickle"
+        cache_path = os.path.join(cache_dir, name)
+        try:
+            with open(cache_path, "rb") as f:
+                cached_signature, spec = pickle.load(f)
+            if cached_signature == signature:
+                return spec
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            pass
+
+    with open(path, "rb") as f:
+        spec = yaml.load(f, Loader=SpecLoader)
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((signature, spec), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    return spec
+
+
+def iter_operations(spec):
+    """Yield ("METHOD /path", path, method, operation) in document order"""
+    for path, item in (spec.get("paths") or {}).items():
+        for method, operation in item.items():
+            if method in HTTP_METHODS:
+                yield f"{method.upper()} {path}", path, method, operation
+
+
+# ============================================================================
+# $REF RESOLUTION
+# ============================================================================
+
+def _canonical(node):
+    return json.dumps(node, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class SchemaIndex:
+    """Memoized $ref lookups, transitive references and fingerprints for one spec"""
+
+    def __init__(self, spec):
+        self.schemas = (spec.get("components") or {}).get("schemas") or {}
+        self._direct = {}
+        self._closure = {}
+        self._fingerprints = {}
+
+    @staticmethod
+    def refs_in(node, found=None):
+        """Names of the component schemas referenced directly inside node"""
+        if found is None:
+            found = set()
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, dict):
+                ref = current.get("$ref")
+                if isinstance(ref, str) and ref.startswith(REF_PREFIX):
+                    found.add(ref[len(REF_PREFIX):])
+                stack.extend(current.values())
+            elif isinstance(current, list):
+                stack.extend(current)
+        return found
+
+    def direct_refs(self, name):
+        if name not in self._direct:
+            self._direct[name] = frozenset(self.refs_in(self.schemas.get(name)))
+        return self._direct[name]
+
+    def closure(self, name):
+        """Every schema reachable from name (itself included), cycle safe"""
+        if name in self._closure:
+            return self._closure[name]
+        seen = {name}
+        stack = [name]
+        while stack:
+            for ref in self.direct_refs(stack.pop()):
+                if ref in self._closure:
+                    seen |= self._closure[ref]
+                elif ref not in seen:
+                    seen.add(ref)
+                    stack.append(ref)
+        self._closure[name] = frozenset(seen)
+        return self._closure[name]
+
+    def closure_of(self, node):
+        names = set()
+        for name in self.refs_in(node):
+            names |= self.closure(name)
+        return names
+
+    def fingerprint(self, name):
+        """Hash of the raw schema; None for a dangling reference"""
+        if name not in self._fingerprints:
+            schema = self.schemas.get(name)
+            self._fingerprints[name] = (
+                None if schema is None else hashlib.sha1(_canonical(schema).encode("utf-8")).hexdigest()
+            )
+        return self._fingerprints[name]
+
+
+# ============================================================================
+# STRUCTURAL DIFF
+# ============================================================================
+
+def _parameter_key(parameter):
+    if isinstance(parameter, dict):
+        if "$ref" in parameter:
+            return parameter["$ref"]
+        return f"{parameter.get('in', '')}:{parameter.get('name', '')}"
+    return _canonical(parameter)
+
+
+def diff_nodes(old, new, location="", changes=None):
+    """
+    Structural diff of two YAML nodes.
+
+    Returns a list of {"location", "change": added|removed|changed, "old", "new"}.
+    Parameter lists are matched by in/name instead of position so that
+    inserting a parameter does not show up as every later one changing.
+    """
+    if changes is None:
+        changes = []
+    if old == new:
+        return changes
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            child = f"{location}.{key}" if location else str(key)
+            if key not in new:
+                changes.append({"location": child, "change": "removed", "old": old[key]})
+            else:
+                diff_nodes(old[key], new[key], child, changes)
+        for key in new:
+            if key not in old:
+                child = f"{location}.{key}" if location else str(key)
+                changes.append({"location": child, "change": "added", "new": new[key]})
+        return changes
+
+    if (isinstance(old, list) and isinstance(new, list)
+            and location.rsplit(".", 1)[-1] == "parameters"):
+        old_by_key = OrderedDict((_parameter_key(p), p) for p in old)
+        new_by_key = OrderedDict((_parameter_key(p), p) for p in new)
+        return diff_nodes(old_by_key, new_by_key, location, changes)
+
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            diff_nodes(old_item, new_item, f"{location}[{index}]", changes)
+        return changes
+
+    changes.append({"location": location, "change": "changed", "old": old, "new": new})
+    return changes
+
+
+def compare_components(old_index, new_index):
+    old_names = set(old_index.schemas)
+    new_names = set(new_index.schemas)
+    modified = []
+    for name in sorted(old_names & new_names):
+        if old_index.fingerprint(name) != new_index.fingerprint(name):
+            modified.append({
+                "schema": name,
+                "changes": diff_nodes(old_index.schemas[name], new_index.schemas[name]),
+            })
+    return {
+        "old_count": len(old_names),
+        "new_count": len(new_names),
+        "added": sorted(new_names - old_names),
+        "removed": sorted(old_names - new_names),
+        "modified": modified,
+    }
+
+
+def compare_endpoints(old_spec, new_spec, old_index, new_index):
+    old_ops = {key: operation for key, _path, _method, operation in iter_operations(old_spec)}
+    new_ops = {key: operation for key, _path, _method, operation in iter_operations(new_spec)}
+
+    modified = []
+    for key, new_operation in new_ops.items():
+        old_operation = old_ops.get(key)
+        if old_operation is None:
+            continue
+        changes = diff_nodes(old_operation, new_operation)
+        # Component schemas this endpoint reaches (through any depth of $ref)
+        # whose definition differs between the two specs
+        reachable = old_index.closure_of(old_operation) | new_index.closure_of(new_operation)
+        changed_schemas = sorted(
+            name for name in reachable if old_index.fingerprint(name) != new_index.fingerprint(name)
+        )
+        if changes or changed_schemas:
+            modified.append({"endpoint": key, "changes": changes, "changed_schemas": changed_schemas})
+
+    return {
+        "old_count": len(old_ops),
+        "new_count": len(new_ops),
+        "added": [key for key in new_ops if key not in old_ops],
+        "removed": [key for key in old_ops if key not in new_ops],
+        "modified": modified,
+    }
+
+
+def analyze_spec(spec):
+    """The new_schema_analysis.json structure: every endpoint plus a by-tag index"""
+    endpoints = OrderedDict()
+    by_tags = OrderedDict()
+    for key, path, method, operation in iter_operations(spec):
+        entry = OrderedDict([("path", path), ("method", method.upper())])
+        for field, default in ENDPOINT_FIELDS:
+            entry[field] = operation.get(field, default)
+        endpoints[key] = entry
+        for tag in entry["tags"] or ["untagged"]:
+            by_tags.setdefault(tag, []).append(key)
+    return {"total_endpoints": len(endpoints), "endpoints": endpoints, "by_tags": by_tags}
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def run_diff(old_path, new_path, output_dir, cache_dir=DEFAULT_CACHE_DIR):
+    timings = OrderedDict()
+    started = time.perf_counter()
+    old_spec = load_spec(old_path, cache_dir)
+    new_spec = load_spec(new_path, cache_dir)
+    timings["load"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    old_index = SchemaIndex(old_spec)
+    new_index = SchemaIndex(new_spec)
+    components = compare_components(old_index, new_index)
+    endpoints = compare_endpoints(old_spec, new_spec, old_index, new_index)
+    analysis = analyze_spec(new_spec)
+    timings["diff"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    write_json(os.path.join(output_dir, "schema_comparison.json"), endpoints)
+    write_json(os.path.join(output_dir, "deep_schema_comparison.json"), {"component_schemas": components})
+    write_json(os.path.join(output_dir, "new_schema_analysis.json"), analysis)
+    timings["write"] = time.perf_counter() - started
+    return endpoints, components, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two OpenAPI specs and regenerate the schema analysis files")
+    parser.add_argument("--old", default=DEFAULT_OLD_SPEC, help="Old spec (default: MAIN-API-DOCUMENTATION.yaml)")
+    parser.add_argument("--new", default=DEFAULT_NEW_SPEC, help="New spec (default: API_new.yaml)")
+    parser.add_argument("--output-dir", default=BASE_DIR)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="Always re-parse the YAML files")
+    args = parser.parse_args()
+
+    for path in (args.old, args.new):
+        if not os.path.exists(path):
+            print(f"❌ Not found: {path}")
+            sys.exit(1)
+
+    print("=" * 80)
+    print("OPENAPI SCHEMA DIFF")
+    print("=" * 80)
+    print(f"Old: {args.old}")
+    print(f"New: {args.new}")
+    print(f"Loader: {SpecLoader.__name__}")
+
+    endpoints, components, timings = run_diff(
+        args.old, args.new, args.output_dir, cache_dir=None if args.no_cache else args.cache_dir
+    )
+
+    print(f"\n📋 Endpoints: {endpoints['old_count']} -> {endpoints['new_count']}  "
+          f"(+{len(endpoints['added'])} -{len(endpoints['removed'])} ~{len(endpoints['modified'])})")
+    for key in endpoints["added"]:
+        print(f"   ➕ {key}")
+    for key in endpoints["removed"]:
+        print(f"   ➖ {key}")
+    for entry in endpoints["modified"]:
+        via = f" (via {', '.join(entry['changed_schemas'])})" if entry["changed_schemas"] else ""
+        print(f"   ✏️  {entry['endpoint']}: {len(entry['changes'])} direct change(s){via}")
+
+    print(f"\n🧩 Component schemas: {components['old_count']} -> {components['new_count']}  "
+          f"(+{len(components['added'])} -{len(components['removed'])} ~{len(components['modified'])})")
+    for name in components["added"]:
+        print(f"   ➕ {name}")
+    for name in components["removed"]:
+        print(f"   ➖ {name}")
+    for entry in components["modified"]:
+        for change in entry["changes"]:
+            print(f"   ✏️  {entry['schema']}.{change['location']}: {change['change']}")
+
+    print(f"\n⏱️  load {timings['load'] * 1000:.0f}ms, diff {timings['diff'] * 1000:.0f}ms, "
+          f"write {timings['write'] * 1000:.0f}ms")
+    print(f"✅ Wrote schema_comparison.json, deep_schema_comparison.json, new_schema_analysis.json "
+          f"to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
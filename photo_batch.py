@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Bulk Photo Operations
+Applies the Gallery batch endpoints to every photo matching a search, in
+one resumable command instead of photo by photo:
+
+    delete    POST /api/photos/batch/delete
+    favorite  POST /api/photos/batch/favorite
+    rotate    POST /api/photos/batch/rotate   (--direction left|right)
+
+1. Selection: /api/photos/search with --query / --trip-level / --camera,
+   paged by offset (pages fetched in parallel once the total is known), plus
+   client-side --from / --to (created_at), --gallery and --uploader filters
+   the search endpoint does not offer. Matching ids stream into the
+   checkpoint file. Selection finishes before anything is changed, so
+   deletes cannot shift the search offsets under us.
+2. Apply: ids are sent in chunks by --concurrency workers. The chunk size
+   adapts: it grows while chunks finish well under --target-seconds and
+   halves on timeouts, 413 and 5xx (the failed chunk is split and requeued).
+   Every chunk is POSTed once - never retried blindly, because a resent
+   rotate turns the photo twice. 429 pauses all workers (Retry-After) and
+   the rejected chunk is resent. A rotate chunk that timed out or got a 5xx
+   may have been applied, so it is recorded as failed instead of requeued.
+   Per-photo failures from a partial success are recorded, not retried.
+3. Checkpoint (--checkpoint, written atomically after every chunk): the
+   selection, done / failed ids and chunks in flight. Rerunning the same
+   command resumes. In-flight chunks are re-sent for delete and favorite;
+   for rotate, which is not idempotent, they are reported instead unless
+   --retry-inflight is given.
+
+Without --yes, delete and rotate only select and print what they would change.
+
+Usage:
+    python3 photo_batch.py delete --camera "DJI" --from 2024-01-01 --to 2024-01-31
+    python3 photo_batch.py delete --gallery gallery-abc123 --yes
+    python3 photo_batch.py favorite --query sunset --trip-level moderate
+    python3 photo_batch.py rotate --direction left --query IMG_20250105 --yes
+
+As a module:
+    from photo_batch import BatchRunner, select_photos
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from probe_client import (GALLERY_API, MAIN_API, AuthenticationError, authenticate, call_with_retry, client,
+                          stream_pages)
+
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "photo_batch_checkpoint.json")
+SEARCH_PAGE_SIZE = 200
+DEFAULT_CONCURRENCY = 4
+DEFAULT_CHUNK = 50
+MIN_CHUNK = 1
+MAX_CHUNK = 500
+DEFAULT_TARGET_SECONDS = 5.0
+BATCH_TIMEOUT = 120
+DEFAULT_THROTTLE_SECONDS = 5.0
+MAX_THROTTLES = 8  # consecutive 429s before a chunk is given up
+OPERATIONS = ("delete", "favorite", "rotate")
+# Operations that are safe to send twice
+IDEMPOTENT = {"delete", "favorite"}
+
+
+# ============================================================================
+# SELECTION
+# ============================================================================
+
+def matches(photo, filters):
+    """Client-side filters the search endpoint does not support"""
+    created = str(photo.get("created_at") or "")[:10]
+    if filters.get("from") and (not created or created < filters["from"]):
+        return False
+    if filters.get("to") and (not created or created > filters["to"]):
+        return False
+    if filters.get("gallery") and photo.get("gallery_id") != filters["gallery"]:
+        return False
+    if filters.get("uploader") and photo.get("uploaded_by_username") != filters["uploader"]:
+        return False
+    return True
+
+
+def select_photos(gallery_url, headers, filters, concurrency=DEFAULT_CONCURRENCY):
+    """Yield every photo of /api/photos/search matching filters, page by page"""
+    url = f"{gallery_url}/api/photos/search"
+    params = {key: filters[name] for name, key in (("query", "query"), ("trip_level", "trip_level"),
+                                                    ("camera", "camera")) if filters.get(name)}
+    params.setdefault("query", "")
+
+    def fetch_page(page):
+        response = call_with_retry("GET", url, headers=headers,
+                                   params=dict(params, limit=SEARCH_PAGE_SIZE, offset=(page - 1) * SEARCH_PAGE_SIZE))
+        if response.status_code != 200:
+            raise RuntimeError(f"photos/search offset {(page - 1) * SEARCH_PAGE_SIZE}: {response.status_code}")
+        return response.json()
+
+    def page_count(data):
+        return math.ceil((data.get("total") or 0) / SEARCH_PAGE_SIZE)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for data in stream_pages(fetch_page, page_count, pool):
+            for photo in data.get("photos", []):
+                if matches(photo, filters):
+                    yield photo
+
+
+# ============================================================================
+# CHECKPOINT
+# ============================================================================
+
+class Checkpoint:
+    """Selection and progress of one bulk operation, saved atomically"""
+
+    def __init__(self, path, operation, direction, filters):
+        self.path = path
+        self.job = {"operation": operation, "direction": direction, "filters": filters}
+        self.selected = []
+        self.selection_complete = False
+        self.done = set()
+        self.failed = {}
+        self.inflight = {}  # chunk key -> ids
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path, operation, direction, filters, fresh=False):
+        checkpoint = cls(path, operation, direction, filters)
+        if fresh or not os.path.exists(path):
+            return checkpoint
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("job") != checkpoint.job:
+            raise ValueError(f"{path} belongs to another job ({data.get('job')}); use --fresh or --checkpoint")
+        checkpoint.selected = data.get("selected", [])
+        checkpoint.selection_complete = data.get("selection_complete", False)
+        checkpoint.done = set(data.get("done", []))
+        checkpoint.failed = data.get("failed", {})
+        checkpoint.inflight = data.get("inflight", {})
+        return checkpoint
+
+    def save(self):
+        with self._lock:
+            data = {"job": self.job, "saved_at": datetime.now().isoformat(), "selected": self.selected,
+                    "selection_complete": self.selection_complete, "done": sorted(self.done),
+                    "failed": self.failed, "inflight": self.inflight}
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def start_chunk(self, ids):
+        key = f"{ids[0]}+{len(ids)}@{time.time():.6f}"
+        with self._lock:
+            self.inflight[key] = ids
+        self.save()
+        return key
+
+    def finish_chunk(self, key, done=(), failed=None, requeue=False):
+        with self._lock:
+            self.inflight.pop(key, None)
+            self.done.update(done)
+            self.failed.update(failed or {})
+        if not requeue:
+            self.save()
+
+    def pending(self, retry_inflight):
+        """Ids still to send, and in-flight ids held back"""
+        inflight = {photo_id for ids in self.inflight.values() for photo_id in ids}
+        settled = self.done | set(self.failed)
+        held = set() if retry_inflight else inflight
+        todo = [photo_id for photo_id in self.selected if photo_id not in settled and photo_id not in held]
+        if retry_inflight:
+            self.inflight = {}
+        return todo, sorted(inflight - settled) if not retry_inflight else []
+
+
+# ============================================================================
+# APPLY
+# ============================================================================
+
+class ChunkSizer:
+    """Shared adaptive chunk size: grow while fast, halve on trouble"""
+
+    def __init__(self, initial, target_seconds):
+        self.size = initial
+        self.target = target_seconds
+        self._lock = threading.Lock()
+
+    def succeeded(self, size, seconds):
+        with self._lock:
+            if size >= self.size and seconds < self.target / 2:
+                self.size = min(MAX_CHUNK, int(self.size * 1.5) + 1)
+            elif seconds > self.target:
+                self.size = max(MIN_CHUNK, self.size // 2)
+
+    def failed(self):
+        with self._lock:
+            self.size = max(MIN_CHUNK, self.size // 2)
+
+
+class BatchRunner:
+    """Sends ids to one batch endpoint in adaptive, checkpointed chunks"""
+
+    def __init__(self, gallery_url, headers, operation, checkpoint, direction=None,
+                 concurrency=DEFAULT_CONCURRENCY, chunk=DEFAULT_CHUNK, target_seconds=DEFAULT_TARGET_SECONDS):
+        self.url = f"{gallery_url}/api/photos/batch/{operation}"
+        self.headers = headers
+        self.operation = operation
+        self.direction = direction
+        self.checkpoint = checkpoint
+        self.concurrency = concurrency
+        self.sizer = ChunkSizer(chunk, target_seconds)
+        self.queue = []
+        self.stats = {"chunks": 0, "splits": 0, "requests": 0, "throttled": 0}
+        self._lock = threading.Lock()
+        self._active = 0
+        self._paused_until = 0.0
+        self._throttles = 0
+
+    def _next_chunk(self):
+        with self._lock:
+            if not self.queue or time.monotonic() < self._paused_until:
+                return None
+            size = self.sizer.size
+            chunk, self.queue = self.queue[:size], self.queue[size:]
+            self._active += 1
+            return chunk
+
+    def _send(self, ids):
+        payload = {"photo_ids": ids}
+        if self.direction:
+            payload["direction"] = self.direction
+        with self._lock:
+            self.stats["requests"] += 1
+        return client.post(self.url, headers=self.headers, json=payload, timeout=BATCH_TIMEOUT)
+
+    def _throttled(self, key, ids, response):
+        """429: pause every worker and put the (unapplied) chunk back in front"""
+        retry_after = response.headers.get("Retry-After", "")
+        delay = float(retry_after) if retry_after.isdigit() else DEFAULT_THROTTLE_SECONDS
+        with self._lock:
+            self._throttles += 1
+            if self._throttles > MAX_THROTTLES:
+                give_up = True
+            else:
+                give_up = False
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self.queue[:0] = ids
+                self.stats["throttled"] += 1
+        if give_up:
+            self.checkpoint.finish_chunk(key, failed={photo_id: "HTTP 429" for photo_id in ids})
+        else:
+            self.checkpoint.finish_chunk(key, requeue=True)
+
+    def _apply(self, ids):
+        key = self.checkpoint.start_chunk(ids)
+        started = time.monotonic()
+        try:
+            response = self._send(ids)
+        except requests.exceptions.RequestException:
+            response = None
+        elapsed = time.monotonic() - started
+
+        if response is not None and response.status_code == 429:
+            self._throttled(key, ids, response)
+            return
+        with self._lock:
+            self._throttles = 0
+        if response is None or response.status_code == 413 or response.status_code >= 500:
+            # Too big or too slow: split and requeue (a single id that keeps failing is recorded)
+            self.sizer.failed()
+            status = f"HTTP {response.status_code}" if response is not None else "timeout"
+            if self.operation not in IDEMPOTENT and (response is None or response.status_code >= 500):
+                # A rotate that timed out or failed server-side may have been applied; never resend it
+                self.checkpoint.finish_chunk(key, failed={photo_id: f"{status} (may have been applied)"
+                                                          for photo_id in ids})
+                return
+            if len(ids) == 1:
+                self.checkpoint.finish_chunk(key, failed={ids[0]: status})
+                return
+            # The halved chunk size splits it when it is taken again
+            with self._lock:
+                self.queue[:0] = ids
+                self.stats["splits"] += 1
+            self.checkpoint.finish_chunk(key, requeue=True)
+            return
+        if response.status_code != 200:
+            self.checkpoint.finish_chunk(key, failed={photo_id: f"HTTP {response.status_code}: {response.text[:80]}"
+                                                      for photo_id in ids})
+            return
+
+        self.sizer.succeeded(len(ids), elapsed)
+        results = response.json().get("results")
+        if results is None:
+            done, failed = ids, {}
+        else:
+            done = [r["id"] for r in results if r.get("success")]
+            failed = {r["id"]: r.get("error") or "failed" for r in results if not r.get("success")}
+            # Ids the response does not mention are treated as failed, never silently done
+            reported = set(done) | set(failed)
+            failed.update({photo_id: "missing from response" for photo_id in ids if photo_id not in reported})
+        with self._lock:
+            self.stats["chunks"] += 1
+        self.checkpoint.finish_chunk(key, done=done, failed=failed)
+
+    def _work(self):
+        while True:
+            ids = self._next_chunk()
+            if ids is None:
+                with self._lock:
+                    # Other workers may still requeue split chunks
+                    if self._active == 0 and not self.queue:
+                        return
+                time.sleep(0.05)
+                continue
+            try:
+                self._apply(ids)
+            except Exception as e:
+                print(f"   ❌ chunk of {len(ids)} from {ids[0]}: {e}")
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+    def run(self, ids, progress_every=5.0):
+        self.queue = list(ids)
+        total = len(self.queue)
+        threads = [threading.Thread(target=self._work, daemon=True) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=progress_every)
+            with self._lock:
+                remaining = len(self.queue)
+            print(f"   ... {total - remaining}/{total} sent, chunk size {self.sizer.size}")
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply Gallery batch operations to searched photos")
+    parser.add_argument("operation", choices=OPERATIONS)
+    parser.add_argument("--base-url", default=MAIN_API, help="Main API base URL (login)")
+    parser.add_argument("--gallery-url", default=GALLERY_API, help="Gallery API base URL")
+    parser.add_argument("--query", help="Search term (filename, gallery name)")
+    parser.add_argument("--trip-level", help="Trip level filter")
+    parser.add_argument("--camera", help="Camera make or model")
+    parser.add_argument("--from", dest="date_from", help="created_at on or after YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", help="created_at on or before YYYY-MM-DD")
+    parser.add_argument("--gallery", help="Only photos of this gallery id")
+    parser.add_argument("--uploader", help="Only photos uploaded by this username")
+    parser.add_argument("--direction", choices=("left", "right"), help="Rotation direction (rotate)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="Initial chunk size")
+    parser.add_argument("--target-seconds", type=float, default=DEFAULT_TARGET_SECONDS,
+                        help="Chunk duration the adaptive size aims below")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--fresh", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--retry-inflight", action="store_true",
+                        help="Re-send chunks that were in flight when a previous run stopped")
+    parser.add_argument("--yes", action="store_true", help="Really delete / rotate")
+    args = parser.parse_args()
+
+    if args.operation == "rotate" and not args.direction:
+        parser.error("rotate needs --direction left|right")
+    filters = {name: value for name, value in (
+        ("query", args.query), ("trip_level", args.trip_level), ("camera", args.camera),
+        ("from", args.date_from), ("to", args.date_to), ("gallery", args.gallery), ("uploader", args.uploader))
+        if value}
+    if not filters and args.operation == "delete":
+        parser.error("refusing to delete without any filter")
+    gallery_url = args.gallery_url.rstrip("/")
+
+    try:
+        checkpoint = Checkpoint.open(args.checkpoint, args.operation, args.direction, filters, args.fresh)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    try:
+        headers, _user_id = authenticate(args.base_url.rstrip("/"))
+    except AuthenticationError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    started = time.monotonic()
+    if checkpoint.selection_complete:
+        print(f"♻️  Resuming: {len(checkpoint.selected)} selected, {len(checkpoint.done)} done, "
+              f"{len(checkpoint.failed)} failed")
+    else:
+        print(f"🔎 Selecting photos: {json.dumps(filters)}")
+        checkpoint.selected = []
+        for photo in select_photos(gallery_url, headers, filters, args.concurrency):
+            checkpoint.selected.append(photo["id"])
+        checkpoint.selected = list(dict.fromkeys(checkpoint.selected))
+        checkpoint.selection_complete = True
+        checkpoint.save()
+        print(f"   {len(checkpoint.selected)} photos selected in {time.monotonic() - started:.1f}s")
+
+    retry_inflight = args.retry_inflight or args.operation in IDEMPOTENT
+    todo, held = checkpoint.pending(retry_inflight)
+    if held:
+        print(f"⚠️  {len(held)} photos were in flight when the last run stopped and may already be rotated; "
+              f"check them or pass --retry-inflight")
+    if not todo:
+        print("✅ Nothing left to do")
+        return
+    if args.operation != "favorite" and not args.yes:
+        print(f"ℹ️  Would {args.operation} {len(todo)} photos - pass --yes to apply "
+              f"(selection kept in {args.checkpoint})")
+        return
+
+    print(f"🚀 {args.operation} {len(todo)} photos, {args.concurrency} workers, chunks from {args.chunk}")
+    applied = time.monotonic()
+    runner = BatchRunner(gallery_url, headers, args.operation, checkpoint, args.direction,
+                         args.concurrency, args.chunk, args.target_seconds)
+    runner.run(todo)
+    checkpoint.save()
+
+    done_now = sum(1 for photo_id in todo if photo_id in checkpoint.done)
+    failed_now = {photo_id: checkpoint.failed[photo_id] for photo_id in todo if photo_id in checkpoint.failed}
+    elapsed = time.monotonic() - applied
+    print(f"\n✅ {done_now} photos {args.operation}d, {len(failed_now)} failed in {elapsed:.1f}s "
+          f"({done_now / elapsed if elapsed else 0:.0f}/s, {runner.stats['requests']} requests, "
+          f"{runner.stats['splits']} chunk splits, {runner.stats['throttled']} throttled, final chunk size {runner.sizer.size})")
+    for photo_id, error in list(failed_now.items())[:10]:
+        print(f"   ❌ {photo_id}: {error}")
+    if len(failed_now) > 10:
+        print(f"   ... {len(failed_now) - 10} more in {args.checkpoint}")
+    client.print_metrics()
+    sys.exit(1 if failed_now else 0)
+
+
+if __name__ == "__main__":
+    main()
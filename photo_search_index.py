@@ -0,0 +1,653 @@
+#!/usr/bin/env python3
+"""
+Local Photo Search Index
+Keeps a local SQLite copy of the Gallery photo metadata and answers photo
+searches offline, instead of sending GET /api/photos/search to the server
+for every query (and, in the app's search screen, every keystroke).
+
+1. sync: lists every gallery, then re-lists the photos of only those
+   galleries whose listing entry changed since the last sync (photo count,
+   latest photo date, name, trip level, updated_at). Photos are fetched
+   with gallery_backup.list_photos, galleries in parallel. Each gallery is
+   replaced in one transaction, so a failed gallery keeps its old rows and
+   is retried next time. Galleries gone from a complete listing (or
+   soft-deleted) are removed. --full re-lists everything.
+2. Index (.photo_search_index.db): one row per photo with the EXIF camera,
+   date taken (created_at when there is no EXIF date), gallery, trip level,
+   uploader and location, B-tree indexes on every filter column and an
+   FTS5 table over the text fields (prefix-indexed, so "sun" finds
+   "sunset"). Without FTS5 the text search falls back to LIKE.
+3. search: free text plus --trip-level / --camera / --uploader / --gallery /
+   --from / --to filters, with the total and per-facet counts (trip level,
+   camera, uploader, gallery, year). Each facet is counted with every
+   filter except its own, so the counts show what picking another value
+   would return. The last results are memoized until the index is written
+   to (PRAGMA data_version), so retyped prefixes cost nothing.
+4. suggest: typeahead values (camera, uploader, gallery, location) for a
+   prefix, with photo counts.
+5. serve / nocache_server.py --photo-search: the same queries over HTTP
+
+       /photo-search/search?query=&trip_level=&camera=&uploader=&gallery=&from=&to=&limit=&offset=
+       /photo-search/suggest?q=&limit=
+       /photo-search/__stats
+
+   Responses keep the /api/photos/search shape (success, photos, total,
+   query, filters_applied) plus facets and took_ms. Photos of private
+   galleries are only returned when the request's Authorization token is
+   valid - checked against the Gallery API's /api/auth/profile and cached
+   for a few minutes (gallery_media_proxy.TokenValidator). Missing, bogus or
+   unverifiable tokens see public galleries only.
+
+Usage:
+    python3 photo_search_index.py sync [--full]
+    python3 photo_search_index.py search --query sunset --trip-level intermediate
+    python3 photo_search_index.py search --camera "Apple iPhone 15 Pro Max" --from 2025-01-01
+    python3 photo_search_index.py suggest iph
+    python3 photo_search_index.py serve [--port 5062]
+    python3 nocache_server.py --photo-search      (mounted at /photo-search/*)
+"""
+
+import argparse
+import http.server
+import json
+import os
+import re
+import socketserver
+import sqlite3
+import sys
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from gallery_backup import list_photos
+from gallery_media_proxy import TokenValidator
+from probe_client import GALLERY_API, MAIN_API, AuthenticationError, Index, authenticate, client, load_galleries
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.path.join(BASE_DIR, ".photo_search_index.db")
+PROXY_PREFIX = "/photo-search"
+STATS_PATH = "/__stats"
+PORT = 5062
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+FACET_LIMIT = 10
+SUGGEST_LIMIT = 8
+RESULT_CACHE_SIZE = 256
+
+# Gallery listing fields that change when its photos or their index columns do
+SIGNATURE_FIELDS = ("photo_count", "latest_photo_date", "updated_at", "name", "trip_level", "trip_level_name",
+                    "is_public")
+# Facet name -> (group by expression, label expression)
+FACETS = {
+    "trip_level": ("trip_level_name", "trip_level_name"),
+    "camera": ("camera", "camera"),
+    "uploader": ("uploader", "uploader"),
+    "gallery": ("gallery_id", "gallery_name"),
+    "year": ("substr(taken_date, 1, 4)", "substr(taken_date, 1, 4)"),
+}
+SUGGEST_FIELDS = ("camera", "uploader", "gallery_name", "location")
+TEXT_FIELDS = ("gallery_name", "filename", "camera", "uploader", "location")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    id TEXT NOT NULL UNIQUE,
+    gallery_id TEXT NOT NULL,
+    gallery_name TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    trip_level INTEGER,
+    trip_level_name TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    is_public INTEGER NOT NULL DEFAULT 1,
+    camera_make TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    camera_model TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    camera TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    uploader TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    location TEXT NOT NULL DEFAULT '' COLLATE NOCASE,
+    filename TEXT NOT NULL DEFAULT '',
+    taken_date TEXT NOT NULL DEFAULT '',
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS photos_gallery ON photos (gallery_id);
+CREATE INDEX IF NOT EXISTS photos_trip_level ON photos (trip_level);
+CREATE INDEX IF NOT EXISTS photos_trip_level_name ON photos (trip_level_name);
+CREATE INDEX IF NOT EXISTS photos_camera ON photos (camera);
+CREATE INDEX IF NOT EXISTS photos_camera_make ON photos (camera_make);
+CREATE INDEX IF NOT EXISTS photos_camera_model ON photos (camera_model);
+CREATE INDEX IF NOT EXISTS photos_uploader ON photos (uploader);
+CREATE INDEX IF NOT EXISTS photos_taken ON photos (taken_date);
+CREATE INDEX IF NOT EXISTS photos_taken_year ON photos (substr(taken_date, 1, 4));
+-- The API JSON lives apart so facet scans read narrow rows
+CREATE TABLE IF NOT EXISTS photo_data (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS photos_data_delete AFTER DELETE ON photos BEGIN
+    DELETE FROM photo_data WHERE id = old.id;
+END;
+CREATE TABLE IF NOT EXISTS galleries (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    signature TEXT NOT NULL,
+    photos INTEGER NOT NULL,
+    synced_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS syncs (
+    synced_at TEXT NOT NULL,
+    galleries INTEGER,
+    relisted INTEGER,
+    removed INTEGER,
+    failed INTEGER,
+    photos INTEGER,
+    seconds REAL
+);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS photos_fts USING fts5(
+    gallery_name, filename, camera, uploader, location,
+    content='photos', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS photos_fts_insert AFTER INSERT ON photos BEGIN
+    INSERT INTO photos_fts (rowid, gallery_name, filename, camera, uploader, location)
+    VALUES (new.rowid, new.gallery_name, new.filename, new.camera, new.uploader, new.location);
+END;
+CREATE TRIGGER IF NOT EXISTS photos_fts_delete AFTER DELETE ON photos BEGIN
+    INSERT INTO photos_fts (photos_fts, rowid, gallery_name, filename, camera, uploader, location)
+    VALUES ('delete', old.rowid, old.gallery_name, old.filename, old.camera, old.uploader, old.location);
+END;
+"""
+
+
+def gallery_signature(gallery):
+    return json.dumps([gallery.get(field) for field in SIGNATURE_FIELDS], default=str)
+
+
+def is_deleted(gallery):
+    return bool(gallery.get("soft_deleted_at") or gallery.get("deleted_at"))
+
+
+def photo_row(photo, gallery):
+    """Index columns of one photo; EXIF fields may be top-level or under metadata"""
+    metadata = photo.get("metadata") or photo.get("exif") or {}
+
+    def field(name):
+        value = photo.get(name)
+        if value is None and isinstance(metadata, dict):
+            value = metadata.get(name)
+        return str(value).strip() if value is not None else ""
+
+    make, model = field("camera_make"), field("camera_model")
+    # "Apple" + "iPhone 15", but not "Canon" + "Canon EOS R5"
+    camera = model if make and model.lower().startswith(make.lower()) else " ".join(p for p in (make, model) if p)
+    places = []
+    for name in ("location_name", "geocoded_area", "geocoded_city", "geocoded_state", "geocoded_country"):
+        value = field(name)
+        if value and value not in places:
+            places.append(value)
+    try:
+        trip_level = int(gallery.get("trip_level"))
+    except (TypeError, ValueError):
+        trip_level = None
+    return (
+        str(photo["id"]), str(gallery["id"]), gallery.get("name") or photo.get("gallery_name") or "",
+        trip_level, gallery.get("trip_level_name") or "", 0 if gallery.get("is_public") in (0, False) else 1,
+        make, model, camera, photo.get("uploaded_by_username") or "", ", ".join(places),
+        photo.get("filename") or "", (field("date_taken") or str(photo.get("created_at") or ""))[:10],
+        photo.get("created_at"),
+    )
+
+
+def fts_query(text, column=None):
+    """Prefix match on every word: 'sun dun' -> "sun"* "dun"*"""
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    terms = " ".join(f'"{word}"*' for word in words)
+    return f"{{{column}}} : ({terms})" if column else terms
+
+
+# ============================================================================
+# INDEX
+# ============================================================================
+
+class PhotoSearchIndex:
+    """Photo metadata in SQLite: column indexes for filters and facets, FTS5 for text"""
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        try:
+            self.db.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5
+            self.fts = False
+        self._results = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    # ---- sync --------------------------------------------------------------
+
+    def signatures(self):
+        with self._lock:
+            return dict(self.db.execute("SELECT id, signature FROM galleries"))
+
+    def replace_gallery(self, gallery, photos):
+        photos = [photo for photo in photos if photo.get("id") is not None]
+        rows = [photo_row(photo, gallery) for photo in photos]
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM photos WHERE gallery_id = ?", (str(gallery["id"]),))
+            # A photo moved here from another gallery
+            self.db.executemany("DELETE FROM photos WHERE id = ?", [(row[0],) for row in rows])
+            self.db.executemany(f"INSERT INTO photos VALUES ({', '.join('?' * 14)})", rows)
+            self.db.executemany("INSERT OR REPLACE INTO photo_data VALUES (?, ?)",
+                                [(row[0], json.dumps(dict(photo, gallery_name=photo.get("gallery_name") or row[2]),
+                                                     ensure_ascii=False)) for row, photo in zip(rows, photos)])
+            self.db.execute("INSERT OR REPLACE INTO galleries VALUES (?, ?, ?, ?, ?)",
+                            (str(gallery["id"]), gallery.get("name"), gallery_signature(gallery), len(rows),
+                             datetime.now().isoformat()))
+
+    def remove_galleries(self, gallery_ids):
+        with self._lock, self.db:
+            for gallery_id in gallery_ids:
+                self.db.execute("DELETE FROM photos WHERE gallery_id = ?", (gallery_id,))
+                self.db.execute("DELETE FROM galleries WHERE id = ?", (gallery_id,))
+
+    def record_sync(self, report):
+        with self._lock, self.db:
+            self.db.execute("INSERT INTO syncs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (datetime.now().isoformat(), report["galleries"], report["relisted"],
+                             report["removed"], report["failed"], report["photos"], report["seconds"]))
+            # Planner statistics decide between filter and group-by indexes
+            self.db.execute("ANALYZE")
+
+    # ---- queries -----------------------------------------------------------
+
+    def _conditions(self, query, filters, include_private, skip=None):
+        """WHERE clauses and parameters for a search, leaving out the filter named skip"""
+        clauses, params = [], []
+        if not include_private:
+            clauses.append("is_public = 1")
+        if query:
+            if self.fts:
+                match = fts_query(query)
+                if match:
+                    clauses.append("rowid IN (SELECT rowid FROM photos_fts WHERE photos_fts MATCH ?)")
+                    params.append(match)
+            else:
+                for word in re.findall(r"\w+", query):
+                    clauses.append("(" + " OR ".join(f"{column} LIKE ?" for column in TEXT_FIELDS) + ")")
+                    params.extend([f"%{word}%"] * len(TEXT_FIELDS))
+        level = filters.get("trip_level")
+        if level and skip != "trip_level":
+            if str(level).isdigit():
+                clauses.append("trip_level = ?")
+                params.append(int(level))
+            else:
+                clauses.append("trip_level_name = ?")
+                params.append(level)
+        camera = filters.get("camera")
+        if camera and skip != "camera":
+            clauses.append("(camera = ? OR camera_make = ? OR camera_model = ?)")
+            params.extend([camera] * 3)
+        for name, column in (("uploader", "uploader"), ("gallery", "gallery_id")):
+            if filters.get(name) and skip != name:
+                clauses.append(f"{column} = ?")
+                params.append(filters[name])
+        if filters.get("from") and skip != "year":
+            clauses.append("taken_date >= ?")
+            params.append(filters["from"])
+        if filters.get("to") and skip != "year":
+            clauses.append("taken_date <= ?")
+            params.append(filters["to"])
+        return " AND ".join(clauses) or "1", params
+
+    def _cached(self, key):
+        """Memoized result for key; the memo is dropped whenever any connection has written"""
+        version = self.db.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._version:
+            self._results.clear()
+            self._version = version
+        result = self._results.get(key)
+        if result is not None:
+            self._results.move_to_end(key)
+        return result
+
+    def _remember(self, key, result):
+        self._results[key] = result
+        while len(self._results) > RESULT_CACHE_SIZE:
+            self._results.popitem(last=False)
+
+    def search(self, query="", filters=None, limit=DEFAULT_LIMIT, offset=0, include_private=True, facets=True):
+        """Photos matching query and filters, newest first, with the total and facet counts"""
+        filters = {name: value for name, value in (filters or {}).items() if value}
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        offset = max(0, int(offset))
+        started = time.perf_counter()
+        key = ("search", query, tuple(sorted(filters.items())), limit, offset, include_private, facets)
+        with self._lock:
+            result = self._cached(key)
+            if result is not None:
+                return dict(result, took_ms=round((time.perf_counter() - started) * 1000, 2))
+            where, params = self._conditions(query, filters, include_private)
+            total = self.db.execute(f"SELECT COUNT(*) FROM photos WHERE {where}", params).fetchone()[0]
+            photos = [json.loads(data) for (data,) in self.db.execute(
+                f"SELECT d.data FROM (SELECT id, taken_date, rowid AS rid FROM photos WHERE {where} "
+                f"ORDER BY taken_date DESC, rowid DESC LIMIT ? OFFSET ?) p "
+                f"JOIN photo_data d ON d.id = p.id ORDER BY p.taken_date DESC, p.rid DESC",
+                params + [limit, offset])]
+            counts = {}
+            for name, (group, label) in (FACETS.items() if facets else ()):
+                facet_where, facet_params = self._conditions(query, filters, include_private, skip=name)
+                # Unfiltered, scan the facet's own index; filtered, "+" makes SQLite narrow by the
+                # filter's index first instead of looking up every row in facet order
+                grouping = group if facet_where == "1" else f"+{group}"
+                counts[name] = [
+                    {"value": value, "label": text, "count": count}
+                    for value, text, count in self.db.execute(
+                        f"SELECT {group}, {label}, COUNT(*) FROM photos WHERE {facet_where} AND {group} != '' "
+                        f"GROUP BY {grouping} ORDER BY 3 DESC, 2 LIMIT ?", facet_params + [FACET_LIMIT])
+                ]
+            result = {
+                "success": True,
+                "photos": photos,
+                "total": total,
+                "query": query,
+                "filters_applied": filters,
+                "facets": counts,
+            }
+            self._remember(key, result)
+        return dict(result, took_ms=round((time.perf_counter() - started) * 1000, 2))
+
+    def suggest(self, prefix, limit=SUGGEST_LIMIT, include_private=True):
+        """Typeahead values starting with (a word starting with) prefix, most photos first"""
+        suggestions = []
+        key = ("suggest", prefix, limit, include_private)
+        with self._lock:
+            cached = self._cached(key)
+            if cached is not None:
+                return cached
+            for column in SUGGEST_FIELDS:
+                if self.fts:
+                    match = fts_query(prefix, column)
+                    if not match:
+                        break
+                    where = "rowid IN (SELECT rowid FROM photos_fts WHERE photos_fts MATCH ?)"
+                    params = [match]
+                else:
+                    where, params = f"{column} LIKE ?", [f"%{prefix}%"]
+                if not include_private:
+                    where += " AND is_public = 1"
+                suggestions.extend(
+                    {"field": column, "value": value, "count": count}
+                    for value, count in self.db.execute(
+                        f"SELECT {column}, COUNT(*) FROM photos WHERE {where} AND {column} != '' "
+                        f"GROUP BY {column} ORDER BY 2 DESC LIMIT ?", params + [limit]))
+            suggestions.sort(key=lambda item: -item["count"])
+            suggestions = suggestions[:limit]
+            self._remember(key, suggestions)
+        return suggestions
+
+    def stats(self):
+        with self._lock:
+            photos, galleries = self.db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT gallery_id) FROM photos").fetchone()
+            last = self.db.execute("SELECT synced_at, relisted, photos, seconds FROM syncs "
+                                   "ORDER BY rowid DESC LIMIT 1").fetchone()
+        return {
+            "photos": photos,
+            "galleries": galleries,
+            "fts": self.fts,
+            "last_sync": dict(zip(("synced_at", "relisted", "photos", "seconds"), last)) if last else None,
+            "size_mb": round(os.path.getsize(self.path) / 1e6, 2),
+        }
+
+
+# ============================================================================
+# SYNC
+# ============================================================================
+
+def sync(index, gallery_url, headers, concurrency=DEFAULT_CONCURRENCY, full=False):
+    """Re-list the photos of changed galleries; returns the sync report"""
+    started = time.monotonic()
+    known = index.signatures()
+    report = {"galleries": 0, "relisted": 0, "removed": 0, "failed": 0, "photos": 0, "errors": []}
+    # Gallery listings and their later pages get separate pools, so listings never wait on themselves
+    with ThreadPoolExecutor(max_workers=concurrency) as pool, \
+            ThreadPoolExecutor(max_workers=concurrency) as page_pool:
+        listing = Index()
+        load_galleries(gallery_url, headers, listing, pool)
+        if listing.errors:
+            raise RuntimeError("; ".join(listing.errors))
+        live = {gallery_id: gallery for gallery_id, gallery in listing.galleries_by_id.items()
+                if not is_deleted(gallery)}
+        report["galleries"] = len(live)
+        changed = [gallery_id for gallery_id, gallery in live.items()
+                   if full or known.get(gallery_id) != gallery_signature(gallery)]
+        print(f"📚 {len(live)} galleries, {len(changed)} new or changed")
+
+        listings = {pool.submit(list_photos, gallery_url, headers, gallery_id, page_pool): gallery_id
+                    for gallery_id in changed}
+        for future in as_completed(listings):
+            gallery_id = listings[future]
+            try:
+                photos = future.result()
+            except Exception as e:
+                report["failed"] += 1
+                report["errors"].append(str(e))
+                print(f"   ❌ {e}")
+                continue
+            index.replace_gallery(live[gallery_id], photos)
+            report["relisted"] += 1
+            report["photos"] += len(photos)
+
+    removed = set(known) - set(live)
+    index.remove_galleries(removed)
+    report["removed"] = len(removed)
+    report["seconds"] = round(time.monotonic() - started, 2)
+    index.record_sync(report)
+    return report
+
+
+# ============================================================================
+# HTTP
+# ============================================================================
+
+def filters_from(params):
+    return {name: params.get(name) for name in ("trip_level", "camera", "uploader", "gallery", "from", "to")}
+
+
+class PhotoSearchProxy:
+    """Serves index searches under prefix; same handles()/handle() interface as the other proxies"""
+
+    def __init__(self, index, prefix=PROXY_PREFIX, validator=None):
+        self.index = index
+        self.prefix = prefix
+        self.validator = validator or TokenValidator(GALLERY_API)
+        self.queries = 0
+        self.total_ms = 0.0
+        self._lock = threading.Lock()
+
+    def handles(self, path):
+        return path == self.prefix or path.startswith(self.prefix + "/")
+
+    def handle(self, handler, method):
+        """Serve one request on a BaseHTTPRequestHandler"""
+        parsed = urllib.parse.urlsplit(handler.path)
+        path = parsed.path[len(self.prefix):].rstrip("/") or "/"
+        params = dict(urllib.parse.parse_qsl(parsed.query))
+
+        if method != "GET":
+            return self._respond(handler, 405, {"success": False, "error": "Only GET is supported"})
+        # Private galleries only for a token the Gallery API accepts, not for any header
+        include_private = False
+        if path in ("/search", "/suggest") and handler.headers.get("Authorization"):
+            include_private = self.validator.identity(handler.headers["Authorization"]) is not None
+        started = time.perf_counter()
+        try:
+            if path == "/search":
+                body = self.index.search(params.get("query", ""), filters_from(params),
+                                         limit=params.get("limit", DEFAULT_LIMIT), offset=params.get("offset", 0),
+                                         include_private=include_private, facets=params.get("facets") != "0")
+            elif path == "/suggest":
+                body = {"success": True, "suggestions": self.index.suggest(
+                    params.get("q", ""), int(params.get("limit", SUGGEST_LIMIT)), include_private)}
+            elif path == STATS_PATH:
+                body = dict(self.index.stats(), queries=self.queries,
+                            avg_ms=round(self.total_ms / self.queries, 2) if self.queries else None)
+                return self._respond(handler, 200, body)
+            else:
+                return self._respond(handler, 404, {"success": False, "error": f"Unknown path {path}"})
+        except (ValueError, sqlite3.Error) as e:
+            return self._respond(handler, 400, {"success": False, "error": str(e)})
+        with self._lock:
+            self.queries += 1
+            self.total_ms += (time.perf_counter() - started) * 1000
+        self._respond(handler, 200, body)
+
+    def _respond(self, handler, status, body):
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+
+class PhotoSearchHandler(http.server.BaseHTTPRequestHandler):
+    """Standalone handler: the proxy is mounted at the root"""
+
+    proxy = None
+
+    def end_headers(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        super().end_headers()
+
+    def do_GET(self):
+        self.proxy.handle(self, "GET")
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.end_headers()
+
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def print_results(result):
+    print(f"\n🔎 {result['total']} photos in {result['took_ms']}ms")
+    for photo in result["photos"]:
+        print(f"   {photo.get('id')}  {str(photo.get('date_taken') or photo.get('created_at') or '')[:10]:<10}  "
+              f"{photo.get('gallery_name') or '':<30.30}  {photo.get('uploaded_by_username') or ''}")
+    for name, values in result["facets"].items():
+        if values:
+            print(f"\n   {name}: " + ", ".join(f"{value['label']} ({value['count']})" for value in values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local photo metadata search index")
+    parser.add_argument("--index", default=INDEX_PATH, help="Index database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = commands.add_parser("sync", help="Sync photo metadata from the Gallery API")
+    sync_parser.add_argument("--base-url", default=MAIN_API, help="Main API base URL (login)")
+    sync_parser.add_argument("--gallery-url", default=GALLERY_API, help="Gallery API base URL")
+    sync_parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    sync_parser.add_argument("--full", action="store_true", help="Re-list every gallery")
+
+    search_parser = commands.add_parser("search", help="Search the index")
+    search_parser.add_argument("--query", default="")
+    search_parser.add_argument("--trip-level", help="Trip level number or name")
+    search_parser.add_argument("--camera", help="Camera, make or model")
+    search_parser.add_argument("--uploader", help="Uploader username")
+    search_parser.add_argument("--gallery", help="Gallery id")
+    search_parser.add_argument("--from", dest="date_from", help="Taken on or after YYYY-MM-DD")
+    search_parser.add_argument("--to", dest="date_to", help="Taken on or before YYYY-MM-DD")
+    search_parser.add_argument("--limit", type=int, default=20)
+    search_parser.add_argument("--offset", type=int, default=0)
+    search_parser.add_argument("--json", action="store_true", help="Print the raw response")
+
+    suggest_parser = commands.add_parser("suggest", help="Typeahead suggestions for a prefix")
+    suggest_parser.add_argument("prefix")
+    suggest_parser.add_argument("--limit", type=int, default=SUGGEST_LIMIT)
+
+    commands.add_parser("stats", help="Index size and last sync")
+
+    serve_parser = commands.add_parser("serve", help="Serve searches over HTTP")
+    serve_parser.add_argument("--port", type=int, default=PORT)
+    serve_parser.add_argument("--gallery-url", default=GALLERY_API, help="Gallery API that validates tokens")
+
+    args = parser.parse_args()
+    index = PhotoSearchIndex(args.index)
+    if not index.fts:
+        print("⚠️  SQLite has no FTS5, text search falls back to LIKE")
+
+    if args.command == "sync":
+        try:
+            headers, _user_id = authenticate(args.base_url.rstrip("/"))
+        except AuthenticationError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        try:
+            report = sync(index, args.gallery_url.rstrip("/"), headers, args.concurrency, args.full)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        stats = index.stats()
+        print("\n" + "=" * 80)
+        print("🗂️  PHOTO SEARCH INDEX SYNC")
+        print("=" * 80)
+        print(f"   Galleries:  {report['galleries']} listed, {report['relisted']} re-listed, "
+              f"{report['removed']} removed, {report['failed']} failed")
+        print(f"   Photos:     {report['photos']} fetched, {stats['photos']} indexed ({stats['size_mb']} MB)")
+        print(f"   Took:       {report['seconds']}s")
+        client.print_metrics()
+        sys.exit(1 if report["failed"] else 0)
+
+    elif args.command == "search":
+        filters = {"trip_level": args.trip_level, "camera": args.camera, "uploader": args.uploader,
+                   "gallery": args.gallery, "from": args.date_from, "to": args.date_to}
+        result = index.search(args.query, filters, args.limit, args.offset)
+        if args.json:
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+        else:
+            print_results(result)
+
+    elif args.command == "suggest":
+        started = time.perf_counter()
+        suggestions = index.suggest(args.prefix, args.limit)
+        print(f"💡 {len(suggestions)} suggestions in {(time.perf_counter() - started) * 1000:.2f}ms")
+        for item in suggestions:
+            print(f"   {item['field']:<13} {item['value']:<40} {item['count']:>6}")
+
+    elif args.command == "stats":
+        print(json.dumps(index.stats(), indent=2))
+
+    elif args.command == "serve":
+        PhotoSearchHandler.proxy = PhotoSearchProxy(index, prefix="",
+                                                    validator=TokenValidator(args.gallery_url.rstrip("/")))
+        print(f"🚀 Photo search on http://localhost:{args.port}/search?query= "
+              f"({index.stats()['photos']} photos indexed)")
+        print(f"\nPress Ctrl+C to stop the server\n")
+        with ThreadingTCPServer(("0.0.0.0", args.port), PhotoSearchHandler) as httpd:
+            try:
+                httpd.serve_forever()
+            except KeyboardInterrupt:
+                print("\n👋 Server stopped")
+                sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
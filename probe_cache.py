@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Persistent HTTP response cache for the probe scripts (SQLite-backed)
+
+Used by probe_client.ProbeClient. GET responses are stored on disk with their
+ETag / Last-Modified validators, so repeated runs of the probe scripts can:
+
+- serve reference data (levels, meeting points, choices, ...) straight from
+  disk for hours
+- replay everything else as a conditional request (If-None-Match /
+  If-Modified-Since) and reuse the cached body on 304 Not Modified
+- never cache authentication endpoints
+
+The cache is bounded by total body bytes and evicts least recently used
+entries first.
+
+Inspect or clear it with:
+    python3 probe_cache.py [--clear]
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.parse
+from collections import namedtuple
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".probe_cache.sqlite3")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# store=False: never cached. max_age: seconds served without asking the server;
+# once older, the response is revalidated (or refetched if it has no validators).
+CachePolicy = namedtuple("CachePolicy", ["name", "pattern", "store", "max_age"])
+
+CACHE_POLICIES = (
+    CachePolicy("auth", re.compile(r"/api/auth/"), False, 0),
+    CachePolicy("reference", re.compile(
+        r"/api/(levels|meetingpoints|meeting-points|faqs|strings|globalsettings)/?$"), True, 6 * 3600),
+    CachePolicy("choices", re.compile(r"/api/choices/"), True, 6 * 3600),
+    CachePolicy("gallery-settings", re.compile(r"/api/settings/public$"), True, 3600),
+)
+DEFAULT_POLICY = CachePolicy("default", None, True, 0)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+"""
+
+CachedResponse = namedtuple(
+    "CachedResponse", ["url", "status", "headers", "body", "etag", "last_modified", "stored_at"]
+)
+
+
+def policy_for(url, policies=CACHE_POLICIES):
+    path = urllib.parse.urlsplit(url).path
+    for policy in policies:
+        if policy.pattern.search(path):
+            return policy
+    return DEFAULT_POLICY
+
+
+def auth_identity(authorization):
+    """
+    Stable identity for an Authorization header.
+
+    Every login issues a new JWT, so keying on the raw token would make the
+    cache useless across runs. For JWTs we key on the user claim instead;
+    anything else falls back to a hash of the header.
+    """
+    if not authorization:
+        return ""
+    token = authorization.split(" ", 1)[-1]
+    parts = token.split(".")
+    if len(parts) == 3:
+        try:
+            padded = parts[1] + "=" * (-len(parts[1]) % 4)
+            claims = json.loads(base64.urlsafe_b64decode(padded))
+            user = claims.get("user_id") or claims.get("sub") or claims.get("username")
+            if user is not None:
+                return f"user:{user}"
+        except (ValueError, TypeError):
+            pass
+    return "token:" + hashlib.sha1(token.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite response store with conditional revalidation and LRU eviction"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, policies=CACHE_POLICIES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.policies = policies
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def policy(self, url):
+        return policy_for(url, self.policies)
+
+    @staticmethod
+    def key(url, query, authorization):
+        """Key on scheme/host/path, the full (query + params) pair list and the user"""
+        parts = urllib.parse.urlsplit(url)
+        raw = f"{parts.scheme}://{parts.netloc}{parts.path}?{sorted(query)}|{auth_identity(authorization)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def lookup(self, key):
+        """Return a CachedResponse (and mark it recently used) or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, status, headers, body, etag, last_modified, stored_at FROM responses WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        url, status, headers, body, etag, last_modified, stored_at = row
+        return CachedResponse(url, status, json.loads(headers), body, etag, last_modified, stored_at)
+
+    def is_fresh(self, cached, policy):
+        return time.time() - cached.stored_at < policy.max_age
+
+    @staticmethod
+    def conditional_headers(cached):
+        headers = {}
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+        return headers
+
+    def store(self, key, url, status, headers, body):
+        """Insert or replace an entry, then evict down to max_bytes"""
+        if len(body) > self.max_bytes:
+            return
+        lowered = {k.lower(): v for k, v in headers.items()}
+        if "no-store" in lowered.get("cache-control", ""):
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, url, status, headers, body, etag, last_modified, stored_at, last_access, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, status, json.dumps(dict(headers)), sqlite3.Binary(body),
+                 lowered.get("etag"), lowered.get("last-modified"), now, now, len(body))
+            )
+            self._evict()
+            self._db.commit()
+
+    def refresh(self, key):
+        """Reset the age of an entry after a 304 Not Modified"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE responses SET stored_at = ?, last_access = ? WHERE key = ?", (now, now, key))
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._db.execute("VACUUM")
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"entries": entries, "bytes": total, "max_bytes": self.max_bytes, "path": self.path}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the probe response cache")
+    parser.add_argument("--path", default=DEFAULT_CACHE_PATH)
+    parser.add_argument("--clear", action="store_true", help="Delete every cached response")
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.path)
+    if args.clear:
+        cache.clear()
+        print(f"🧹 Cleared {args.path}")
+    stats = cache.stats()
+    print(f"📦 {stats['entries']} responses, {stats['bytes'] / 1024 / 1024:.1f}MB "
+          f"of {stats['max_bytes'] / 1024 / 1024:.0f}MB ({stats['path']})")
+
+
+if __name__ == "__main__":
+    main()
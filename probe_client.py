@@ -0,0 +1,581 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP client for the AD4x4 probe scripts
+
+The probe scripts used to call bare requests.get/post. They now go through a
+ProbeClient, which has the same call signature as requests and returns normal
+requests.Response objects, plus:
+
+- Request coalescing (single-flight): identical concurrent GETs (same URL,
+  params and auth) share one upstream call and every waiter gets the result
+- A short-lived response memo (2s by default) so back-to-back helpers that
+  fetch the same URL do not hit the server twice. Any non-GET request clears
+  the memo, so a GET after a PATCH/DELETE always sees fresh data.
+- A persistent on-disk response cache (probe_cache.py): reference data is
+  served from disk for hours, other GETs are replayed as conditional requests
+  and reuse the cached body on 304. Set PROBE_CACHE=0 to disable it.
+- Metrics showing how many upstream calls were saved
+- Optional per-request latency breakdown (ProbeClient(timing=True), see
+  probe_timing.py): DNS, connect, TLS, TTFB and download per request, plus the
+  redirect chain, attached to each response as response.timing and
+  response.timing_hops. Timed requests use a fresh connection each and do not
+  touch the session cookie jar.
+- Optional record/replay of all traffic through cassettes (probe_vcr.py,
+  PROBE_VCR=record|replay|auto). Scripts that put the current time into test
+  data use run_clock() and pause() so a replay is deterministic and fast.
+
+Usage:
+    from probe_client import client
+
+    response = client.get(f"{GALLERY_API}/api/galleries", params={"limit": 100},
+                          headers={"Authorization": f"Bearer {token}"})
+    ...
+    client.print_metrics()
+
+The tools built on the Main API share a few helpers on top of the client:
+call_with_retry() (backoff on connection errors, 429 and 5xx; writes are
+only resent when that cannot apply them twice), authenticate() (login with
+AD4X4_USERNAME / AD4X4_PASSWORD) and fetch_all() (every page of a list
+endpoint). They raise instead of printing or exiting:
+
+    from probe_client import AuthenticationError, authenticate, fetch_all
+
+    headers, user_id = authenticate(MAIN_API)
+    levels = fetch_all(MAIN_API, "/api/levels/", headers)
+"""
+
+import copy
+import hashlib
+import math
+import os
+import random
+import socket
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from concurrent.futures import as_completed
+from datetime import timedelta
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from urllib3.exceptions import NewConnectionError
+
+import probe_timing
+from probe_cache import DEFAULT_CACHE_PATH, ResponseCache
+from probe_vcr import default_cassette
+
+# API Configuration
+MAIN_API = "https://ap.ad4x4.com"
+GALLERY_API = "https://media.ad4x4.com"
+
+# Credentials of the shared helpers (authenticate)
+USERNAME = os.environ.get("AD4X4_USERNAME", "Hani AMJ")
+PASSWORD = os.environ.get("AD4X4_PASSWORD", "")
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_MEMO_TTL = 2.0
+DEFAULT_RETRIES = 4
+LISTING_PAGE_SIZE = 100
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+METRIC_NAMES = ("requests", "upstream", "coalesced", "memo_hits", "cache_hits", "revalidated", "replayed")
+
+
+def build_response(method, url, status, headers, body):
+    """Build a requests.Response for a body that did not come off the wire"""
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body
+    response.url = url
+    response.reason = requests.status_codes._codes.get(status, ("",))[0].upper().replace("_", " ")
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.request = requests.Request(method, url).prepare()
+    return response
+
+
+def query_items(url, params):
+    """Query string of url merged with params, as a sorted list of pairs"""
+    parts = urllib.parse.urlsplit(url)
+    query = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+    params = params or {}
+    if isinstance(params, dict):
+        params = params.items()
+    query.extend((str(k), str(v)) for k, v in params)
+    return sorted(query)
+
+
+def authorization_header(headers):
+    headers = headers or {}
+    return next((v for k, v in headers.items() if k.lower() == "authorization"), "")
+
+
+class _Flight:
+    """One in-progress upstream GET that identical requests wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class ProbeClient:
+    """requests-compatible client with GET coalescing and a short response memo"""
+
+    def __init__(self, coalesce=True, memo_ttl=DEFAULT_MEMO_TTL, timeout=DEFAULT_TIMEOUT, cache=None,
+                 timing=False, cassette=None):
+        self.session = requests.Session()
+        self.coalesce = coalesce
+        self.memo_ttl = memo_ttl
+        self.timeout = timeout
+        self.cache = cache
+        self.timing = timing
+        self.cassette = cassette
+        self._timings = []  # (endpoint, phase timings, redirect count)
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._memo = {}  # key -> (expires_at, response)
+        self._metrics = defaultdict(lambda: dict.fromkeys(METRIC_NAMES, 0))
+
+    # ------------------------------------------------------------------
+    # requests-style API
+    # ------------------------------------------------------------------
+
+    def get(self, url, params=None, **kwargs):
+        return self.request("GET", url, params=params, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request("POST", url, data=data, json=json, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.request("PUT", url, data=data, **kwargs)
+
+    def patch(self, url, data=None, **kwargs):
+        return self.request("PATCH", url, data=data, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        """Send a request; identical concurrent GETs share one upstream call"""
+        method = method.upper()
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint = self._endpoint_label(method, url)
+
+        with self._lock:
+            self._metrics[endpoint]["requests"] += 1
+
+        if method != "GET" or not self._coalescible(kwargs):
+            if method != "GET":
+                # Writes may change anything we memoized
+                with self._lock:
+                    self._memo.clear()
+            return self._send(endpoint, method, url, **kwargs)
+
+        key = self._request_key(url, kwargs)
+        now = time.monotonic()
+
+        with self._lock:
+            memo = self._memo.get(key)
+            if memo and memo[0] > now:
+                self._metrics[endpoint]["memo_hits"] += 1
+                return self._clone(memo[1])
+
+            flight = self._flights.get(key) if self.coalesce else None
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                if self.coalesce:
+                    self._flights[key] = flight
+            else:
+                self._metrics[endpoint]["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return self._clone(flight.response)
+
+        try:
+            response = self._fetch_get(endpoint, url, kwargs)
+            flight.response = response
+            if self.memo_ttl and 200 <= response.status_code < 300:
+                with self._lock:
+                    self._memo[key] = (time.monotonic() + self.memo_ttl, response)
+            return response
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _send(self, endpoint, method, url, **kwargs):
+        if self.cassette is None:
+            return self._send_upstream(endpoint, method, url, **kwargs)
+
+        sent = []
+
+        def send():
+            sent.append(True)
+            return self._send_upstream(endpoint, method, url, **kwargs)
+
+        response = self.cassette.play(self._prepare(method, url, kwargs), send, build_response)
+        if not sent:
+            self._count(endpoint, "replayed")
+        return response
+
+    def _send_upstream(self, endpoint, method, url, **kwargs):
+        with self._lock:
+            self._metrics[endpoint]["upstream"] += 1
+        if self.timing:
+            return self._timed_send(endpoint, method, url, **kwargs)
+        return self.session.request(method, url, **kwargs)
+
+    def _prepare(self, method, url, kwargs):
+        return self.session.prepare_request(requests.Request(
+            method, url,
+            params=kwargs.get("params"), headers=kwargs.get("headers"), data=kwargs.get("data"),
+            json=kwargs.get("json"), files=kwargs.get("files"), auth=kwargs.get("auth"),
+        ))
+
+    def _timed_send(self, endpoint, method, url, **kwargs):
+        """Send through probe_timing and rebuild a requests.Response with timings"""
+        prepared = self._prepare(method, url, kwargs)
+        body = prepared.body.encode("utf-8") if isinstance(prepared.body, str) else prepared.body
+        timeout = kwargs.get("timeout") or self.timeout
+        if isinstance(timeout, tuple):
+            timeout = max(timeout)
+
+        try:
+            hops = probe_timing.timed_request(
+                prepared.method, prepared.url, prepared.headers, body, timeout,
+                allow_redirects=kwargs.get("allow_redirects", True)
+            )
+        except socket.timeout as e:
+            raise requests.exceptions.Timeout(str(e)) from e
+        except OSError as e:
+            raise requests.exceptions.ConnectionError(str(e)) from e
+
+        responses = [build_response(hop.method, hop.url, hop.status, hop.headers, hop.body) for hop in hops]
+        response = responses[-1]
+        response.history = responses[:-1]
+        response.timing = {
+            phase: round(sum(hop.timing[phase] for hop in hops), 2) for phase in probe_timing.PHASES
+        }
+        response.timing_hops = [hop.as_dict() for hop in hops]
+        response.elapsed = timedelta(milliseconds=sum(hop.total_ms for hop in hops))
+
+        with self._lock:
+            self._timings.append((endpoint, response.timing, len(hops) - 1))
+        return response
+
+    def _count(self, endpoint, name):
+        with self._lock:
+            self._metrics[endpoint][name] += 1
+
+    def _fetch_get(self, endpoint, url, kwargs):
+        """GET through the persistent response cache (if one is configured)"""
+        # With a cassette, every GET must be recorded or replayed, not served from disk
+        if self.cache is None or self.cassette is not None:
+            return self._send(endpoint, "GET", url, **kwargs)
+
+        policy = self.cache.policy(url)
+        if not policy.store:
+            return self._send(endpoint, "GET", url, **kwargs)
+
+        cache_key = self.cache.key(url, query_items(url, kwargs.get("params")),
+                                   authorization_header(kwargs.get("headers")))
+        cached = self.cache.lookup(cache_key)
+        if cached and self.cache.is_fresh(cached, policy):
+            self._count(endpoint, "cache_hits")
+            return build_response("GET", url, cached.status, cached.headers, cached.body)
+
+        if cached:
+            headers = dict(kwargs.get("headers") or {})
+            headers.update(self.cache.conditional_headers(cached))
+            kwargs = dict(kwargs, headers=headers)
+
+        response = self._send(endpoint, "GET", url, **kwargs)
+
+        if cached and response.status_code == 304:
+            self.cache.refresh(cache_key)
+            self._count(endpoint, "revalidated")
+            return build_response("GET", url, cached.status, cached.headers, cached.body)
+
+        has_validators = "ETag" in response.headers or "Last-Modified" in response.headers
+        if response.status_code == 200 and (policy.max_age or has_validators):
+            self.cache.store(cache_key, url, response.status_code, response.headers, response.content)
+        return response
+
+    @staticmethod
+    def _coalescible(kwargs):
+        # Bodies and streamed downloads are never shared between callers
+        return not (kwargs.get("data") or kwargs.get("json") or kwargs.get("files") or kwargs.get("stream"))
+
+    @staticmethod
+    def _endpoint_label(method, url):
+        parts = urllib.parse.urlsplit(url)
+        return f"{method} {parts.netloc}{parts.path}"
+
+    @staticmethod
+    def _request_key(url, kwargs):
+        """Key on URL, normalized params and the Authorization header"""
+        parts = urllib.parse.urlsplit(url)
+        auth = authorization_header(kwargs.get("headers"))
+        if kwargs.get("auth") is not None:
+            auth += repr(kwargs["auth"])
+
+        raw = f"{parts.scheme}://{parts.netloc}{parts.path}?{query_items(url, kwargs.get('params'))}|{auth}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _clone(response):
+        """Give each waiter its own Response object over the shared body"""
+        clone = copy.copy(response)
+        clone.headers = copy.copy(response.headers)
+        return clone
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def metrics(self):
+        """Per-endpoint counters plus totals"""
+        with self._lock:
+            endpoints = {endpoint: dict(counts) for endpoint, counts in self._metrics.items()}
+        totals = dict.fromkeys(METRIC_NAMES, 0)
+        for counts in endpoints.values():
+            for name in totals:
+                totals[name] += counts[name]
+        # A revalidation still costs a round-trip, but not the body
+        totals["saved"] = totals["coalesced"] + totals["memo_hits"] + totals["cache_hits"] + totals["replayed"]
+        return {"endpoints": endpoints, "totals": totals}
+
+    def print_metrics(self):
+        metrics = self.metrics()
+        totals = metrics["totals"]
+        print("\n" + "=" * 80)
+        print("📊 HTTP CLIENT METRICS")
+        print("=" * 80)
+        print(f"{'Endpoint':<38} {'Req':>5} {'Upstr':>6} {'Coal':>5} {'Memo':>5} {'Disk':>5} {'304':>5} {'VCR':>5}")
+        print("-" * 80)
+        for endpoint, counts in sorted(metrics["endpoints"].items()):
+            print(f"{endpoint[:38]:<38} {counts['requests']:>5} {counts['upstream']:>6} "
+                  f"{counts['coalesced']:>5} {counts['memo_hits']:>5} {counts['cache_hits']:>5} "
+                  f"{counts['revalidated']:>5} {counts['replayed']:>5}")
+        print("-" * 80)
+        print(f"Requests: {totals['requests']}  Upstream calls: {totals['upstream']}  "
+              f"Saved: {totals['saved']} (coalesced {totals['coalesced']}, memo {totals['memo_hits']}, "
+              f"disk {totals['cache_hits']}, replayed {totals['replayed']})  Revalidated: {totals['revalidated']}")
+        if self.cassette is not None:
+            print(f"📼 Cassette {self.cassette.path} ({self.cassette.mode}): "
+                  f"{self.cassette.stats['replayed']} replayed, {self.cassette.stats['recorded']} recorded")
+
+    def print_timing_summary(self):
+        """Terminal table of median phase timings per endpoint (timing=True only)"""
+        with self._lock:
+            rows = list(self._timings)
+        if not rows:
+            return
+        print("\n" + "=" * 80)
+        print("⏱️  LATENCY BREAKDOWN")
+        print("=" * 80)
+        print(probe_timing.format_timing_table(rows))
+
+
+def default_cache():
+    """Persistent response cache, unless disabled with PROBE_CACHE=0"""
+    if os.environ.get("PROBE_CACHE", "1") == "0":
+        return None
+    return ResponseCache(os.environ.get("PROBE_CACHE_PATH") or DEFAULT_CACHE_PATH)
+
+
+# Shared client for the probe scripts
+client = ProbeClient(cache=default_cache(), cassette=default_cassette())
+
+
+def run_clock():
+    """time.time() for building unique test data; the recorded clock when replaying a cassette"""
+    if client.cassette is not None:
+        return client.cassette.clock()
+    return time.time()
+
+
+def pause(seconds):
+    """time.sleep() that is skipped while replaying a cassette"""
+    if client.cassette is None or not client.cassette.replaying:
+        time.sleep(seconds)
+
+
+# ============================================================================
+# SHARED API HELPERS
+# ============================================================================
+
+class AuthenticationError(RuntimeError):
+    """Login to the Main API failed"""
+
+
+def retry_delay(attempt):
+    return min(30, 0.5 * 2 ** attempt)
+
+
+def _unsent(error):
+    """True when a request failed before any of it reached the server"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError):
+        return False
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, "reason", reason)
+    return (isinstance(reason, NewConnectionError)
+            or isinstance(error.__cause__, (ConnectionRefusedError, socket.gaierror)))
+
+
+def call_with_retry(method, url, retries=DEFAULT_RETRIES, idempotent=None, http=None, **kwargs):
+    """Send a request, retrying connection errors, 429 and 5xx with backoff.
+
+    Non-idempotent methods (POST, PATCH unless idempotent=True) are only
+    resent when the earlier attempt never reached the server or got 429;
+    a timeout or 5xx may already have been applied and is returned / raised.
+    http: the ProbeClient to send through (default: the shared client).
+    """
+    http = http or client
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    retry_statuses = RETRY_STATUSES if idempotent else {429}
+    for attempt in range(retries + 1):
+        try:
+            response = http.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            if attempt == retries or not (idempotent or _unsent(e)):
+                raise
+            time.sleep(retry_delay(attempt) * random.uniform(0.8, 1.2))
+            continue
+        if response.status_code not in retry_statuses or attempt == retries:
+            return response
+        retry_after = response.headers.get("Retry-After", "")
+        delay = float(retry_after) if retry_after.isdigit() else retry_delay(attempt)
+        time.sleep(delay * random.uniform(0.8, 1.2))
+    return response
+
+
+def authenticate(base_url):
+    """Log in as USERNAME; returns (headers, user id or None), raises AuthenticationError"""
+    response = call_with_retry("POST", f"{base_url}/api/auth/login/", idempotent=True,
+                               json={"login": USERNAME, "password": PASSWORD})
+    if response.status_code != 200:
+        raise AuthenticationError(f"Authentication as {USERNAME} failed: {response.status_code} "
+                                  f"{response.text[:200]}")
+    token = response.json().get("token")
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+    profile = call_with_retry("GET", f"{base_url}/api/auth/profile/", headers=headers)
+    user_id = profile.json().get("id") if profile.status_code == 200 else None
+    return headers, user_id
+
+
+def fetch_all(base_url, path, headers, params=None, http=None):
+    """Every item of a (possibly paginated) list endpoint; raises RuntimeError on a failed page"""
+    items = []
+    page = 1
+    while True:
+        query = dict(params or {}, page=page, pageSize=100)
+        response = call_with_retry("GET", f"{base_url}{path}", headers=headers, params=query, http=http)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} page {page}: {response.status_code}")
+        data = response.json()
+        if isinstance(data, list):
+            return items + data
+        items.extend(data.get("results", []))
+        if not data.get("next"):
+            break
+        page += 1
+    return items
+
+
+def trip_key(value):
+    """Normalize a trip id ("6307.0", 6307, "6307") for joining"""
+    try:
+        return str(int(float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+def stream_pages(fetch_page, page_count, pool):
+    """Yield page payloads: page 1 first, then the rest as they complete"""
+    first = fetch_page(1)
+    if first is None:
+        return
+    yield first
+    futures = [pool.submit(fetch_page, page) for page in range(2, page_count(first) + 1)]
+    for future in as_completed(futures):
+        payload = future.result()
+        if payload is not None:
+            yield payload
+
+
+class Index:
+    """Hash indexes over both datasets, filled concurrently while pages stream in"""
+
+    def __init__(self):
+        self.trips_by_id = {}
+        self.galleries_by_id = {}
+        self.galleries_by_trip = defaultdict(list)
+        self.errors = []
+        self.gallery_source = None
+        self._lock = threading.Lock()
+
+    def add_trips(self, trips):
+        with self._lock:
+            for trip in trips:
+                key = trip_key(trip.get("id"))
+                if key:
+                    self.trips_by_id[key] = trip
+
+    def add_galleries(self, galleries):
+        with self._lock:
+            for gallery in galleries:
+                self.galleries_by_id[str(gallery.get("id"))] = gallery
+                key = trip_key(gallery.get("source_trip_id"))
+                if key:
+                    self.galleries_by_trip[key].append(gallery)
+
+
+def load_galleries(gallery_url, headers, index, pool):
+    # The admin listing includes soft-deleted galleries, the public one does not
+    for path in ("/api/admin/content/galleries", "/api/galleries"):
+        url = f"{gallery_url}{path}"
+        probe = call_with_retry("GET", url, headers=headers, params={"page": 1, "limit": LISTING_PAGE_SIZE})
+        if probe.status_code == 200:
+            index.gallery_source = path
+            break
+    else:
+        index.errors.append(f"galleries: {probe.status_code}")
+        return
+
+    def fetch_page(page):
+        if page == 1:
+            return probe.json()
+        response = call_with_retry("GET", url, headers=headers, params={"page": page, "limit": LISTING_PAGE_SIZE})
+        if response.status_code != 200:
+            index.errors.append(f"galleries page {page}: {response.status_code}")
+            return None
+        return response.json()
+
+    def page_count(data):
+        pagination = data.get("pagination") or {}
+        total = pagination.get("total") or data.get("gallery_count") or 0
+        return math.ceil(total / LISTING_PAGE_SIZE)
+
+    for data in stream_pages(fetch_page, page_count, pool):
+        index.add_galleries(data.get("galleries", []))
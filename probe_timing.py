@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Per-request latency breakdown for the probe scripts
+
+requests only tells us the total time. When /api/auth/login/ is slow we need
+to know whether it is DNS, the TCP connect, the TLS handshake, server think
+time or the body transfer. timed_request() performs one request on a fresh
+connection with plain socket/ssl/http.client and times each phase:
+
+    dns       getaddrinfo
+    connect   TCP connect
+    tls       TLS handshake (https only)
+    send      writing the request line, headers and body
+    ttfb      waiting for the status line + headers (server think time)
+    download  reading the body
+
+Redirects are followed manually (same rules as requests) and every hop is
+timed and recorded.
+
+probe_client.ProbeClient(timing=True) routes its requests through here.
+"""
+
+import http.client
+import socket
+import ssl
+import time
+import urllib.parse
+
+PHASES = ("dns", "connect", "tls", "send", "ttfb", "download")
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+DEFAULT_MAX_REDIRECTS = 10
+
+
+class TimedHop:
+    """One request/response on the wire, with its phase timings in ms"""
+
+    __slots__ = ("method", "url", "status", "reason", "headers", "body", "timing", "remote_addr")
+
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+        self.status = None
+        self.reason = ""
+        self.headers = []
+        self.body = b""
+        self.timing = dict.fromkeys(PHASES, 0.0)
+        self.remote_addr = None
+
+    @property
+    def total_ms(self):
+        return sum(self.timing.values())
+
+    def as_dict(self):
+        return {
+            "method": self.method,
+            "url": self.url,
+            "status": self.status,
+            "remote_addr": self.remote_addr,
+            "timing_ms": {phase: round(value, 2) for phase, value in self.timing.items()},
+            "total_ms": round(self.total_ms, 2),
+        }
+
+
+def _elapsed_ms(started):
+    return (time.perf_counter() - started) * 1000
+
+
+def _open_socket(hop, host, port, use_tls, timeout):
+    started = time.perf_counter()
+    addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    hop.timing["dns"] = _elapsed_ms(started)
+
+    started = time.perf_counter()
+    last_error = None
+    sock = None
+    for family, socktype, proto, _canonname, address in addresses:
+        try:
+            sock = socket.socket(family, socktype, proto)
+            sock.settimeout(timeout)
+            sock.connect(address)
+            hop.remote_addr = address[0]
+            break
+        except OSError as e:
+            last_error = e
+            if sock is not None:
+                sock.close()
+            sock = None
+    if sock is None:
+        raise last_error or OSError(f"Could not connect to {host}:{port}")
+    hop.timing["connect"] = _elapsed_ms(started)
+
+    if use_tls:
+        started = time.perf_counter()
+        context = ssl.create_default_context()
+        sock = context.wrap_socket(sock, server_hostname=host)
+        hop.timing["tls"] = _elapsed_ms(started)
+    return sock
+
+
+def _single_request(method, url, headers, body, timeout):
+    parts = urllib.parse.urlsplit(url)
+    use_tls = parts.scheme == "https"
+    port = parts.port or (443 if use_tls else 80)
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+    hop = TimedHop(method, url)
+    sock = _open_socket(hop, parts.hostname, port, use_tls, timeout)
+
+    connection_class = http.client.HTTPSConnection if use_tls else http.client.HTTPConnection
+    connection = connection_class(parts.hostname, port, timeout=timeout)
+    connection.sock = sock  # already connected, so http.client skips connect()
+    try:
+        request_headers = dict(headers)
+        # Identity encoding keeps "download" honest and the body undecoded
+        request_headers["Accept-Encoding"] = "identity"
+
+        started = time.perf_counter()
+        connection.request(method, path, body=body, headers=request_headers)
+        hop.timing["send"] = _elapsed_ms(started)
+
+        started = time.perf_counter()
+        response = connection.getresponse()
+        hop.timing["ttfb"] = _elapsed_ms(started)
+
+        started = time.perf_counter()
+        hop.body = response.read()
+        hop.timing["download"] = _elapsed_ms(started)
+
+        hop.status = response.status
+        hop.reason = response.reason
+        hop.headers = response.getheaders()
+    finally:
+        connection.close()
+    return hop
+
+
+def timed_request(method, url, headers=None, body=None, timeout=30,
+                  allow_redirects=True, max_redirects=DEFAULT_MAX_REDIRECTS):
+    """
+    Perform a request and return the list of hops (last one is the final response).
+
+    Redirect handling follows requests: 303 (and 301/302 for POST) turn into a
+    body-less GET, and Authorization is dropped when the host changes.
+    """
+    headers = dict(headers or {})
+    hops = []
+    while True:
+        hop = _single_request(method, url, headers, body, timeout)
+        hops.append(hop)
+
+        location = dict((k.lower(), v) for k, v in hop.headers).get("location")
+        if not allow_redirects or hop.status not in REDIRECT_STATUSES or not location:
+            return hops
+        if len(hops) > max_redirects:
+            raise http.client.HTTPException(f"Exceeded {max_redirects} redirects for {hops[0].url}")
+
+        next_url = urllib.parse.urljoin(url, location)
+        if hop.status == 303 or (hop.status in (301, 302) and method == "POST"):
+            method = "GET"
+            body = None
+            headers = {k: v for k, v in headers.items()
+                       if k.lower() not in ("content-type", "content-length")}
+        if urllib.parse.urlsplit(next_url).hostname != urllib.parse.urlsplit(url).hostname:
+            headers = {k: v for k, v in headers.items() if k.lower() != "authorization"}
+        url = next_url
+
+
+def format_timing_table(rows):
+    """
+    Render per-endpoint phase medians as a text table.
+
+    rows: iterable of (endpoint, timing dict, redirect count)
+    """
+    grouped = {}
+    for endpoint, timing, redirects in rows:
+        entry = grouped.setdefault(endpoint, {"count": 0, "redirects": 0,
+                                              "phases": {phase: [] for phase in PHASES}, "total": []})
+        entry["count"] += 1
+        entry["redirects"] += redirects
+        for phase in PHASES:
+            entry["phases"][phase].append(timing.get(phase, 0.0))
+        entry["total"].append(sum(timing.get(phase, 0.0) for phase in PHASES))
+
+    def median(values):
+        values = sorted(values)
+        return values[len(values) // 2] if values else 0.0
+
+    header = f"{'Endpoint':<40} {'N':>3} " + " ".join(f"{p:>8}" for p in PHASES) + f" {'total':>8} {'redir':>5}"
+    lines = [header, "-" * len(header)]
+    for endpoint, entry in sorted(grouped.items(), key=lambda item: -median(item[1]["total"])):
+        phases = " ".join(f"{median(entry['phases'][p]):>8.1f}" for p in PHASES)
+        lines.append(f"{endpoint[:40]:<40} {entry['count']:>3} {phases} "
+                     f"{median(entry['total']):>8.1f} {entry['redirects']:>5}")
+    lines.append("(median ms per phase, slowest endpoints first)")
+    return "\n".join(lines)
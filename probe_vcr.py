@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Record / replay of probe traffic (VCR-style cassettes)
+
+Scripts like test_registration_flow.py create real accounts on production
+every time they run. With a cassette, the shared probe client records every
+request/response pair once and replays them afterwards, so the scripts rerun
+deterministically in seconds without touching the server.
+
+Modes (PROBE_VCR environment variable, default off):
+    record   every request goes to the server; the cassette is rewritten
+    replay   every request is answered from the cassette; a miss is an error
+    auto     replay what the cassette has, record what it does not
+
+PROBE_VCR_RERECORD=<regex> sends matching paths to the server even when the
+cassette has them and replaces the recorded answers (selective re-record).
+
+Cassettes live in cassettes/<script name>.json (PROBE_CASSETTE overrides the
+path; a .gz suffix compresses it). Interactions are matched on method,
+host + path, normalized query and normalized body (JSON keys sorted, form
+fields sorted) through a hash index. The Authorization header is not part of
+the match, since every login issues a new token. Identical bodies are
+stored once.
+
+Each recorded interaction also keeps its request body, Authorization header,
+start offset and duration, so a cassette doubles as a captured traffic
+sequence for load_replay.py.
+
+Secrets never reach the cassette: the Authorization / Cookie / Set-Cookie
+values and every password / token / access / refresh field of JSON and form
+bodies (request and response) are replaced by a stable placeholder
+("redacted-" + a hash of the value). The same token therefore gets the same
+placeholder in the login response and in later Authorization headers, which
+is what load_replay.py relies on to swap in live tokens. Passwords all
+become "redacted-password", and request bodies are matched after redaction,
+so a replayed login matches whatever password is configured.
+
+Scripts that embed the current time in test data (unique usernames) use
+probe_client.run_clock(), which returns the recorded clock during replay, and
+probe_client.pause() instead of time.sleep(), which is skipped during replay.
+
+Inspect a cassette with:
+    python3 probe_vcr.py cassettes/test_registration_flow.json
+"""
+
+import argparse
+import atexit
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict, defaultdict
+
+import requests
+
+CASSETTE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cassettes")
+CASSETTE_VERSION = 1
+MODES = ("record", "replay", "auto")
+
+# Body fields (any key containing "password", plus these) and headers whose values are redacted
+SECRET_FIELDS = {"token", "access", "refresh"}
+REDACTED_HEADERS = {"authorization", "cookie", "set-cookie"}
+REDACTED_PREFIX = "redacted-"
+
+# Response headers that only describe one particular transfer
+SKIPPED_HEADERS = {"date", "connection", "keep-alive", "transfer-encoding", "content-encoding",
+                   "content-length", "server", "via", "cf-ray", "alt-svc", "report-to", "nel"}
+
+
+class CassetteMiss(requests.exceptions.RequestException):
+    """A replayed request that the cassette has no recording for"""
+
+
+def _digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def redact(value):
+    """Stable placeholder for a secret: equal secrets get equal placeholders"""
+    value = str(value)
+    if not value or value.startswith(REDACTED_PREFIX):
+        return value
+    return REDACTED_PREFIX + hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+
+
+def redact_authorization(header):
+    """"Bearer abc" -> "Bearer redacted-..." (the placeholder matches a redacted "token": "abc")"""
+    if not header:
+        return header
+    scheme, separator, credential = header.partition(" ")
+    return f"{scheme} {redact(credential)}" if separator else redact(header)
+
+
+def redact_field(name, value):
+    """Redacted value of a body field, or None if the field is not secret"""
+    name = str(name).lower()
+    if "password" in name:
+        # Passwords are never correlated, so they need no hash (and replays match any password)
+        return REDACTED_PREFIX + "password"
+    if name in SECRET_FIELDS:
+        return redact(value)
+    return None
+
+
+def scrub(value):
+    """Copy of decoded JSON with every secret field redacted"""
+    if isinstance(value, dict):
+        return {key: redact_field(key, item) if isinstance(item, (str, int)) and not isinstance(item, bool)
+                and redact_field(key, item) else scrub(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [scrub(item) for item in value]
+    return value
+
+
+def normalize_body(body, content_type=""):
+    """Canonical bytes for a request body (JSON keys and form fields sorted, secrets redacted)"""
+    if not body:
+        return b""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if "json" in content_type:
+        try:
+            return json.dumps(scrub(json.loads(body)), sort_keys=True, separators=(",", ":")).encode("utf-8")
+        except ValueError:
+            return body
+    if "x-www-form-urlencoded" in content_type:
+        pairs = urllib.parse.parse_qsl(body.decode("utf-8", "replace"), keep_blank_values=True)
+        pairs = [(key, redact_field(key, value) or value) for key, value in pairs]
+        return urllib.parse.urlencode(sorted(pairs)).encode("utf-8")
+    return body
+
+
+def scrub_response_body(body, content_type=""):
+    """A JSON response body with secret fields redacted; anything else unchanged"""
+    if not body or "json" not in content_type:
+        return body
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    scrubbed = scrub(data)
+    if scrubbed == data:
+        return body
+    return json.dumps(scrubbed, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def match_key(method, url, body, content_type=""):
+    """Hashable key for one request: method, host + path, sorted query, body hash"""
+    parts = urllib.parse.urlsplit(url)
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    return (method.upper(), f"{parts.netloc}{parts.path}", query,
+            _digest(normalize_body(body, content_type)))
+
+
+class Cassette:
+    """One file of recorded interactions with an in-memory match index"""
+
+    def __init__(self, path, mode="auto", rerecord=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r} (expected one of {', '.join(MODES)})")
+        self.path = path
+        self.mode = mode
+        self.rerecord = re.compile(rerecord) if rerecord else None
+        self.recorded_at = None
+        self.bodies = {}  # sha1 -> bytes
+        self.interactions = []
+        self.stats = defaultdict(int)
+        self._clock = None
+        self._started = time.monotonic()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._index = defaultdict(list)  # match key -> interaction positions
+        self._cursor = defaultdict(int)  # match key -> next position to replay
+        self._rerecorded = set()
+
+        if mode != "record" and os.path.exists(path):
+            self._load()
+        atexit.register(self.save)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _load(self):
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        self.recorded_at = data.get("recorded_at")
+        self._clock = data.get("clock")
+        self.bodies = {key: base64.b64decode(value) for key, value in data.get("bodies", {}).items()}
+        for interaction in data.get("interactions", []):
+            # Cassettes recorded before redaction still carry the raw token
+            request = interaction["request"]
+            if request.get("authorization"):
+                request["authorization"] = redact_authorization(request["authorization"])
+            self._add(interaction)
+
+    def save(self):
+        """Write the cassette (only if something was recorded)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            used = {interaction["response"]["body"] for interaction in self.interactions}
+            used.update(interaction["request"]["body"] for interaction in self.interactions)
+            used &= set(self.bodies)
+            data = OrderedDict([
+                ("version", CASSETTE_VERSION),
+                ("recorded_at", self.recorded_at or time.strftime("%Y-%m-%dT%H:%M:%S")),
+                ("clock", self._clock),
+                ("interactions", self.interactions),
+                ("bodies", {key: base64.b64encode(self.bodies[key]).decode("ascii") for key in sorted(used)}),
+            ])
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            opener = gzip.open if self.path.endswith(".gz") else open
+            with opener(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def _add(self, interaction):
+        request = interaction["request"]
+        key = (request["method"], request["host_path"], request["query"], request["body"])
+        self._index[key].append(len(self.interactions))
+        self.interactions.append(interaction)
+
+    # ------------------------------------------------------------------
+    # Clock (deterministic test data)
+    # ------------------------------------------------------------------
+
+    def clock(self):
+        """The run's wall clock: recorded during replay, now (and remembered) otherwise"""
+        with self._lock:
+            if self._clock is None:
+                self._clock = time.time()
+                self._dirty = self.mode != "replay"
+            return self._clock
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    # ------------------------------------------------------------------
+    # Record / replay
+    # ------------------------------------------------------------------
+
+    def play(self, prepared, send, build_response):
+        """
+        Answer a prepared request from the cassette, or send it and record it.
+
+        send() performs the real request; build_response(method, url, status,
+        headers, body) turns a recording back into a requests.Response.
+        """
+        content_type = prepared.headers.get("Content-Type", "")
+        key = match_key(prepared.method, prepared.url, prepared.body, content_type)
+        path = urllib.parse.urlsplit(prepared.url).path
+        rerecord = self.rerecord is not None and self.rerecord.search(path) and self.mode != "replay"
+
+        if self.mode != "record" and not rerecord:
+            with self._lock:
+                positions = self._index.get(key)
+                if positions:
+                    # Repeated identical requests replay in recorded order, then stick to the last answer
+                    cursor = self._cursor[key]
+                    self._cursor[key] = cursor + 1
+                    interaction = self.interactions[positions[min(cursor, len(positions) - 1)]]
+                    self.stats["replayed"] += 1
+            if positions:
+                return self._response(interaction, build_response)
+            if self.mode == "replay":
+                self.stats["missed"] += 1
+                raise CassetteMiss(f"No recording for {prepared.method} {prepared.url} in {self.path}")
+
+        response = send()
+        self._record(key, prepared, response, drop_previous=rerecord)
+        return response
+
+    def _record(self, key, prepared, response, drop_previous=False):
+        body = scrub_response_body(response.content or b"", response.headers.get("Content-Type", ""))
+        body_key = _digest(body)
+        content_type = prepared.headers.get("Content-Type", "")
+        headers = [[name, redact(value) if name.lower() in REDACTED_HEADERS else value]
+                   for name, value in response.headers.items() if name.lower() not in SKIPPED_HEADERS]
+        elapsed = response.elapsed.total_seconds() if response.elapsed else 0.0
+        interaction = {
+            "request": {"method": key[0], "host_path": key[1], "query": key[2], "body": key[3],
+                        "scheme": urllib.parse.urlsplit(prepared.url).scheme,
+                        "content_type": content_type,
+                        "authorization": redact_authorization(prepared.headers.get("Authorization", ""))},
+            "at": round(time.monotonic() - self._started - elapsed, 4),
+            "elapsed_ms": round(elapsed * 1000, 2),
+            "response": {
+                "status": response.status_code,
+                "url": response.url,
+                "headers": headers,
+                "body": body_key,
+                "history": [[hop.status_code, hop.url, hop.headers.get("Location", "")]
+                            for hop in response.history],
+            },
+        }
+        with self._lock:
+            if drop_previous and key not in self._rerecorded:
+                self._rerecorded.add(key)
+                self.interactions = [i for n, i in enumerate(self.interactions) if n not in self._index[key]]
+                self._reindex()
+            self.bodies.setdefault(body_key, body)
+            if prepared.body:
+                self.bodies.setdefault(key[3], normalize_body(prepared.body, content_type))
+            self._add(interaction)
+            self._cursor[key] = len(self._index[key])
+            self._dirty = True
+            self.stats["recorded"] += 1
+
+    def _reindex(self):
+        interactions, self.interactions = self.interactions, []
+        self._index.clear()
+        for interaction in interactions:
+            self._add(interaction)
+
+    def _response(self, interaction, build_response):
+        recorded = interaction["response"]
+        request = interaction["request"]
+        response = build_response(request["method"], recorded["url"], recorded["status"],
+                                  dict(recorded["headers"]), self.bodies.get(recorded["body"], b""))
+        response.history = [
+            build_response(request["method"], url, status, {"Location": location} if location else {}, b"")
+            for status, url, location in recorded["history"]
+        ]
+        return response
+
+    def summary(self):
+        stored = sum(len(body) for body in self.bodies.values())
+        referenced = sum(len(self.bodies.get(i["response"]["body"], b"")) +
+                         len(self.bodies.get(i["request"]["body"], b"")) for i in self.interactions)
+        return {"interactions": len(self.interactions), "unique_bodies": len(self.bodies),
+                "body_bytes": stored, "deduplicated_bytes": referenced - stored}
+
+
+def default_cassette():
+    """Cassette selected by PROBE_VCR / PROBE_CASSETTE / PROBE_VCR_RERECORD, or None"""
+    mode = os.environ.get("PROBE_VCR", "off").lower()
+    if mode in ("", "0", "off"):
+        return None
+    path = os.environ.get("PROBE_CASSETTE")
+    if not path:
+        script = os.path.splitext(os.path.basename(sys.argv[0] or "interactive"))[0] or "interactive"
+        path = os.path.join(CASSETTE_DIR, f"{script}.json")
+    return Cassette(path, mode, os.environ.get("PROBE_VCR_RERECORD"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a probe cassette")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"❌ Not found: {args.path}")
+        sys.exit(1)
+    cassette = Cassette(args.path, "replay")
+    atexit.unregister(cassette.save)
+    summary = cassette.summary()
+    print(f"📼 {args.path} (recorded {cassette.recorded_at})")
+    print(f"   {summary['interactions']} interactions, {summary['unique_bodies']} unique bodies, "
+          f"{summary['body_bytes'] / 1024:.1f}KB stored, {summary['deduplicated_bytes'] / 1024:.1f}KB deduplicated")
+    for interaction in cassette.interactions:
+        request, response = interaction["request"], interaction["response"]
+        query = f"?{request['query']}" if request["query"] else ""
+        print(f"   {request['method']:<6} {request['host_path']}{query} -> {response['status']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Historical Probe Results Store
+Keeps every probe run in one SQLite database so we can see trends over time.
+
+Each probe script overwrites its own results file (api_test_results.json,
+comprehensive_api_test_results.json, gallery_crud_test_results.json,
+registration_flow_test_results.json, api_endpoint_test_results.json[l]).
+This tool ingests those files - old and new formats - into results_history.db
+with endpoint, status, latency and timestamp indexed, and answers:
+
+    python3 results_history.py ingest [files...]       # default: all known results files
+    python3 results_history.py runs
+    python3 results_history.py trend [--endpoint /api/validators/] [--bucket day|week|month]
+    python3 results_history.py regressions [--window 5] [--threshold 1.5]
+
+Endpoints are normalized to their path with ids folded to {id} - numeric
+ids, UUIDs (optionally with a file extension) and Gallery gallery-.../photo-...
+ids - so /api/trips/6310/ and /api/trips/6311/ trend together. The same file
+content is never ingested twice, and neither is the same run (base_url and
+run_at): test_api_endpoints.py writes every run to both
+api_endpoint_test_results.jsonl and its .json summary, so by default only the
+.jsonl is read (the .json when there is no .jsonl).
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import urllib.parse
+from collections import defaultdict
+from datetime import datetime
+
+from results_sink import read_records
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results_history.db")
+
+# Each entry lists alternatives of the same run; the first one that exists is ingested
+KNOWN_RESULT_FILES = (
+    ("api_test_results.json",),
+    ("comprehensive_api_test_results.json",),
+    ("gallery_crud_test_results.json",),
+    ("registration_flow_test_results.json",),
+    ("api_endpoint_test_results.jsonl", "api_endpoint_test_results.json"),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    run_at TEXT NOT NULL,
+    base_url TEXT,
+    content_hash TEXT NOT NULL UNIQUE,
+    ingested_at TEXT NOT NULL,
+    total INTEGER,
+    passed INTEGER
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    endpoint TEXT NOT NULL,
+    method TEXT NOT NULL,
+    status_code INTEGER,
+    success INTEGER,
+    latency_ms REAL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_endpoint_time ON results (endpoint, timestamp);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id);
+CREATE INDEX IF NOT EXISTS runs_run_at ON runs (run_at);
+"""
+
+ID_SEGMENT = re.compile(
+    r"/(?:\d+"
+    r"|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(?:\.\w+)?"
+    r"|(?:gallery|photo)-(?=[\w-]*\d)[\w-]+)(?=/|$)",
+    re.IGNORECASE,
+)
+BUCKET_FORMATS = {"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+
+
+def normalize_endpoint(url_or_path):
+    """Path only, ids folded to {id}, trailing slash kept"""
+    path = urllib.parse.urlsplit(url_or_path).path or "/"
+    return ID_SEGMENT.sub("/{id}", path)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = min(len(sorted_values), max(1, math.ceil(pct / 100.0 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def _file_timestamp(path):
+    return datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+
+
+def _row(endpoint, method, status_code, success, latency_ms, timestamp):
+    return {
+        "endpoint": normalize_endpoint(endpoint),
+        "method": (method or "GET").upper(),
+        "status_code": status_code,
+        "success": None if success is None else int(bool(success)),
+        "latency_ms": latency_ms,
+        "timestamp": timestamp,
+    }
+
+
+def parse_results_file(path):
+    """
+    Return (run_info, rows) for any of the known results formats.
+
+    run_info has run_at, base_url and optionally total/passed.
+    """
+    if path.endswith(".jsonl") or path.endswith(".jsonl.gz"):
+        records = read_records(path)
+        header = next(records, {}) or {}
+        run_at = header.get("timestamp") or _file_timestamp(path)
+        rows = [
+            _row(r.get("endpoint", ""), r.get("method"), r.get("status_code"), r.get("success"),
+                 r.get("latency_ms"), r.get("timestamp") or run_at)
+            for r in records if r.get("record") == "test"
+        ]
+        return {"run_at": run_at, "base_url": header.get("base_url")}, rows
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    # api_endpoint_test_results.json: {"timestamp", "base_url", "tests": [...]}
+    if isinstance(data, dict) and isinstance(data.get("tests"), list):
+        run_at = data.get("timestamp") or _file_timestamp(path)
+        rows = [
+            _row(t.get("endpoint", ""), t.get("method"), t.get("status_code"), t.get("success"),
+                 t.get("latency_ms"), t.get("timestamp") or run_at)
+            for t in data["tests"]
+        ]
+        return {"run_at": run_at, "base_url": data.get("base_url")}, rows
+
+    # comprehensive_api_test_results.json: [{"name", "method", "url", "status", "success"}]
+    if isinstance(data, list):
+        run_at = _file_timestamp(path)
+        rows = [
+            _row(t.get("url", ""), t.get("method"), t.get("status"), t.get("success"),
+                 t.get("latency_ms"), run_at)
+            for t in data if isinstance(t, dict)
+        ]
+        return {"run_at": run_at, "base_url": None}, rows
+
+    # gallery_crud_test_results.json: {"test_timestamp", "endpoints_tested": [{"endpoint": "POST /api/..."}]}
+    if isinstance(data, dict) and isinstance(data.get("endpoints_tested"), list):
+        run_at = data.get("test_timestamp") or _file_timestamp(path)
+        rows = []
+        for t in data["endpoints_tested"]:
+            method, _, endpoint = (t.get("endpoint") or "GET /").partition(" ")
+            rows.append(_row(endpoint, method, t.get("status_code"), t.get("success"),
+                             t.get("latency_ms"), run_at))
+        return {"run_at": run_at, "base_url": None}, rows
+
+    # registration_flow_test_results.json: run-level counts only
+    if isinstance(data, dict) and "total_tests" in data:
+        return {
+            "run_at": data.get("timestamp") or _file_timestamp(path),
+            "base_url": data.get("base_url"),
+            "total": data.get("total_tests"),
+            "passed": data.get("passed"),
+        }, []
+
+    # api_test_results.json: {"/api/path/": {"status", "data"|"error", "description"}}
+    if isinstance(data, dict) and all(isinstance(v, dict) and "status" in v for v in data.values()):
+        run_at = _file_timestamp(path)
+        rows = [
+            _row(endpoint, "GET", v.get("status"), 200 <= (v.get("status") or 0) < 300,
+                 v.get("latency_ms"), run_at)
+            for endpoint, v in data.items()
+        ]
+        return {"run_at": run_at, "base_url": None}, rows
+
+    raise ValueError(f"Unrecognized results format: {path}")
+
+
+class ResultsHistory:
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def ingest(self, path):
+        """Ingest one results file, returns the number of rows (None if already ingested)"""
+        with open(path, "rb") as f:
+            content_hash = hashlib.sha256(f.read()).hexdigest()
+        if self.db.execute("SELECT 1 FROM runs WHERE content_hash = ?", (content_hash,)).fetchone():
+            return None
+
+        run_info, rows = parse_results_file(path)
+        if run_info.get("base_url") and self.db.execute(
+                "SELECT 1 FROM runs WHERE base_url = ? AND run_at = ?",
+                (run_info["base_url"], run_info["run_at"])).fetchone():
+            # The same run from its other file (.json summary vs .jsonl stream)
+            return None
+        total = run_info.get("total", len(rows))
+        passed = run_info.get("passed", sum(1 for r in rows if r["success"]))
+        with self.db:
+            run_id = self.db.execute(
+                "INSERT INTO runs (source, run_at, base_url, content_hash, ingested_at, total, passed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (os.path.basename(path), run_info["run_at"], run_info.get("base_url"), content_hash,
+                 datetime.now().isoformat(), total, passed)
+            ).lastrowid
+            self.db.executemany(
+                "INSERT INTO results (run_id, endpoint, method, status_code, success, latency_ms, timestamp) "
+                "VALUES (:run_id, :endpoint, :method, :status_code, :success, :latency_ms, :timestamp)",
+                [dict(row, run_id=run_id) for row in rows]
+            )
+        return len(rows)
+
+    def runs(self):
+        return self.db.execute(
+            "SELECT id, source, run_at, total, passed FROM runs ORDER BY run_at"
+        ).fetchall()
+
+    def trend(self, endpoint=None, bucket="day"):
+        """
+        p50/p95 latency and success rate per endpoint per time bucket.
+
+        Returns {endpoint: [(bucket, count, success_rate, p50, p95), ...]}
+        """
+        query = "SELECT endpoint, method, timestamp, success, latency_ms FROM results"
+        params = ()
+        if endpoint:
+            query += " WHERE endpoint = ?"
+            params = (normalize_endpoint(endpoint),)
+        query += " ORDER BY endpoint, timestamp"
+
+        groups = defaultdict(lambda: {"count": 0, "ok": 0, "latencies": []})
+        for ep, method, timestamp, success, latency in self.db.execute(query, params):
+            period = datetime.fromisoformat(timestamp).strftime(BUCKET_FORMATS[bucket])
+            group = groups[(f"{method} {ep}", period)]
+            group["count"] += 1
+            group["ok"] += success or 0
+            if latency is not None:
+                group["latencies"].append(latency)
+
+        trend = defaultdict(list)
+        for (ep, period), group in sorted(groups.items()):
+            latencies = sorted(group["latencies"])
+            trend[ep].append((period, group["count"], group["ok"] / group["count"],
+                              percentile(latencies, 50), percentile(latencies, 95)))
+        return trend
+
+    def regressions(self, window=5, threshold=1.5, min_delta_ms=50):
+        """
+        Compare each endpoint's latest run against a rolling baseline.
+
+        The baseline is the median of the per-run medians of the previous
+        `window` runs. Latency regressions need both the ratio and an absolute
+        delta; success-rate drops are flagged on their own.
+        """
+        per_run = defaultdict(lambda: defaultdict(lambda: {"latencies": [], "count": 0, "ok": 0}))
+        rows = self.db.execute(
+            "SELECT r.method || ' ' || r.endpoint, runs.run_at, runs.id, r.success, r.latency_ms "
+            "FROM results r JOIN runs ON runs.id = r.run_id ORDER BY runs.run_at"
+        )
+        for ep, run_at, run_id, success, latency in rows:
+            stats = per_run[ep][(run_at, run_id)]
+            stats["count"] += 1
+            stats["ok"] += success or 0
+            if latency is not None:
+                stats["latencies"].append(latency)
+
+        flagged = []
+        for ep, runs in per_run.items():
+            ordered = [runs[k] for k in sorted(runs)]
+            if len(ordered) < 2:
+                continue
+            latest, history = ordered[-1], ordered[-1 - window:-1]
+
+            latest_p50 = percentile(sorted(latest["latencies"]), 50)
+            baseline_medians = sorted(
+                percentile(sorted(h["latencies"]), 50) for h in history if h["latencies"]
+            )
+            baseline_p50 = percentile(baseline_medians, 50)
+            if latest_p50 is not None and baseline_p50:
+                if latest_p50 > baseline_p50 * threshold and latest_p50 - baseline_p50 >= min_delta_ms:
+                    flagged.append((ep, "latency", baseline_p50, latest_p50))
+
+            baseline_ok = sum(h["ok"] for h in history) / max(1, sum(h["count"] for h in history))
+            latest_ok = latest["ok"] / latest["count"]
+            if latest_ok < baseline_ok:
+                flagged.append((ep, "success_rate", baseline_ok, latest_ok))
+        return sorted(flagged)
+
+
+def _ms(value):
+    return f"{value:.0f}ms" if value is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Historical probe results store")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="Ingest results files")
+    ingest.add_argument("files", nargs="*")
+
+    sub.add_parser("runs", help="List ingested runs")
+
+    trend = sub.add_parser("trend", help="p50/p95 per endpoint over time")
+    trend.add_argument("--endpoint")
+    trend.add_argument("--bucket", choices=sorted(BUCKET_FORMATS), default="day")
+
+    regressions = sub.add_parser("regressions", help="Flag regressions against a rolling baseline")
+    regressions.add_argument("--window", type=int, default=5)
+    regressions.add_argument("--threshold", type=float, default=1.5)
+    regressions.add_argument("--min-delta-ms", type=float, default=50)
+
+    args = parser.parse_args()
+    history = ResultsHistory(args.db)
+
+    if args.command == "ingest":
+        here = os.path.dirname(os.path.abspath(__file__))
+        files = args.files or [
+            next(path for path in paths if os.path.exists(path))
+            for paths in ([os.path.join(here, name) for name in names] for names in KNOWN_RESULT_FILES)
+            if any(os.path.exists(path) for path in paths)
+        ]
+        for path in files:
+            try:
+                count = history.ingest(path)
+            except (OSError, ValueError) as e:
+                print(f"❌ {path}: {e}")
+                continue
+            if count is None:
+                print(f"⏭️  {os.path.basename(path)}: already ingested")
+            else:
+                print(f"✅ {os.path.basename(path)}: {count} results")
+
+    elif args.command == "runs":
+        print(f"{'ID':>4}  {'Run at':<27} {'Source':<40} {'Passed':>10}")
+        print("-" * 86)
+        for run_id, source, run_at, total, passed in history.runs():
+            print(f"{run_id:>4}  {run_at:<27} {source:<40} {f'{passed}/{total}':>10}")
+
+    elif args.command == "trend":
+        trend = history.trend(args.endpoint, args.bucket)
+        if not trend:
+            print("No results ingested yet")
+            sys.exit(1)
+        for endpoint, points in trend.items():
+            print(f"\n📈 {endpoint}")
+            print(f"   {'Period':<12} {'N':>5} {'OK %':>7} {'p50':>9} {'p95':>9}")
+            for period, count, ok_rate, p50, p95 in points:
+                print(f"   {period:<12} {count:>5} {ok_rate * 100:>6.1f}% {_ms(p50):>9} {_ms(p95):>9}")
+
+    elif args.command == "regressions":
+        flagged = history.regressions(args.window, args.threshold, args.min_delta_ms)
+        if not flagged:
+            print("✅ No regressions against the rolling baseline")
+            return
+        print("⚠️  REGRESSIONS")
+        for endpoint, kind, baseline, latest in flagged:
+            if kind == "latency":
+                print(f"   🐢 {endpoint}: p50 {_ms(baseline)} -> {_ms(latest)} ({latest / baseline:.1f}x)")
+            else:
+                print(f"   ❌ {endpoint}: success rate {baseline * 100:.0f}% -> {latest * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Streaming JSONL results sink for the probe scripts
+
+Instead of collecting every probe in memory and writing one big JSON file at
+the end, each result is appended as one JSON line as soon as it is logged:
+
+- constant memory, however long the run
+- a crash or Ctrl+C keeps everything logged so far (fsync is batched every
+  N records / seconds, and always on close)
+- optional gzip compression (use a .jsonl.gz path)
+
+The first line is a run header ({"record": "run", ...}); every other line is
+one test record. The legacy summary file (e.g. api_endpoint_test_results.json)
+can be rebuilt from a JSONL file at any time:
+
+    python3 results_sink.py api_endpoint_test_results.jsonl api_endpoint_test_results.json
+"""
+
+import argparse
+import atexit
+import gzip
+import json
+import os
+import sys
+import time
+import zlib
+
+DEFAULT_FSYNC_EVERY = 20
+DEFAULT_FSYNC_INTERVAL = 2.0
+
+
+class JsonlResultWriter:
+    """Append-only JSONL writer with batched fsync and optional gzip"""
+
+    def __init__(self, path, run_info=None, fsync_every=DEFAULT_FSYNC_EVERY,
+                 fsync_interval=DEFAULT_FSYNC_INTERVAL, compress=None):
+        self.path = path
+        self.compress = path.endswith(".gz") if compress is None else compress
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.count = 0
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+        # Each run gets a fresh file, like the json.dump it replaces
+        self._raw = open(path, "wb")
+        self._stream = gzip.GzipFile(fileobj=self._raw, mode="wb") if self.compress else self._raw
+        self._write_line(dict({"record": "run"}, **(run_info or {})))
+        self.sync()
+        atexit.register(self.close)
+
+    def _write_line(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        self._stream.write(line.encode("utf-8"))
+
+    def write(self, record):
+        """Append one test record"""
+        self._write_line(dict({"record": "test"}, **record))
+        self.count += 1
+        self._pending += 1
+        if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """Make everything written so far durable (and readable if we crash)"""
+        if self._raw.closed:
+            return
+        if self.compress:
+            # Sync flush ends the deflate block so a truncated file still decodes
+            self._stream.flush(zlib.Z_SYNC_FLUSH)
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._raw.closed:
+            return
+        self.sync()
+        if self.compress:
+            self._stream.close()
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _open_for_read(path):
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def read_records(path):
+    """
+    Yield every record (run header included) from a JSONL results file.
+
+    A half-written last line or a truncated gzip stream (interrupted run) is
+    skipped instead of raising.
+    """
+    with _open_for_read(path) as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return
+        except EOFError:
+            return
+
+
+def read_results(path):
+    """Yield only the test records"""
+    for record in read_records(path):
+        if record.get("record") == "test":
+            record = dict(record)
+            record.pop("record")
+            yield record
+
+
+def read_run_info(path):
+    for record in read_records(path):
+        if record.get("record") == "run":
+            info = dict(record)
+            info.pop("record")
+            return info
+        break
+    return {}
+
+
+def rebuild_summary(jsonl_path, json_path):
+    """
+    Write the legacy {"timestamp", "base_url", ..., "tests": [...]} file.
+
+    Tests are streamed straight from the JSONL file into the output, so this
+    also runs in constant memory.
+    """
+    info = read_run_info(jsonl_path)
+    count = 0
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        out.write("{\n")
+        for key, value in info.items():
+            out.write(f"  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n")
+        out.write('  "tests": [')
+        for record in read_results(jsonl_path):
+            out.write(",\n" if count else "\n")
+            body = json.dumps(record, indent=2, ensure_ascii=False)
+            out.write("\n".join("    " + line for line in body.splitlines()))
+            count += 1
+        out.write("\n  ]\n}\n" if count else "]\n}\n")
+    os.replace(tmp_path, json_path)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild a legacy JSON results file from a JSONL sink")
+    parser.add_argument("jsonl_path")
+    parser.add_argument("json_path")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.jsonl_path):
+        print(f"❌ Not found: {args.jsonl_path}")
+        sys.exit(1)
+    count = rebuild_summary(args.jsonl_path, args.json_path)
+    print(f"✅ Rebuilt {args.json_path} with {count} tests")
+
+
+if __name__ == "__main__":
+    main()
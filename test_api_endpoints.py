@@ -8,19 +8,28 @@ import requests
 import json
 from datetime import datetime
 
+from probe_client import ProbeClient
+from results_sink import JsonlResultWriter, read_results, rebuild_summary
+
 # API Configuration
 BASE_URL = "https://ap.ad4x4.com"
 TEST_EMAIL = "test_new_user_" + datetime.now().strftime("%Y%m%d%H%M%S") + "@test.com"
 TEST_USERNAME = "test_user_" + datetime.now().strftime("%Y%m%d%H%M%S")
 
-# Test Results Storage
-test_results = {
+# Test Results Storage (streamed to JSONL, summary JSON rebuilt at the end)
+RESULTS_JSONL = "api_endpoint_test_results.jsonl"
+RESULTS_JSON = "api_endpoint_test_results.json"
+results_writer = JsonlResultWriter(RESULTS_JSONL, run_info={
     "timestamp": datetime.now().isoformat(),
-    "base_url": BASE_URL,
-    "tests": []
-}
+    "base_url": BASE_URL
+})
+
+# Every call is timed phase by phase (DNS/connect/TLS/TTFB/download), so no
+# coalescing, memo or disk cache here: each test must really hit the server
+probe = ProbeClient(coalesce=False, memo_ttl=0, timing=True)
 
-def log_test(name, endpoint, method, status_code, success, response_data=None, error=None):
+def log_test(name, endpoint, method, status_code, success, response_data=None, error=None, latency_ms=None,
+             timing=None, redirects=None):
     """Log test result"""
     result = {
         "test_name": name,
@@ -30,13 +39,19 @@ def log_test(name, endpoint, method, status_code, success, response_data=None, e
         "success": success,
         "timestamp": datetime.now().isoformat()
     }
+    if latency_ms is not None:
+        result["latency_ms"] = round(latency_ms, 1)
+    if timing:
+        result["timing_ms"] = timing
+    if redirects:
+        result["redirects"] = redirects
     
     if response_data:
         result["response_data"] = response_data
     if error:
         result["error"] = str(error)
     
-    test_results["tests"].append(result)
+    results_writer.write(result)
     
     status = "✅" if success else "❌"
     print(f"{status} {name}: {method} {endpoint} -> {status_code}")
@@ -55,13 +70,13 @@ def test_endpoint(name, endpoint, method="GET", data=None, headers=None, expecte
     
     try:
         if method == "GET":
-            response = requests.get(url, headers=headers, timeout=30)
+            response = probe.get(url, headers=headers, timeout=30)
         elif method == "POST":
-            response = requests.post(url, json=data, headers=headers, timeout=30)
+            response = probe.post(url, json=data, headers=headers, timeout=30)
         elif method == "PUT":
-            response = requests.put(url, json=data, headers=headers, timeout=30)
+            response = probe.put(url, json=data, headers=headers, timeout=30)
         elif method == "DELETE":
-            response = requests.delete(url, headers=headers, timeout=30)
+            response = probe.delete(url, headers=headers, timeout=30)
         
         # Check for redirects
         if response.history:
@@ -77,7 +92,9 @@ def test_endpoint(name, endpoint, method="GET", data=None, headers=None, expecte
         
         success = expected_status is None or response.status_code == expected_status
         
-        log_test(name, endpoint, method, response.status_code, success, response_data)
+        log_test(name, endpoint, method, response.status_code, success, response_data,
+                 latency_ms=response.elapsed.total_seconds() * 1000,
+                 timing=response.timing, redirects=response.timing_hops[:-1])
         
         return response.status_code, response_data, success
         
@@ -262,18 +279,28 @@ print("\n" + "=" * 80)
 print("SAVING TEST RESULTS")
 print("=" * 80)
 
-with open('api_endpoint_test_results.json', 'w') as f:
-    json.dump(test_results, f, indent=2)
+results_writer.close()
+rebuild_summary(RESULTS_JSONL, RESULTS_JSON)
 
-print(f"✅ Test results saved to: api_endpoint_test_results.json")
+print(f"✅ Test results saved to: {RESULTS_JSON} (stream: {RESULTS_JSONL})")
 
 # Summary
 print("\n" + "=" * 80)
 print("TEST SUMMARY")
 print("=" * 80)
 
-total_tests = len(test_results["tests"])
-successful_tests = sum(1 for t in test_results["tests"] if t["success"])
+total_tests = 0
+successful_tests = 0
+redirects_found = []
+validator_status_codes = []
+for test in read_results(RESULTS_JSONL):
+    total_tests += 1
+    if test["success"]:
+        successful_tests += 1
+    if test.get("redirects") or "redirect" in test.get("response_data", {}).get("raw_response", "").lower():
+        redirects_found.append(test["endpoint"])
+    if "validators" in test["endpoint"].lower():
+        validator_status_codes.append(test["status_code"])
 failed_tests = total_tests - successful_tests
 
 print(f"Total Tests: {total_tests}")
@@ -287,11 +314,6 @@ print("CRITICAL FINDINGS")
 print("=" * 80)
 
 # Check for redirects
-redirects_found = []
-for test in test_results["tests"]:
-    if "redirect" in test.get("response_data", {}).get("raw_response", "").lower():
-        redirects_found.append(test["endpoint"])
-
 if redirects_found:
     print("⚠️  REDIRECTS DETECTED on:")
     for endpoint in redirects_found:
@@ -300,17 +322,18 @@ else:
     print("✅ No redirects detected")
 
 # Check validator endpoint functionality
-validator_tests = [t for t in test_results["tests"] if "validators" in t["endpoint"].lower()]
-if validator_tests:
-    print(f"\n📋 Validator Endpoint Tests: {len(validator_tests)}")
-    print("   Status codes:", [t["status_code"] for t in validator_tests])
+if validator_status_codes:
+    print(f"\n📋 Validator Endpoint Tests: {len(validator_status_codes)}")
+    print("   Status codes:", validator_status_codes)
     
-    validator_working = all(t["status_code"] in [200, 201] for t in validator_tests)
+    validator_working = all(code in [200, 201] for code in validator_status_codes)
     if validator_working:
         print("   ✅ Validators endpoint appears to be working!")
     else:
         print("   ❌ Validators endpoint may have issues")
 
+probe.print_timing_summary()
+
 print("\n" + "=" * 80)
 print("TEST COMPLETE")
 print("=" * 80)
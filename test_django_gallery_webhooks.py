@@ -8,11 +8,12 @@ when trips are created, published, renamed, and deleted.
 User Credentials: Abu Makram / 3213Plugin?
 """
 
-import requests
 import json
 import time
 from datetime import datetime, timedelta
 
+from probe_client import client
+
 # API Configuration
 MAIN_API_URL = "https://ap.ad4x4.com"
 GALLERY_API_URL = "https://media.ad4x4.com"
@@ -66,7 +67,7 @@ def authenticate_main_api():
         print_info(f"Trying login: '{login_attempt}'")
         
         try:
-            response = requests.post(
+            response = client.post(
                 f"{MAIN_API_URL}/api/auth/login/",
                 json={
                     "login": login_attempt,
@@ -100,7 +101,7 @@ def get_available_levels(token):
     print_header("FETCHING AVAILABLE TRIP LEVELS")
     
     try:
-        response = requests.get(
+        response = client.get(
             f"{MAIN_API_URL}/api/levels/",
             headers={"Authorization": f"Bearer {token}"},
             timeout=10
@@ -125,7 +126,7 @@ def get_meeting_points(token):
     print_header("FETCHING AVAILABLE MEETING POINTS")
     
     try:
-        response = requests.get(
+        response = client.get(
             f"{MAIN_API_URL}/api/meetingpoints/",
             headers={"Authorization": f"Bearer {token}"},
             timeout=10
@@ -181,7 +182,7 @@ def create_test_trip(token, user_data, levels, meeting_points):
     
     try:
         # Django uses /api/trips (no trailing slash) for POST
-        response = requests.post(
+        response = client.post(
             f"{MAIN_API_URL}/api/trips",
             headers={
                 "Authorization": f"Bearer {token}",
@@ -216,7 +217,7 @@ def check_gallery_created(token, trip_id):
     
     try:
         # First, check if trip has galleryId
-        response = requests.get(
+        response = client.get(
             f"{MAIN_API_URL}/api/trips/{trip_id}/",
             headers={"Authorization": f"Bearer {token}"},
             timeout=10
@@ -230,7 +231,7 @@ def check_gallery_created(token, trip_id):
                 print_success(f"Trip has Gallery ID: {gallery_id}")
                 
                 # Verify gallery exists in Gallery API
-                gallery_response = requests.get(
+                gallery_response = client.get(
                     f"{GALLERY_API_URL}/api/galleries",
                     headers={"Authorization": f"Bearer {token}"},
                     params={"limit": 100},
@@ -276,7 +277,7 @@ def approve_trip(token, trip_id):
     print_warning("Note: This may require admin permissions")
     
     try:
-        response = requests.post(
+        response = client.post(
             f"{MAIN_API_URL}/api/trips/{trip_id}/approve",
             headers={"Authorization": f"Bearer {token}"},
             timeout=10
@@ -297,7 +298,7 @@ def approve_trip(token, trip_id):
             # Try alternative approach - PATCH with approval_status
             print_info("Trying alternative approval method (PATCH)...")
             
-            patch_response = requests.patch(
+            patch_response = client.patch(
                 f"{MAIN_API_URL}/api/trips/{trip_id}",
                 headers={
                     "Authorization": f"Bearer {token}",
@@ -326,7 +327,7 @@ def rename_trip(token, trip_id, new_title):
     print_info(f"New Title: {new_title}")
     
     try:
-        response = requests.patch(
+        response = client.patch(
             f"{MAIN_API_URL}/api/trips/{trip_id}",
             headers={
                 "Authorization": f"Bearer {token}",
@@ -354,7 +355,7 @@ def check_gallery_renamed(token, gallery_id, expected_name):
     print_header("CHECKING IF GALLERY WAS RENAMED")
     
     try:
-        response = requests.get(
+        response = client.get(
             f"{GALLERY_API_URL}/api/galleries",
             headers={"Authorization": f"Bearer {token}"},
             params={"limit": 100},
@@ -395,7 +396,7 @@ def delete_trip(token, trip_id):
     print_header("DELETING TEST TRIP")
     
     try:
-        response = requests.delete(
+        response = client.delete(
             f"{MAIN_API_URL}/api/trips/{trip_id}",
             headers={"Authorization": f"Bearer {token}"},
             timeout=10
@@ -419,7 +420,7 @@ def check_gallery_deleted(token, gallery_id):
     print_header("CHECKING IF GALLERY WAS DELETED")
     
     try:
-        response = requests.get(
+        response = client.get(
             f"{GALLERY_API_URL}/api/galleries",
             headers={"Authorization": f"Bearer {token}"},
             params={"limit": 100},
@@ -555,5 +556,7 @@ def main():
         print("Django backend IS calling at least the 'published' webhook.")
         print("Verify other webhooks (rename, delete, restore) are also implemented.")
 
+    client.print_metrics()
+
 if __name__ == "__main__":
     main()
@@ -4,15 +4,15 @@ Test Registration -> Login Flow
 Simulates the exact user journey you experienced
 """
 
-import requests
-import time
 import json
 
+from probe_client import client, pause, run_clock
+
 BASE_URL = "https://ap.ad4x4.com"
 
 # Test credentials
-TEST_USERNAME = f"test_hani_{int(time.time())}"
-TEST_EMAIL = f"test_hani_{int(time.time())}@example.com"
+TEST_USERNAME = f"test_hani_{int(run_clock())}"
+TEST_EMAIL = f"test_hani_{int(run_clock())}@example.com"
 TEST_PASSWORD = "Test1234!"
 
 print("=" * 70)
@@ -36,7 +36,7 @@ register_data = {
 }
 
 try:
-    register_response = requests.post(
+    register_response = client.post(
         f"{BASE_URL}/api/auth/register/",
         json=register_data,
         timeout=10
@@ -60,7 +60,7 @@ except Exception as e:
 
 # Wait a moment for backend processing
 print(f"\n⏳ Waiting 2 seconds for backend processing...")
-time.sleep(2)
+pause(2)
 
 # Step 2: Try login with USERNAME
 print(f"\n🔐 STEP 2A: Attempting login with USERNAME...")
@@ -73,7 +73,7 @@ login_data_username = {
 }
 
 try:
-    login_response = requests.post(
+    login_response = client.post(
         f"{BASE_URL}/api/auth/login/",
         json=login_data_username,
         timeout=10
@@ -104,7 +104,7 @@ login_data_email = {
 }
 
 try:
-    login_response = requests.post(
+    login_response = client.post(
         f"{BASE_URL}/api/auth/login/",
         json=login_data_email,
         timeout=10
@@ -127,3 +127,5 @@ except Exception as e:
 print(f"\n" + "=" * 70)
 print("TEST COMPLETE")
 print("=" * 70)
+
+client.print_metrics()
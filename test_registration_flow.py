@@ -4,15 +4,16 @@ End-to-End Registration Flow Test
 Tests all three phases of the registration validation system
 """
 
-import requests
 import json
 import time
 from datetime import datetime
 
+from probe_client import client, pause, run_clock
+
 # Configuration
 BASE_URL = "https://ap.ad4x4.com"
-TEST_USERNAME = f"test_user_{int(time.time())}"
-TEST_EMAIL = f"test_{int(time.time())}@example.com"
+TEST_USERNAME = f"test_user_{int(run_clock())}"
+TEST_EMAIL = f"test_{int(run_clock())}@example.com"
 TEST_PASSWORD = "Test1234!"  # Strong password
 
 class Colors:
@@ -46,7 +47,7 @@ def test_phase1_trailing_slash():
     
     # Test 1: Register endpoint WITHOUT trailing slash (should fail with 405)
     try:
-        response = requests.post(
+        response = client.post(
             f"{BASE_URL}/api/auth/register",  # NO trailing slash
             json={"username": "test", "email": "test@test.com", "password": "test"},
             timeout=10,
@@ -71,7 +72,7 @@ def test_phase1_trailing_slash():
     
     # Test 2: Register endpoint WITH trailing slash (correct endpoint)
     try:
-        response = requests.post(
+        response = client.post(
             f"{BASE_URL}/api/auth/register/",  # WITH trailing slash
             json={
                 "username": TEST_USERNAME,
@@ -117,7 +118,7 @@ def test_phase2_live_validation():
     
     # Test 1: Validate existing username (should return valid=false)
     try:
-        response = requests.post(
+        response = client.post(
             f"{BASE_URL}/api/validators/",
             json={"username": "Hani AMJ"},  # Known existing username
             timeout=10
@@ -142,9 +143,9 @@ def test_phase2_live_validation():
         tests_failed += 1
     
     # Test 2: Validate new username (should return valid=true)
-    new_username = f"new_user_{int(time.time())}"
+    new_username = f"new_user_{int(run_clock())}"
     try:
-        response = requests.post(
+        response = client.post(
             f"{BASE_URL}/api/validators/",
             json={"username": new_username},
             timeout=10
@@ -170,7 +171,7 @@ def test_phase2_live_validation():
     
     # Test 3: Validate existing email (should return valid=false)
     try:
-        response = requests.post(
+        response = client.post(
             f"{BASE_URL}/api/validators/",
             json={"email": "hani_janem@hotmail.com"},  # Known existing email
             timeout=10
@@ -195,9 +196,9 @@ def test_phase2_live_validation():
         tests_failed += 1
     
     # Test 4: Validate new email (should return valid=true)
-    new_email = f"new_email_{int(time.time())}@test.com"
+    new_email = f"new_email_{int(run_clock())}@test.com"
     try:
-        response = requests.post(
+        response = client.post(
             f"{BASE_URL}/api/validators/",
             json={"email": new_email},
             timeout=10
@@ -229,12 +230,12 @@ def test_phase2_live_validation():
         
         # Simulate rapid typing - only last validation should matter
         for username in test_usernames:
-            requests.post(
+            client.post(
                 f"{BASE_URL}/api/validators/",
                 json={"username": username},
                 timeout=10
             )
-            time.sleep(0.1)  # 100ms between calls (faster than 500ms debounce)
+            pause(0.1)  # 100ms between calls (faster than 500ms debounce)
         
         elapsed = time.time() - start_time
         print_test("Debouncing behavior", "INFO", 
@@ -357,6 +358,8 @@ def main():
         json.dump(results, f, indent=2)
     
     print(f"\n{Colors.OKCYAN}Results saved to: registration_flow_test_results.json{Colors.ENDC}\n")
+
+    client.print_metrics()
     
     return total_failed == 0
 
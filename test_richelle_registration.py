@@ -3,15 +3,15 @@
 Test Registration with Richelle's credential pattern
 """
 
-import requests
-import time
 import json
 
+from probe_client import client, pause, run_clock
+
 BASE_URL = "https://ap.ad4x4.com"
 
 # Test credentials matching your pattern
-TEST_USERNAME = f"TestUser_{int(time.time())}"
-TEST_EMAIL = f"testuser_{int(time.time())}@ad4x4.com"
+TEST_USERNAME = f"TestUser_{int(run_clock())}"
+TEST_EMAIL = f"testuser_{int(run_clock())}@ad4x4.com"
 TEST_PASSWORD = "3213Plugin?"  # Same pattern as yours (numbers + letters + special chars)
 
 print("=" * 70)
@@ -35,7 +35,7 @@ register_data = {
 }
 
 try:
-    register_response = requests.post(
+    register_response = client.post(
         f"{BASE_URL}/api/auth/register/",
         json=register_data,
         timeout=10
@@ -79,7 +79,7 @@ if register_response.status_code != 201:
 
 # Wait for backend processing
 print(f"\n⏳ Waiting 2 seconds for backend processing...")
-time.sleep(2)
+pause(2)
 
 # Step 2A: Try login with USERNAME
 print(f"\n🔐 STEP 2A: Login attempt with USERNAME")
@@ -91,7 +91,7 @@ login_data_username = {
 }
 
 try:
-    login_response = requests.post(
+    login_response = client.post(
         f"{BASE_URL}/api/auth/login/",
         json=login_data_username,
         timeout=10
@@ -126,7 +126,7 @@ login_data_email = {
 }
 
 try:
-    login_response = requests.post(
+    login_response = client.post(
         f"{BASE_URL}/api/auth/login/",
         json=login_data_email,
         timeout=10
@@ -162,3 +162,5 @@ If registration succeeded but login failed, possible causes:
 4. Special characters in password causing encoding issues
 """)
 print("=" * 70)
+
+client.print_metrics()
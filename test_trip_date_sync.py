@@ -8,11 +8,12 @@ Tests the complete workflow:
 4. Verify gallery syncs changes via webhook
 """
 
-import requests
 import json
 import time
 from datetime import datetime, timedelta
 
+from probe_client import client
+
 # API Configuration
 MAIN_API = "https://ap.ad4x4.com"
 GALLERY_API = "https://media.ad4x4.com"
@@ -24,7 +25,7 @@ PASSWORD = "3213Plugin?"
 def authenticate():
     """Authenticate with Main API"""
     print("🔐 Authenticating with Main API...")
-    response = requests.post(
+    response = client.post(
         f"{MAIN_API}/api/auth/login/",
         json={"login": USERNAME, "password": PASSWORD}
     )
@@ -43,7 +44,7 @@ def authenticate():
 def get_trip_level(token):
     """Get Club Event level ID"""
     print("\n📊 Fetching trip levels...")
-    response = requests.get(
+    response = client.get(
         f"{MAIN_API}/api/levels/",
         headers={"Authorization": f"Bearer {token}"}
     )
@@ -65,7 +66,7 @@ def get_trip_level(token):
 def get_meeting_point(token):
     """Get a meeting point ID"""
     print("\n📍 Fetching meeting points...")
-    response = requests.get(
+    response = client.get(
         f"{MAIN_API}/api/meeting-points/",
         headers={"Authorization": f"Bearer {token}"}
     )
@@ -112,7 +113,7 @@ def create_test_trip(token, user_id, level_id, meeting_point_id):
     print(f"   Start Time: {trip_date_str}")
     print(f"   Date: {trip_date.strftime('%A, %B %d, %Y at %I:%M %p')}")
     
-    response = requests.post(
+    response = client.post(
         f"{MAIN_API}/api/trips/",
         headers={
             "Authorization": f"Bearer {token}",
@@ -143,7 +144,7 @@ def create_test_trip(token, user_id, level_id, meeting_point_id):
 def get_trip_details(token, trip_id):
     """Get trip details from Main API"""
     print(f"\n🔍 Fetching trip details from Main API...")
-    response = requests.get(
+    response = client.get(
         f"{MAIN_API}/api/trips/{trip_id}/",
         headers={"Authorization": f"Bearer {token}"}
     )
@@ -163,7 +164,7 @@ def get_trip_details(token, trip_id):
 def check_gallery(token, gallery_id):
     """Check gallery details from Gallery API"""
     print(f"\n🖼️  Checking gallery in Gallery API...")
-    response = requests.get(
+    response = client.get(
         f"{GALLERY_API}/api/galleries/{gallery_id}",
         headers={"Authorization": f"Bearer {token}"}
     )
@@ -204,7 +205,7 @@ def update_trip(token, trip_id):
     print(f"   New Start Time: {new_trip_date_str}")
     print(f"   New Date: {new_trip_date.strftime('%A, %B %d, %Y at %I:%M %p')}")
     
-    response = requests.put(
+    response = client.put(
         f"{MAIN_API}/api/trips/{trip_id}/",
         headers={
             "Authorization": f"Bearer {token}",
@@ -345,5 +346,7 @@ def main():
     print(f"   Check the Gallery screen to see the trip date displayed!")
     print("=" * 60)
 
+    client.print_metrics()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Bulk Trip Fixtures
+Creates, approves and deletes hundreds of tagged trips concurrently so
+staging (or a local stand-in server) can be filled with a realistic trip
+volume for performance testing - and emptied again afterwards.
+
+- Every fixture trip has a deterministic key (<batch>-<index>) embedded in
+  its title as "[fixture <batch>-0042] ...", so the tool can always find its
+  own trips, on the server as well as in the local manifest
+  (trip_fixtures_manifest.json).
+- Idempotent: rerunning `create` for the same batch only creates the keys
+  that do not exist yet; `cleanup` treats 404 as already deleted.
+- Trips are spread over all levels and meeting points and over the next
+  --days days, like real club traffic.
+- Requests run in a thread pool and are retried with exponential backoff on
+  connection errors, 429 (honouring Retry-After) and 5xx. Writes that are not
+  idempotent (creating a trip) are only resent when the earlier attempt
+  never reached the server or got 429; after any other failure the create
+  first looks the fixture key up on the server, so a trip is never created
+  twice. Should duplicates exist anyway, `cleanup` deletes all of them.
+
+Usage:
+    python3 trip_fixtures.py create --base-url https://staging.example --count 300 --batch perf1 --approve
+    python3 trip_fixtures.py status --base-url https://staging.example
+    python3 trip_fixtures.py cleanup --base-url https://staging.example --batch perf1
+    python3 trip_fixtures.py cleanup --base-url https://staging.example --all
+
+Production is refused unless --allow-production is given.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import requests
+
+from probe_client import (DEFAULT_RETRIES, RETRY_STATUSES, AuthenticationError, ProbeClient, authenticate,
+                          call_with_retry, client, fetch_all, retry_delay)
+
+# API Configuration
+MAIN_API = "https://ap.ad4x4.com"
+PRODUCTION_HOSTS = {"ap.ad4x4.com"}
+
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trip_fixtures_manifest.json")
+FIXTURE_TITLE = re.compile(r"^\[fixture (?P<batch>[\w.-]+)-(?P<index>\d{4})\]")
+
+DEFAULT_CONCURRENCY = 16
+REQUEST_TIMEOUT = 30
+
+# Uncached, uncoalesced client for "does this fixture exist yet" checks: a
+# memoized or shared listing from before an ambiguous create would miss it
+recheck_client = ProbeClient(coalesce=False, memo_ttl=0)
+
+
+class Manifest:
+    """Local record of created fixtures: {base_url: {batch: {key: {"id", "approved"}}}}"""
+
+    def __init__(self, path, base_url):
+        self.path = path
+        self.base_url = base_url
+        self._lock = threading.Lock()
+        self._data = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._data = json.load(f)
+
+    def batches(self):
+        return self._data.setdefault(self.base_url, {})
+
+    def get(self, batch, key):
+        with self._lock:
+            return self.batches().get(batch, {}).get(key)
+
+    def put(self, batch, key, **fields):
+        with self._lock:
+            entry = self.batches().setdefault(batch, {}).setdefault(key, {})
+            entry.update(fields)
+
+    def remove(self, batch, key):
+        with self._lock:
+            self.batches().get(batch, {}).pop(key, None)
+            if not self.batches().get(batch):
+                self.batches().pop(batch, None)
+
+    def save(self):
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._data, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+# ============================================================================
+# HTTP HELPERS
+# ============================================================================
+
+def extract_id(payload):
+    """Trip id from the create response (the id lives in "message" on this API)"""
+    if not isinstance(payload, dict):
+        return None
+    message = payload.get("message")
+    if isinstance(message, dict) and message.get("id"):
+        return message["id"]
+    data = payload.get("data")
+    if isinstance(data, dict) and data.get("id"):
+        return data["id"]
+    return payload.get("id")
+
+
+def find_server_fixtures(base_url, headers, user_id, http=None):
+    """{(batch, key): [trip ids]} for fixture trips led by us that still exist"""
+    params = {"lead": user_id} if user_id else {}
+    found = {}
+    for trip in fetch_all(base_url, "/api/trips/", headers, params, http=http):
+        match = FIXTURE_TITLE.match(trip.get("title") or "")
+        if match:
+            key = f"{match.group('batch')}-{match.group('index')}"
+            found.setdefault((match.group("batch"), key), []).append(trip.get("id"))
+    return found
+
+
+# ============================================================================
+# OPERATIONS
+# ============================================================================
+
+def build_trip(key, index, batch, user_id, levels, meeting_points, days):
+    level = levels[index % len(levels)]
+    start = (datetime.now() + timedelta(days=1 + index % days)).replace(
+        hour=6 + index % 12, minute=0, second=0, microsecond=0)
+    trip = {
+        "title": f"[fixture {key}] {level.get('name', 'Trip')} run #{index}",
+        "description": f"Performance fixture from trip_fixtures.py (batch {batch}). Safe to delete.",
+        "lead": user_id,
+        "level": level["id"],
+        "startTime": start.strftime("%Y-%m-%dT%H:%M:%S"),
+        "endTime": (start + timedelta(hours=4)).strftime("%Y-%m-%dT%H:%M:%S"),
+        "cutOff": (start - timedelta(hours=12)).strftime("%Y-%m-%dT%H:%M:%S"),
+        "capacity": 10 + index % 30,
+        "allowWaitlist": index % 3 != 0,
+    }
+    if meeting_points:
+        trip["meetingPoint"] = meeting_points[index % len(meeting_points)]["id"]
+    return trip
+
+
+def create_one(base_url, headers, manifest, batch, key, trip, approve):
+    error = None
+    for attempt in range(DEFAULT_RETRIES + 1):
+        if attempt:
+            # The failed attempt may still have created the trip: look before resending
+            time.sleep(retry_delay(attempt - 1) * random.uniform(0.8, 1.2))
+            try:
+                found = find_server_fixtures(base_url, headers, trip["lead"], recheck_client).get((batch, key))
+            except (requests.exceptions.RequestException, RuntimeError) as e:
+                return key, None, f"{error}; re-check failed ({e}), not resending"
+            if found:
+                trip_id = found[0]
+                break
+        try:
+            response = call_with_retry("POST", f"{base_url}/api/trips", headers=headers, json=trip)
+        except requests.exceptions.RequestException as e:
+            error = f"create {type(e).__name__}"
+            continue
+        if response.status_code in RETRY_STATUSES:
+            error = f"create {response.status_code}"
+            continue
+        if response.status_code not in (200, 201):
+            return key, None, f"create {response.status_code}: {response.text[:120]}"
+        try:
+            trip_id = extract_id(response.json())
+        except ValueError:
+            trip_id = None
+        if not trip_id:
+            return key, None, "created but no id in response"
+        break
+    else:
+        return key, None, error
+    manifest.put(batch, key, id=trip_id, approved=False)
+
+    if approve:
+        approved = approve_one(base_url, headers, trip_id)
+        manifest.put(batch, key, approved=approved)
+        if not approved:
+            return key, trip_id, "approve failed"
+    return key, trip_id, None
+
+
+def approve_one(base_url, headers, trip_id):
+    try:
+        response = call_with_retry("POST", f"{base_url}/api/trips/{trip_id}/approve", headers=headers,
+                                   idempotent=True)
+    except requests.exceptions.RequestException:
+        return False
+    return response.status_code in (200, 201, 204)
+
+
+def approve_existing(base_url, headers, manifest, batch, key, trip_id):
+    if not approve_one(base_url, headers, trip_id):
+        return key, trip_id, "approve failed"
+    manifest.put(batch, key, approved=True)
+    return key, trip_id, None
+
+
+def delete_one(base_url, headers, trip_id):
+    """None when the trip is gone, otherwise the error (never raises, so one failure cannot end a run)"""
+    try:
+        response = call_with_retry("DELETE", f"{base_url}/api/trips/{trip_id}", headers=headers)
+    except requests.exceptions.RequestException as e:
+        return f"delete {type(e).__name__}: {e}"[:160]
+    # 404: already gone, which is what we wanted
+    if response.status_code in (200, 202, 204, 404):
+        return None
+    return f"delete {response.status_code}: {response.text[:120]}"
+
+
+def run_parallel(jobs, concurrency, label):
+    """Run (callable, args) jobs in a thread pool, printing progress; returns results"""
+    results = []
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(function, *args) for function, args in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            results.append(future.result())
+            if done % 25 == 0 or done == len(futures):
+                rate = done / max(time.monotonic() - started, 1e-6)
+                print(f"   {label}: {done}/{len(futures)} ({rate:.1f}/s)")
+    return results
+
+
+def command_create(args, base_url, manifest):
+    headers, user_id = authenticate(base_url)
+    if not user_id:
+        print("❌ Could not read our member id from /api/auth/profile/")
+        sys.exit(1)
+
+    levels = fetch_all(base_url, "/api/levels/", headers)
+    if args.levels:
+        wanted = set(args.levels)
+        levels = [level for level in levels if level.get("numericLevel") in wanted or level.get("id") in wanted]
+    meeting_points = fetch_all(base_url, "/api/meetingpoints/", headers)
+    if not levels:
+        print("❌ No levels available")
+        sys.exit(1)
+    print(f"📋 {len(levels)} levels, {len(meeting_points)} meeting points")
+
+    existing = find_server_fixtures(base_url, headers, user_id)
+    jobs = []
+    skipped = 0
+    for index in range(args.count):
+        key = f"{args.batch}-{index:04d}"
+        trip_ids = existing.get((args.batch, key))
+        if trip_ids:
+            trip_id = trip_ids[0]
+            if not manifest.get(args.batch, key):
+                manifest.put(args.batch, key, id=trip_id, approved=False)
+            entry = manifest.get(args.batch, key)
+            if args.approve and not entry.get("approved"):
+                jobs.append((approve_existing, (base_url, headers, manifest, args.batch, key, trip_id)))
+            else:
+                skipped += 1
+            continue
+        trip = build_trip(key, index, args.batch, user_id, levels, meeting_points, args.days)
+        jobs.append((create_one, (base_url, headers, manifest, args.batch, key, trip, args.approve)))
+
+    print(f"\n🚀 Creating {len(jobs)} trips in batch '{args.batch}' ({skipped} already exist), "
+          f"concurrency {args.concurrency}")
+    try:
+        results = run_parallel(jobs, args.concurrency, "created")
+    finally:
+        manifest.save()
+
+    failures = [(key, error) for key, _trip_id, error in results if error]
+    print(f"\n✅ {len(results) - len(failures)} ok, ❌ {len(failures)} failed")
+    for key, error in failures[:20]:
+        print(f"   {key}: {error}")
+    return not failures
+
+
+def command_cleanup(args, base_url, manifest):
+    headers, user_id = authenticate(base_url)
+    targets = {}  # (batch, key) -> trip ids (duplicates of a key included)
+    for batch, entries in list(manifest.batches().items()):
+        if args.all or batch == args.batch:
+            for key, entry in entries.items():
+                targets.setdefault((batch, key), set()).add(entry["id"])
+    for (batch, key), trip_ids in find_server_fixtures(base_url, headers, user_id).items():
+        if args.all or batch == args.batch:
+            targets.setdefault((batch, key), set()).update(trip_ids)
+
+    def delete_job(batch, key, trip_ids):
+        errors = [error for error in (delete_one(base_url, headers, trip_id) for trip_id in trip_ids) if error]
+        if not errors:
+            manifest.remove(batch, key)
+        return key, trip_ids, "; ".join(errors) or None
+
+    scope = "all batches" if args.all else f"batch '{args.batch}'"
+    total = sum(len(trip_ids) for trip_ids in targets.values())
+    print(f"\n🧹 Deleting {total} fixture trips of {len(targets)} keys ({scope}), concurrency {args.concurrency}")
+    try:
+        results = run_parallel([(delete_job, (batch, key, sorted(trip_ids, key=str)))
+                                for (batch, key), trip_ids in targets.items()],
+                               args.concurrency, "deleted")
+    finally:
+        manifest.save()
+
+    failures = [(key, error) for key, _trip_id, error in results if error]
+    print(f"\n✅ {len(results) - len(failures)} deleted, ❌ {len(failures)} failed")
+    for key, error in failures[:20]:
+        print(f"   {key}: {error}")
+    return not failures
+
+
+def command_status(args, base_url, manifest):
+    headers, user_id = authenticate(base_url)
+    on_server = find_server_fixtures(base_url, headers, user_id)
+    batches = sorted(set(manifest.batches()) | {batch for batch, _key in on_server})
+    print(f"\n{'Batch':<20} {'Manifest':>9} {'Server':>7} {'Approved':>9}")
+    print("-" * 48)
+    for batch in batches:
+        entries = manifest.batches().get(batch, {})
+        approved = sum(1 for entry in entries.values() if entry.get("approved"))
+        server = sum(len(trip_ids) for (b, _key), trip_ids in on_server.items() if b == batch)
+        print(f"{batch:<20} {len(entries):>9} {server:>7} {approved:>9}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create, approve and clean up bulk trip fixtures")
+    parser.add_argument("command", choices=("create", "cleanup", "status"))
+    parser.add_argument("--base-url", default=MAIN_API, help="Main API base URL (staging / local stand-in)")
+    parser.add_argument("--batch", default="default", help="Fixture batch name (tag)")
+    parser.add_argument("--count", type=int, default=100, help="Trips in the batch (create)")
+    parser.add_argument("--days", type=int, default=60, help="Spread start dates over this many days")
+    parser.add_argument("--levels", type=int, nargs="*", help="Only these level ids / numeric levels")
+    parser.add_argument("--approve", action="store_true", help="Approve every created trip")
+    parser.add_argument("--all", action="store_true", help="cleanup: every batch, not just --batch")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--allow-production", action="store_true")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    if urllib.parse.urlsplit(base_url).hostname in PRODUCTION_HOSTS and not args.allow_production:
+        print(f"❌ {base_url} is production; pass --allow-production if you really mean it")
+        sys.exit(1)
+    if not re.match(r"^[\w.-]+$", args.batch):
+        print("❌ --batch may only contain letters, digits, '.', '_' and '-'")
+        sys.exit(1)
+
+    print("=" * 80)
+    print(f"TRIP FIXTURES - {args.command.upper()} ({base_url})")
+    print("=" * 80)
+
+    manifest = Manifest(args.manifest, base_url)
+    command = {"create": command_create, "cleanup": command_cleanup, "status": command_status}[args.command]
+    try:
+        ok = command(args, base_url, manifest)
+    except (AuthenticationError, RuntimeError, requests.exceptions.RequestException) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    client.print_metrics()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
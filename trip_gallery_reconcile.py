@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Trip <-> Gallery Consistency Reconciler
+Streams every trip from the Main API and every gallery from the Gallery API
+concurrently, joins them in memory and reports (or repairs) every divergence
+in one pass - the checks trip_gallery_investigation.json and
+DELETED_TRIPS_SCAN_REPORT.md were done by hand.
+
+Both sides are paginated: page 1 gives the total, the remaining pages are
+fetched in parallel, and the two APIs are read at the same time. Pages are
+indexed as they arrive:
+
+    trips_by_id        trip id -> trip
+    galleries_by_id    gallery id -> gallery
+    galleries_by_trip  source_trip_id -> [galleries]
+
+so the join is a dictionary lookup per trip and thousands of trips take as
+long as the slowest page fetch round, not hours.
+
+Divergences:
+    missing_gallery        approved trip with no gallery at all
+    dangling_gallery_id    trip.galleryId points to a gallery that does not exist
+    gallery_id_mismatch    trip.galleryId differs from the gallery whose source_trip_id is the trip
+    deleted_gallery_live_trip  approved trip whose gallery is soft-deleted
+    live_gallery_dead_trip     deleted / rejected trip whose gallery is still live
+    orphan_gallery         auto-created gallery whose trip does not exist
+    stale_title            auto-created gallery name differs from the trip title
+    stale_start_time       gallery trip_start_time differs from the trip startTime
+
+--repair fixes the repairable kinds by calling the Gallery API's idempotent
+trip webhooks (published / restored / deleted / updated), exactly what Django
+should have sent. Without --repair nothing is changed.
+
+Soft-deleted galleries are only visible through the admin listing
+(/api/admin/content/galleries); without admin rights the public listing is
+used and the soft-delete checks are skipped.
+
+Usage:
+    python3 trip_gallery_reconcile.py --since 2025-01-01
+    python3 trip_gallery_reconcile.py --kinds stale_title,stale_start_time --repair
+    python3 trip_gallery_reconcile.py --base-url https://staging.example --gallery-url https://media-staging.example
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from probe_client import (GALLERY_API, MAIN_API, AuthenticationError, Index, authenticate, call_with_retry, client,
+                          load_galleries, stream_pages, trip_key)
+
+PAGE_SIZE = 100
+DEFAULT_CONCURRENCY = 8
+REPORT_FILE = "trip_gallery_reconcile_report.json"
+
+KINDS = ("missing_gallery", "dangling_gallery_id", "gallery_id_mismatch", "deleted_gallery_live_trip",
+         "live_gallery_dead_trip", "orphan_gallery", "stale_title", "stale_start_time")
+# Kind -> Gallery webhook that repairs it
+REPAIRS = {
+    "missing_gallery": "published",
+    "deleted_gallery_live_trip": "restored",
+    "live_gallery_dead_trip": "deleted",
+    "orphan_gallery": "deleted",
+    "stale_title": "updated",
+    "stale_start_time": "updated",
+}
+LIVE_STATUSES = {"A"}
+DEAD_STATUSES = {"D", "R"}
+
+
+def wall_clock(value):
+    """Naive minute-resolution datetime of an ISO / "YYYY-MM-DD HH:MM:SS" timestamp"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00").replace(" ", "T"))
+    except ValueError:
+        return None
+    return parsed.replace(tzinfo=None, second=0, microsecond=0)
+
+
+# ============================================================================
+# STREAMING
+# ============================================================================
+
+def load_trips(base_url, headers, index, pool):
+    url = f"{base_url}/api/trips/"
+
+    def fetch_page(page):
+        response = call_with_retry("GET", url, headers=headers, params={"page": page, "pageSize": PAGE_SIZE})
+        if response.status_code != 200:
+            index.errors.append(f"trips page {page}: {response.status_code}")
+            return None
+        return response.json()
+
+    def page_count(data):
+        return math.ceil((data.get("count") or 0) / PAGE_SIZE)
+
+    for data in stream_pages(fetch_page, page_count, pool):
+        index.add_trips(data.get("results", []))
+
+
+# ============================================================================
+# JOIN
+# ============================================================================
+
+def divergence(kind, trip=None, gallery=None, **details):
+    item = OrderedDict([("kind", kind),
+                        ("trip_id", trip.get("id") if trip else trip_key(gallery.get("source_trip_id"))),
+                        ("gallery_id", gallery.get("id") if gallery else (trip or {}).get("galleryId"))])
+    item.update(details)
+    return item
+
+
+def reconcile(index, check_soft_deleted=True, since=None):
+    """One pass over the trips plus one over the galleries; returns divergences"""
+    found = []
+    for key, trip in index.trips_by_id.items():
+        if since and (wall_clock(trip.get("startTime")) or datetime.min) < since:
+            continue
+        status = trip.get("approvalStatus")
+        linked = index.galleries_by_trip.get(key, [])
+        gallery_id = trip.get("galleryId")
+        by_id = index.galleries_by_id.get(str(gallery_id)) if gallery_id else None
+
+        if gallery_id and by_id is None and check_soft_deleted:
+            found.append(divergence("dangling_gallery_id", trip))
+        if gallery_id and linked and all(str(g.get("id")) != str(gallery_id) for g in linked):
+            found.append(divergence("gallery_id_mismatch", trip, linked[0],
+                                    trip_gallery_id=gallery_id, linked_gallery_ids=[g.get("id") for g in linked]))
+
+        gallery = by_id or (linked[0] if linked else None)
+        if gallery is None:
+            if status in LIVE_STATUSES and not gallery_id:
+                found.append(divergence("missing_gallery", trip, title=trip.get("title")))
+            continue
+
+        deleted = bool(gallery.get("soft_deleted_at"))
+        if status in LIVE_STATUSES and deleted and check_soft_deleted:
+            found.append(divergence("deleted_gallery_live_trip", trip, gallery,
+                                    soft_deleted_at=gallery.get("soft_deleted_at")))
+        if status in DEAD_STATUSES and not deleted:
+            found.append(divergence("live_gallery_dead_trip", trip, gallery, approval_status=status))
+
+        if not gallery.get("auto_created") or deleted:
+            # Manually created galleries keep their own name; soft-deleted ones are not updated
+            continue
+        if (gallery.get("name") or "") != (trip.get("title") or ""):
+            found.append(divergence("stale_title", trip, gallery,
+                                    trip_title=trip.get("title"), gallery_name=gallery.get("name")))
+        trip_start = wall_clock(trip.get("startTime"))
+        gallery_start = wall_clock(gallery.get("trip_start_time"))
+        if trip_start and gallery_start != trip_start:
+            found.append(divergence("stale_start_time", trip, gallery,
+                                    trip_start_time=trip.get("startTime"),
+                                    gallery_trip_start_time=gallery.get("trip_start_time")))
+
+    for key, galleries in index.galleries_by_trip.items():
+        if key in index.trips_by_id:
+            continue
+        for gallery in galleries:
+            if gallery.get("auto_created") and not gallery.get("soft_deleted_at"):
+                found.append(divergence("orphan_gallery", gallery=gallery, gallery_name=gallery.get("name")))
+    return found
+
+
+# ============================================================================
+# REPAIR
+# ============================================================================
+
+def webhook_payload(item, index):
+    webhook = REPAIRS[item["kind"]]
+    trip = index.trips_by_id.get(trip_key(item["trip_id"])) or {}
+    payload = {"trip_id": int(trip_key(item["trip_id"]))}
+    if webhook == "published":
+        lead = trip.get("lead") or {}
+        level = trip.get("level") or {}
+        payload.update({
+            "title": trip.get("title"),
+            "creator_id": lead.get("id") if isinstance(lead, dict) else lead,
+            "creator_username": lead.get("username") if isinstance(lead, dict) else None,
+            "level": level.get("id") if isinstance(level, dict) else level,
+            "start_time": trip.get("startTime"),
+        })
+    elif item["kind"] == "stale_title":
+        payload["title"] = trip.get("title")
+    elif item["kind"] == "stale_start_time":
+        payload["start_time"] = trip.get("startTime")
+    return webhook, payload
+
+
+def repair(items, index, gallery_url, headers, concurrency):
+    def apply(item):
+        webhook, payload = webhook_payload(item, index)
+        response = call_with_retry("POST", f"{gallery_url}/api/webhooks/trip/{webhook}",
+                                   headers=headers, json=payload)
+        ok = response.status_code in (200, 201)
+        item["repair"] = {"webhook": webhook, "status": response.status_code, "ok": ok}
+        return ok
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(apply, items))
+    return sum(results), len(results) - sum(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find and repair trip / gallery divergences")
+    parser.add_argument("--base-url", default=MAIN_API, help="Main API base URL")
+    parser.add_argument("--gallery-url", default=GALLERY_API, help="Gallery API base URL")
+    parser.add_argument("--kinds", help=f"Only these divergence kinds (comma separated): {', '.join(KINDS)}")
+    parser.add_argument("--since", help="Only check trips starting on or after this date (YYYY-MM-DD); "
+                                            "older trips predate the gallery integration")
+    parser.add_argument("--repair", action="store_true", help="Call the Gallery webhooks that fix repairable kinds")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Parallel page fetches / repairs")
+    parser.add_argument("--output", default=REPORT_FILE)
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    gallery_url = args.gallery_url.rstrip("/")
+    kinds = set(KINDS)
+    if args.kinds:
+        kinds = {kind.strip() for kind in args.kinds.split(",") if kind.strip()}
+        unknown = kinds - set(KINDS)
+        if unknown:
+            print(f"❌ Unknown kind(s): {', '.join(sorted(unknown))}")
+            sys.exit(1)
+
+    print("=" * 80)
+    print("TRIP <-> GALLERY RECONCILER")
+    print("=" * 80)
+    print(f"Main API: {base_url}  Gallery API: {gallery_url}")
+    since = None
+    if args.since:
+        try:
+            since = datetime.strptime(args.since, "%Y-%m-%d")
+        except ValueError:
+            print("❌ --since must be YYYY-MM-DD")
+            sys.exit(1)
+    try:
+        headers, _user_id = authenticate(base_url)
+    except AuthenticationError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    started = time.monotonic()
+    index = Index()
+    with ThreadPoolExecutor(max_workers=args.concurrency * 2 + 2) as pool:
+        streams = [pool.submit(load_trips, base_url, headers, index, pool),
+                   pool.submit(load_galleries, gallery_url, headers, index, pool)]
+        for stream in streams:
+            stream.result()
+    loaded = time.monotonic() - started
+    print(f"📥 {len(index.trips_by_id)} trips, {len(index.galleries_by_id)} galleries "
+          f"({index.gallery_source or 'unavailable'}) in {loaded:.1f}s")
+    for error in index.errors[:10]:
+        print(f"   ⚠️  {error}")
+    if index.errors:
+        print("❌ Incomplete data - refusing to reconcile a partial view")
+        sys.exit(1)
+
+    check_soft_deleted = index.gallery_source == "/api/admin/content/galleries"
+    if not check_soft_deleted:
+        print("ℹ️  No admin gallery listing: soft-deleted galleries are invisible, soft-delete checks skipped")
+    items = [item for item in reconcile(index, check_soft_deleted, since) if item["kind"] in kinds]
+
+    counts = OrderedDict((kind, sum(1 for item in items if item["kind"] == kind)) for kind in KINDS if kind in kinds)
+    print(f"\n{'Divergence':<28} {'Count':>7}  Repair")
+    print("-" * 60)
+    for kind, count in counts.items():
+        print(f"{kind:<28} {count:>7}  {REPAIRS.get(kind, 'manual')}")
+    print("-" * 60)
+    print(f"Total: {len(items)} divergences ({time.monotonic() - started:.1f}s)")
+
+    repaired = failed = 0
+    if args.repair:
+        repairable = [item for item in items if item["kind"] in REPAIRS]
+        print(f"\n🔧 Repairing {len(repairable)} divergences through the Gallery webhooks...")
+        repaired, failed = repair(repairable, index, gallery_url, headers, args.concurrency)
+        print(f"✅ {repaired} repaired, ❌ {failed} failed")
+    elif any(kind in REPAIRS for kind, count in counts.items() if count):
+        print("\n💡 Run with --repair to fix the repairable kinds")
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "base_url": base_url,
+            "gallery_url": gallery_url,
+            "gallery_source": index.gallery_source,
+            "trips": len(index.trips_by_id),
+            "galleries": len(index.galleries_by_id),
+            "counts": counts,
+            "repaired": repaired,
+            "repair_failed": failed,
+            "divergences": items,
+        }, f, indent=2, default=str)
+    print(f"📄 Report saved to: {args.output}")
+    client.print_metrics()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Member Trip Statistics Engine
+Precomputes the numbers behind the Trip Stats widgets
+(TRIP_STATS_DESIGN_FEASIBILITY_STUDY.md, WIDGET_DATA_REQUIREMENTS.md) for every
+member at once, instead of reassembling them from
+/api/members/{id}/triphistory on every profile view:
+
+- trips per level, registered vs checked in, trips led, attendance rate
+- upcoming trips
+- current and longest streak of consecutive months with a checked-in trip
+
+State:
+    trips     trip id -> level, start, lead and roster {member: checkedIn}
+    counters  member id -> array('i') of [registered, checkedIn, led] per level
+              slot (level id -> slot), plus checked-in trips per month
+
+Counters are only ever changed by applying a trip's roster (+1) or
+retracting it (-1), so a changed trip is handled by retracting its old roster
+and applying the new one - no rescan of anything else.
+
+1. ingest: load trip history once, from the member_harvest.py store
+   (triphistory of every harvested member).
+2. update: read the trips whose rosters can have changed since the last
+   watermark - the Main API has no modified-since filter, so this is every
+   trip ending after (watermark - --grace days), plus their rosters from
+   /api/trips/{id}/ - and re-apply only those. Trips that are no longer
+   approved are retracted. Applied trips in that window that the listing no
+   longer returns (deleted or hidden since) are re-read one by one and
+   retracted on 404 / not approved. The watermark only advances when the
+   listing and every roster were read completely.
+3. snapshot: write trip_stats_snapshot.json, one precomputed entry per member
+   keyed by member id, ready to be served as-is (O(1) lookup).
+
+Usage:
+    python3 trip_stats_engine.py ingest --harvest-db member_harvest.db
+    python3 trip_stats_engine.py update
+    python3 trip_stats_engine.py snapshot
+    python3 trip_stats_engine.py show 259
+"""
+
+import argparse
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import time
+from array import array
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+from member_harvest import DEFAULT_DB_PATH as HARVEST_DB_PATH
+from probe_client import MAIN_API, AuthenticationError, authenticate, call_with_retry, client
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_PATH = os.path.join(BASE_DIR, ".trip_stats_state.pickle")
+SNAPSHOT_PATH = os.path.join(BASE_DIR, "trip_stats_snapshot.json")
+STATE_VERSION = 1
+
+# Counter layout inside a member's array: FIELDS per level slot
+FIELDS = ("registered", "checkedIn", "led")
+DEFAULT_GRACE_DAYS = 14
+DEFAULT_CONCURRENCY = 8
+
+
+def month_index(timestamp):
+    """Months since year 0 of an ISO timestamp (consecutive months differ by 1)"""
+    if not timestamp:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(timestamp).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed.year * 12 + parsed.month - 1
+
+
+def member_id(value):
+    return value.get("id") if isinstance(value, dict) else value
+
+
+def parse_time(timestamp):
+    """Naive datetime of an ISO timestamp, or None"""
+    try:
+        return datetime.fromisoformat(str(timestamp).replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def fetch_listing(base_url, path, headers, params):
+    """Every item of a paginated listing; raises RuntimeError on a failed or short listing"""
+    items = []
+    page = 1
+    while True:
+        query = dict(params, page=page, pageSize=100)
+        response = call_with_retry("GET", f"{base_url}{path}", headers=headers, params=query)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} page {page}: {response.status_code}")
+        data = response.json()
+        if isinstance(data, list):
+            return items + data
+        items.extend(data.get("results", []))
+        if not data.get("next"):
+            break
+        page += 1
+    # A page that shifted or was cut short would silently drop trips
+    count = data.get("count")
+    if isinstance(count, int) and len(items) < count:
+        raise RuntimeError(f"{path}: listing returned {len(items)} of {count} items")
+    return items
+
+
+class TripFact:
+    """Everything a trip contributes to the counters"""
+
+    __slots__ = ("level_id", "start", "month", "lead_id", "roster")
+
+    def __init__(self, level_id, start, lead_id, roster):
+        self.level_id = level_id
+        self.start = start
+        self.month = month_index(start)
+        self.lead_id = lead_id
+        self.roster = roster  # member id -> checked in
+
+    @classmethod
+    def from_trip(cls, trip, roster):
+        level = trip.get("level") or {}
+        return cls(level.get("id") if isinstance(level, dict) else level, trip.get("startTime"),
+                   member_id(trip.get("lead")), roster)
+
+
+class StatsEngine:
+    def __init__(self):
+        self.levels = {}  # level id -> {"name", "numericLevel"}
+        self.slots = {}  # level id -> slot in the counter arrays
+        self.trips = {}  # trip id -> TripFact
+        self.counters = {}  # member id -> array('i')
+        self.months = defaultdict(lambda: defaultdict(int))  # member id -> month -> checked-in trips
+        self.watermark = None
+
+    # ------------------------------------------------------------------
+    # Counters
+    # ------------------------------------------------------------------
+
+    def _slot(self, level_id):
+        slot = self.slots.get(level_id)
+        if slot is None:
+            slot = self.slots[level_id] = len(self.slots)
+        return slot
+
+    def _counter(self, member):
+        counter = self.counters.get(member)
+        width = len(self.slots) * len(FIELDS)
+        if counter is None:
+            counter = self.counters[member] = array("i", bytes(4 * width))
+        elif len(counter) < width:
+            counter.extend([0] * (width - len(counter)))
+        return counter
+
+    def _apply(self, fact, sign):
+        base = self._slot(fact.level_id) * len(FIELDS)
+        for member, checked_in in fact.roster.items():
+            counter = self._counter(member)
+            counter[base] += sign
+            if checked_in:
+                counter[base + 1] += sign
+                if fact.month is not None:
+                    self.months[member][fact.month] += sign
+            if member == fact.lead_id:
+                counter[base + 2] += sign
+
+    def put_trip(self, trip_id, fact):
+        """Replace a trip's contribution (retract the old roster, apply the new one)"""
+        old = self.trips.pop(trip_id, None)
+        if old is not None:
+            self._apply(old, -1)
+        if fact is not None and fact.roster:
+            self.trips[trip_id] = fact
+            self._apply(fact, +1)
+
+    def note_level(self, level):
+        if isinstance(level, dict) and level.get("id") is not None:
+            self.levels[level["id"]] = {"name": level.get("name"), "numericLevel": level.get("numericLevel")}
+
+    # ------------------------------------------------------------------
+    # Snapshot
+    # ------------------------------------------------------------------
+
+    def member_stats(self, member, now=None):
+        now = now or datetime.now()
+        counter = self._counter(member)
+        by_level = []
+        totals = dict.fromkeys(FIELDS, 0)
+        for level_id, slot in sorted(self.slots.items(), key=lambda item: self._level_order(item[0])):
+            values = counter[slot * len(FIELDS):(slot + 1) * len(FIELDS)]
+            if not any(values):
+                continue
+            level = self.levels.get(level_id, {})
+            row = {"levelId": level_id, "levelName": level.get("name"), "levelNumeric": level.get("numericLevel")}
+            row.update(zip(FIELDS, values))
+            by_level.append(row)
+            for field, value in zip(FIELDS, values):
+                totals[field] += value
+
+        current, longest = self._streaks(member, now)
+        upcoming = sum(1 for fact in self.trips.values()
+                       if member in fact.roster and fact.start and fact.start > now.isoformat())
+        return {
+            "memberId": member,
+            "totalTrips": totals["checkedIn"],
+            "registeredTrips": totals["registered"],
+            "checkedInTrips": totals["checkedIn"],
+            "ledTrips": totals["led"],
+            "upcomingTrips": upcoming,
+            "attendanceRate": round(totals["checkedIn"] / totals["registered"], 4) if totals["registered"] else None,
+            "currentStreakMonths": current,
+            "longestStreakMonths": longest,
+            # Same shape as /api/members/{id}/tripcounts (checked-in trips per level)
+            "tripStats": [{"levelName": row["levelName"], "levelNumeric": row["levelNumeric"],
+                           "count": row["checkedIn"]} for row in by_level],
+            "byLevel": by_level,
+        }
+
+    def _level_order(self, level_id):
+        numeric = self.levels.get(level_id, {}).get("numericLevel")
+        return (numeric is None, numeric or 0, str(level_id))
+
+    def _streaks(self, member, now):
+        active = sorted(month for month, count in self.months.get(member, {}).items() if count > 0)
+        longest = run = 0
+        previous = None
+        for month in active:
+            run = run + 1 if previous is not None and month == previous + 1 else 1
+            longest = max(longest, run)
+            previous = month
+        this_month = now.year * 12 + now.month - 1
+        # A streak is still current if it reaches this month or the previous one
+        current = run if active and active[-1] >= this_month - 1 else 0
+        return current, longest
+
+    def snapshot(self, now=None):
+        now = now or datetime.now()
+        return {str(member): self.member_stats(member, now) for member in sorted(self.counters)}
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path):
+        state = {
+            "version": STATE_VERSION,
+            "levels": self.levels,
+            "slots": self.slots,
+            "trips": {trip_id: (f.level_id, f.start, f.lead_id, f.roster) for trip_id, f in self.trips.items()},
+            "counters": {member: counter.tobytes() for member, counter in self.counters.items()},
+            "months": {member: dict(months) for member, months in self.months.items()},
+            "watermark": self.watermark,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        engine = cls()
+        if not os.path.exists(path):
+            return engine
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != STATE_VERSION:
+            print(f"⚠️  {path} has an old layout - run ingest again")
+            return engine
+        engine.levels = state["levels"]
+        engine.slots = state["slots"]
+        engine.trips = {trip_id: TripFact(*values) for trip_id, values in state["trips"].items()}
+        for member, raw in state["counters"].items():
+            counter = array("i")
+            counter.frombytes(raw)
+            engine.counters[member] = counter
+        for member, months in state["months"].items():
+            engine.months[member].update(months)
+        engine.watermark = state["watermark"]
+        return engine
+
+
+# ============================================================================
+# COMMANDS
+# ============================================================================
+
+def command_ingest(args):
+    if not os.path.exists(args.harvest_db):
+        print(f"❌ {args.harvest_db} not found - run: python3 member_harvest.py harvest --resources triphistory ...")
+        return False
+    started = time.monotonic()
+    db = sqlite3.connect(args.harvest_db)
+    rosters = defaultdict(dict)
+    trips = {}
+    engine = StatsEngine()
+    members = 0
+    for member, payload in db.execute(
+            "SELECT member_id, payload FROM harvest WHERE resource = 'triphistory' AND status_code = 200"):
+        members += 1
+        for trip in json.loads(payload or "[]"):
+            rosters[trip["id"]][member] = bool(trip.get("checkedIn"))
+            trips[trip["id"]] = trip
+            engine.note_level(trip.get("level"))
+    for trip_id, trip in trips.items():
+        engine.put_trip(trip_id, TripFact.from_trip(trip, rosters[trip_id]))
+    # Trips ending after the harvest may still change; the first update rereads them
+    harvested_at = db.execute("SELECT MIN(fetched_at) FROM harvest WHERE resource = 'triphistory'").fetchone()[0]
+    engine.watermark = harvested_at or datetime.now().isoformat()
+    engine.save(args.state)
+    print(f"✅ Ingested {len(trips)} trips for {members} members in {time.monotonic() - started:.1f}s "
+          f"(watermark {engine.watermark})")
+    return True
+
+
+def command_update(args):
+    engine = StatsEngine.load(args.state)
+    if engine.watermark is None:
+        print("❌ No state yet - run ingest first")
+        return False
+    base_url = args.base_url.rstrip("/")
+    try:
+        headers, _user_id = authenticate(base_url)
+    except AuthenticationError as e:
+        print(f"❌ {e}")
+        return False
+    started = datetime.now()
+    since = datetime.fromisoformat(engine.watermark) - timedelta(days=args.grace)
+
+    try:
+        changed = fetch_listing(base_url, "/api/trips/", headers,
+                                {"endTimeAfter": since.strftime("%Y-%m-%dT%H:%M:%S")})
+    except (requests.exceptions.RequestException, RuntimeError) as e:
+        # A partial listing would advance the watermark past trips never read
+        print(f"❌ Trip listing failed ({e}); watermark not advanced")
+        return False
+    print(f"🔄 {len(changed)} trips end after {since:%Y-%m-%d %H:%M} (watermark - {args.grace} days)")
+
+    # Deleted / hidden trips drop out of the listing but are still applied
+    listed = {str(trip["id"]) for trip in changed}
+    vanished = [{"id": trip_id} for trip_id, fact in engine.trips.items()
+                if str(trip_id) not in listed and (parse_time(fact.start) or datetime.min) >= since]
+    if vanished:
+        print(f"🔎 {len(vanished)} applied trips are no longer listed; re-checking them")
+
+    def fetch_roster(trip):
+        try:
+            response = call_with_retry("GET", f"{base_url}/api/trips/{trip['id']}/", headers=headers)
+        except requests.exceptions.RequestException:
+            response = None
+        return trip, response
+
+    updated = retracted = failed = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for trip, response in pool.map(fetch_roster, changed + vanished):
+            if response is None:
+                failed += 1
+                continue
+            if response.status_code == 404:
+                engine.put_trip(trip["id"], None)
+                retracted += 1
+                continue
+            if response.status_code != 200:
+                failed += 1
+                continue
+            detail = response.json()
+            engine.note_level(detail.get("level"))
+            if detail.get("approvalStatus", "A") != "A":
+                engine.put_trip(trip["id"], None)
+                retracted += 1
+                continue
+            roster = {member_id(r.get("member")): bool(r.get("checkedIn")) for r in detail.get("registered") or []}
+            engine.put_trip(trip["id"], TripFact.from_trip(detail, roster))
+            updated += 1
+
+    if failed:
+        # Keep the old watermark so the next update rereads the trips we missed
+        print(f"⚠️  {failed} trips could not be read; watermark not advanced")
+    else:
+        engine.watermark = started.isoformat()
+    engine.save(args.state)
+    print(f"✅ {updated} trips re-applied, {retracted} retracted (watermark {engine.watermark})")
+    client.print_metrics()
+    return not failed
+
+
+def command_snapshot(args):
+    engine = StatsEngine.load(args.state)
+    started = time.monotonic()
+    members = engine.snapshot()
+    snapshot = {"generated_at": datetime.now().isoformat(), "watermark": engine.watermark, "members": members}
+    tmp_path = args.output + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+    os.replace(tmp_path, args.output)
+    print(f"✅ Snapshot of {len(members)} members in {(time.monotonic() - started) * 1000:.0f}ms -> {args.output}")
+    return True
+
+
+def command_show(args):
+    engine = StatsEngine.load(args.state)
+    if args.member_id not in engine.counters:
+        print(f"❌ No trips for member {args.member_id}")
+        return False
+    print(json.dumps(engine.member_stats(args.member_id), indent=2))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute member trip statistics")
+    parser.add_argument("--state", default=STATE_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Build the counters from harvested trip history")
+    ingest.add_argument("--harvest-db", default=HARVEST_DB_PATH)
+
+    update = commands.add_parser("update", help="Re-apply trips changed since the watermark")
+    update.add_argument("--base-url", default=MAIN_API)
+    update.add_argument("--grace", type=float, default=DEFAULT_GRACE_DAYS,
+                        help="Also reread trips that ended this many days before the watermark")
+    update.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+
+    snapshot = commands.add_parser("snapshot", help="Write the per-member snapshot JSON")
+    snapshot.add_argument("--output", default=SNAPSHOT_PATH)
+
+    show = commands.add_parser("show", help="Print one member's stats")
+    show.add_argument("member_id", type=int)
+
+    args = parser.parse_args()
+    command = {"ingest": command_ingest, "update": command_update,
+               "snapshot": command_snapshot, "show": command_show}[args.command]
+    sys.exit(0 if command(args) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+Offline Trip Request Analytics
+Pulls every trip request once and answers any /api/triprequests/aggregate
+question locally - every grouping (area, date, level, time of day) and every
+firstSort / secondSort / thirdSort combination - without a server round-trip
+per slice.
+
+The requests are loaded into a columnar table: each dimension is dictionary
+encoded into an int32 code column (NumPy arrays when NumPy is installed,
+array('i') otherwise). All vote counts come from one vectorized pass:
+
+    cube = bincount(ravel_multi_index(area, date, level, timeOfDay))
+
+gives the count of every (area, date, level, timeOfDay) cell, and each of
+the 16 groupings is a sum of that cube over the dimensions that are not
+grouped. Filters (--where, --from/--to) are boolean masks over the code
+columns. Without NumPy the same cube is built as a Counter of code tuples.
+
+Data source: /api/triprequests/export when it has one row per request,
+otherwise the paginated /api/triprequests/ list (pages fetched in parallel).
+The table is cached in .triprequests_cache.json; --refresh pulls it again.
+
+--verify N compares N random grouping / sort combinations with the server's
+/api/triprequests/aggregate, so the local numbers can be trusted.
+
+Usage:
+    python3 triprequest_analytics.py --group area,level --sort -voteCount,level
+    python3 triprequest_analytics.py --group date --where area=DXB --from 2025-11-01 --to 2025-12-31
+    python3 triprequest_analytics.py --all --output triprequest_aggregates.json
+    python3 triprequest_analytics.py --verify 10
+    python3 triprequest_analytics.py --interactive
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import math
+import os
+import random
+import shlex
+import sys
+import time
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; array('i') columns are used instead
+    np = None
+
+from probe_client import MAIN_API, AuthenticationError, authenticate, call_with_retry, client, stream_pages
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".triprequests_cache.json")
+PAGE_SIZE = 100
+DEFAULT_CONCURRENCY = 8
+
+# Column name in the table -> include flag of /api/triprequests/aggregate
+DIMENSIONS = OrderedDict([
+    ("area", "includeArea"),
+    ("date", "includeDate"),
+    ("level", "includeLevel"),
+    ("timeOfDay", "includeTimeOfDay"),
+])
+SORT_FIELDS = ("date", "level", "voteCount")
+
+# Display names the aggregate endpoint returns (see MAIN-API-DOCUMENTATION.yaml)
+AREA_NAMES = {"DXB": "Dubai", "NOR": "Northern Emirates", "AUH": "Abu Dhabi", "AAN": "Al Ain", "LIW": "Liwa"}
+TIME_OF_DAY_NAMES = {"MOR": "Morning", "MID": "Mid-day", "AFT": "Afternoon", "EVE": "Evening", "ANY": "Any"}
+
+
+# ============================================================================
+# COLUMNAR TABLE
+# ============================================================================
+
+class RequestTable:
+    """Dictionary-encoded columns: values[dim][code] is the value, codes[dim][row] the code"""
+
+    def __init__(self, values, codes, level_order=None):
+        self.values = values
+        self.codes = codes
+        self.level_order = level_order or {}  # level name -> numericLevel, for level sorts
+        self._cube = None
+
+    @classmethod
+    def from_rows(cls, rows, level_order=None):
+        values = {dim: [] for dim in DIMENSIONS}
+        lookup = {dim: {} for dim in DIMENSIONS}
+        columns = {dim: array("i") for dim in DIMENSIONS}
+        for row in rows:
+            for dim in DIMENSIONS:
+                value = row.get(dim)
+                code = lookup[dim].get(value)
+                if code is None:
+                    code = lookup[dim][value] = len(values[dim])
+                    values[dim].append(value)
+                columns[dim].append(code)
+        return cls(values, {dim: cls._column(column) for dim, column in columns.items()}, level_order)
+
+    @staticmethod
+    def _column(codes):
+        return np.frombuffer(codes, dtype=np.int32).copy() if np is not None else codes
+
+    def __len__(self):
+        return len(self.codes["area"])
+
+    @property
+    def shape(self):
+        return tuple(max(1, len(self.values[dim])) for dim in DIMENSIONS)
+
+    def filter(self, where=None, date_from=None, date_to=None):
+        """New table with only the rows matching every condition (values keep their codes)"""
+        allowed = {}
+        for dim, wanted in (where or {}).items():
+            allowed[dim] = {code for code, value in enumerate(self.values[dim]) if matches(dim, value, wanted)}
+        if date_from or date_to:
+            in_range = {code for code, value in enumerate(self.values["date"])
+                        if value and (not date_from or value >= date_from) and (not date_to or value <= date_to)}
+            allowed["date"] = allowed["date"] & in_range if "date" in allowed else in_range
+        if not allowed:
+            return self
+
+        if np is not None:
+            mask = np.ones(len(self), dtype=bool)
+            for dim, codes in allowed.items():
+                mask &= np.isin(self.codes[dim], np.fromiter(codes, dtype=np.int32, count=len(codes)))
+            return RequestTable(self.values, {dim: column[mask] for dim, column in self.codes.items()},
+                                self.level_order)
+
+        keep = [row for row in range(len(self))
+                if all(self.codes[dim][row] in codes for dim, codes in allowed.items())]
+        return RequestTable(self.values, {dim: array("i", (column[row] for row in keep))
+                                          for dim, column in self.codes.items()}, self.level_order)
+
+    def cube(self):
+        """Vote count of every (area, date, level, timeOfDay) cell"""
+        if self._cube is None:
+            if np is not None:
+                flat = np.ravel_multi_index([self.codes[dim] for dim in DIMENSIONS], self.shape)
+                self._cube = np.bincount(flat, minlength=math.prod(self.shape)).reshape(self.shape)
+            else:
+                self._cube = Counter(zip(*(self.codes[dim] for dim in DIMENSIONS)))
+        return self._cube
+
+    def group(self, dims):
+        """[(value tuple in DIMENSIONS order with None for ungrouped dims, count)]"""
+        positions = [index for index, dim in enumerate(DIMENSIONS) if dim in dims]
+        cube = self.cube()
+        if np is not None:
+            other = tuple(index for index in range(len(DIMENSIONS)) if index not in positions)
+            counts = cube.sum(axis=other) if other else cube
+            if not positions:
+                return [((None,) * len(DIMENSIONS), int(counts))] if len(self) else []
+            cells = np.nonzero(counts)
+            keyed = zip(zip(*(axis.tolist() for axis in cells)), counts[cells].tolist())
+        else:
+            counts = Counter()
+            for cell, count in cube.items():
+                counts[tuple(cell[index] for index in positions)] += count
+            keyed = counts.items()
+
+        names = list(DIMENSIONS)
+        groups = []
+        for key, count in keyed:
+            values = [None] * len(DIMENSIONS)
+            for index, code in zip(positions, key):
+                values[index] = self.values[names[index]][code]
+            groups.append((tuple(values), count))
+        return groups
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+
+    def save(self, path):
+        data = {"version": 1, "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "values": self.values,
+                "level_order": self.level_order,
+                "codes": {dim: list(map(int, column)) for dim, column in self.codes.items()}}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        codes = {dim: cls._column(array("i", data["codes"][dim])) for dim in DIMENSIONS}
+        return cls(data["values"], codes, data.get("level_order")), data.get("saved_at")
+
+
+def matches(dim, value, wanted):
+    """--where comparison: codes and display names both work (area=DXB or area=Dubai)"""
+    names = {value, display(dim, value)}
+    return any(str(name).lower() in wanted for name in names if name is not None)
+
+
+def display(dim, value):
+    if dim == "area":
+        return AREA_NAMES.get(value, value)
+    if dim == "timeOfDay":
+        return TIME_OF_DAY_NAMES.get(value, value)
+    return value
+
+
+# ============================================================================
+# LOADING
+# ============================================================================
+
+def normalize_row(item):
+    level = item.get("level")
+    if isinstance(level, dict):
+        level = level.get("name") or level.get("displayName")
+    time_of_day = item.get("timeOfDay", item.get("time_of_day"))
+    if isinstance(time_of_day, dict):
+        time_of_day = time_of_day.get("value") or time_of_day.get("name")
+    date = item.get("date")
+    return {"area": item.get("area"), "date": str(date)[:10] if date else None,
+            "level": level, "timeOfDay": time_of_day}
+
+
+def parse_export(text):
+    """Rows of a row-per-request export CSV, or None if the layout is not recognised"""
+    reader = csv.DictReader(io.StringIO(text))
+    header = {name.strip().lower().replace(" ", "").replace("_", ""): name for name in reader.fieldnames or []}
+    columns = {"area": header.get("area"), "date": header.get("date"), "level": header.get("level"),
+               "timeOfDay": header.get("timeofday")}
+    if not all(columns.values()):
+        return None
+    votes = header.get("votecount") or header.get("votes") or header.get("count")
+    rows = []
+    for record in reader:
+        row = normalize_row({dim: (record.get(name) or "").strip() or None for dim, name in columns.items()})
+        repeat = int(record.get(votes) or 1) if votes else 1
+        rows.extend([row] * repeat)
+    return rows
+
+
+def fetch_rows(base_url, headers, concurrency):
+    response = call_with_retry("GET", f"{base_url}/api/triprequests/export", headers=headers)
+    if response.status_code == 200:
+        rows = parse_export(response.content.decode("utf-8-sig", "replace"))
+        if rows is not None:
+            print(f"📥 Export: {len(rows)} requests")
+            return rows
+        print("ℹ️  Export is a matrix, not one row per request - reading /api/triprequests/ instead")
+    else:
+        print(f"ℹ️  Export returned {response.status_code} - reading /api/triprequests/ instead")
+
+    url = f"{base_url}/api/triprequests/"
+
+    def fetch_page(page):
+        response = call_with_retry("GET", url, headers=headers, params={"page": page, "pageSize": PAGE_SIZE})
+        if response.status_code != 200:
+            raise RuntimeError(f"triprequests page {page}: {response.status_code}")
+        return response.json()
+
+    def page_count(data):
+        return math.ceil((data.get("count") or 0) / PAGE_SIZE)
+
+    rows = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for data in stream_pages(fetch_page, page_count, pool):
+            rows.extend(normalize_row(item) for item in data.get("results", []))
+    print(f"📥 List: {len(rows)} requests")
+    return rows
+
+
+def fetch_level_order(base_url, headers):
+    """Level name -> numericLevel, so level sorts follow the club's level order like the server's"""
+    response = call_with_retry("GET", f"{base_url}/api/levels/", headers=headers, params={"pageSize": 100})
+    if response.status_code != 200:
+        return {}
+    data = response.json()
+    levels = data.get("results", []) if isinstance(data, dict) else data
+    return {level.get("name"): level.get("numericLevel") for level in levels}
+
+
+# ============================================================================
+# AGGREGATION
+# ============================================================================
+
+def aggregate(table, dims, sorts=()):
+    """Same rows as /api/triprequests/aggregate: display names plus voteCount, sorted"""
+    rows = []
+    for values, count in table.group(dims):
+        row = OrderedDict()
+        for dim, value in zip(DIMENSIONS, values):
+            if dim in dims:
+                row[dim] = display(dim, value)
+        row["voteCount"] = count
+        rows.append(row)
+
+    # Stable sorts applied last key first give the firstSort > secondSort > thirdSort order
+    for sort in reversed([s for s in sorts if s]):
+        field = sort.lstrip("-")
+        if field not in row_fields(dims):
+            continue
+        rows.sort(key=lambda row: sort_key(row.get(field), field, table.level_order), reverse=sort.startswith("-"))
+    return rows
+
+
+def row_fields(dims):
+    return set(dims) | {"voteCount"}
+
+
+def sort_key(value, field, level_order):
+    if value is None:
+        return (1, 0, "")
+    if field == "level" and level_order:
+        return (0, level_order.get(value, math.inf), value)
+    return (0, value if field == "voteCount" else 0, value if field != "voteCount" else "")
+
+
+def all_combinations():
+    """Every grouping (16) with no sort - sorting only reorders rows"""
+    dims = list(DIMENSIONS)
+    return [combo for size in range(len(dims) + 1) for combo in itertools.combinations(dims, size)]
+
+
+def random_sorts(rng):
+    fields = rng.sample(SORT_FIELDS, rng.randint(0, len(SORT_FIELDS)))
+    return [("-" if rng.random() < 0.5 else "") + field for field in fields]
+
+
+def verify(table, base_url, headers, samples, seed=None):
+    """Compare local aggregates with the server's for random grouping / sort combinations"""
+    rng = random.Random(seed)
+    combos = all_combinations()
+    failures = 0
+    for _ in range(samples):
+        dims = rng.choice(combos)
+        sorts = random_sorts(rng)
+        params = {flag: "true" for dim, flag in DIMENSIONS.items() if dim in dims}
+        for name, sort in zip(("firstSort", "secondSort", "thirdSort"), sorts):
+            params[name] = sort
+        response = call_with_retry("GET", f"{base_url}/api/triprequests/aggregate", headers=headers, params=params)
+        label = f"group={','.join(dims) or '-'} sort={','.join(sorts) or '-'}"
+        if response.status_code != 200:
+            print(f"   ⚠️  {label}: server {response.status_code}")
+            failures += 1
+            continue
+        server = response.json()
+        local = aggregate(table, dims, sorts)
+
+        def canonical(rows):
+            return sorted(tuple(str(row.get(field)) for field in list(dims) + ["voteCount"]) for row in rows)
+
+        same_rows = canonical(server) == canonical(local)
+        # Ties may come back in any order, so only the sequence of sort key values must agree
+        keys = [sort.lstrip("-") for sort in sorts if sort.lstrip("-") in row_fields(dims)]
+        same_order = [[str(row.get(k)) for k in keys] for row in server] == \
+                     [[str(row.get(k)) for k in keys] for row in local]
+        if same_rows and same_order:
+            print(f"   ✅ {label}: {len(local)} rows match")
+        else:
+            failures += 1
+            problem = "rows differ" if not same_rows else "order differs"
+            print(f"   ❌ {label}: {problem} (server {len(server)} rows, local {len(local)})")
+    return failures
+
+
+def print_rows(rows, dims, limit):
+    columns = [dim for dim in DIMENSIONS if dim in dims] + ["voteCount"]
+    widths = {column: max([len(column)] + [len(str(row.get(column))) for row in rows[:limit]]) for column in columns}
+    print("  ".join(f"{column:<{widths[column]}}" for column in columns))
+    print("  ".join("-" * widths[column] for column in columns))
+    for row in rows[:limit]:
+        print("  ".join(f"{str(row.get(column)):<{widths[column]}}" for column in columns))
+    if len(rows) > limit:
+        print(f"... {len(rows) - limit} more rows")
+    print(f"({len(rows)} groups, {sum(row['voteCount'] for row in rows)} votes)")
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def build_query_parser():
+    parser = argparse.ArgumentParser(add_help=False, prog="query")
+    parser.add_argument("--group", default="", help="Comma-separated: area,date,level,timeOfDay")
+    parser.add_argument("--sort", default="", help="Up to three of [-]date,[-]level,[-]voteCount")
+    parser.add_argument("--where", action="append", metavar="DIM=VALUE[,VALUE]",
+                        help="Filter, e.g. area=DXB or level=Advanced,Explorer (repeatable)")
+    parser.add_argument("--from", dest="date_from", help="First date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="Last date (YYYY-MM-DD)")
+    parser.add_argument("--limit", type=int, default=50, help="Rows to print")
+    return parser
+
+
+def parse_query(args):
+    dims = tuple(dim for dim in DIMENSIONS if dim in {d.strip() for d in args.group.split(",") if d.strip()})
+    unknown = {d.strip() for d in args.group.split(",") if d.strip()} - set(DIMENSIONS)
+    sorts = [s.strip() for s in args.sort.split(",") if s.strip()][:3]
+    bad_sorts = [s for s in sorts if s.lstrip("-") not in SORT_FIELDS]
+    if unknown or bad_sorts:
+        raise ValueError(f"unknown group / sort field: {', '.join(sorted(unknown) + bad_sorts)}")
+    where = {}
+    for condition in args.where or []:
+        dim, _, value = condition.partition("=")
+        if dim not in DIMENSIONS or not value:
+            raise ValueError(f"bad --where {condition!r}")
+        where[dim] = {v.strip().lower() for v in value.split(",")}
+    return dims, sorts, where
+
+
+def run_query(table, args):
+    dims, sorts, where = parse_query(args)
+    started = time.perf_counter()
+    rows = aggregate(table.filter(where, args.date_from, args.date_to), dims, sorts)
+    print_rows(rows, dims, args.limit)
+    print(f"⚡ {(time.perf_counter() - started) * 1000:.1f}ms")
+
+
+def interactive(table):
+    parser = build_query_parser()
+    print("Enter queries like: --group area,level --sort -voteCount --where area=DXB  (empty line quits)")
+    while True:
+        try:
+            line = input("triprequests> ").strip()
+        except EOFError:
+            break
+        if not line or line in ("quit", "exit"):
+            break
+        try:
+            run_query(table, parser.parse_args(shlex.split(line)))
+        except (ValueError, SystemExit) as e:
+            print(f"❌ {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline trip request analytics",
+                                     parents=[build_query_parser()])
+    parser.add_argument("--base-url", default=MAIN_API)
+    parser.add_argument("--refresh", action="store_true", help="Pull the data again instead of using the cache")
+    parser.add_argument("--cache", default=CACHE_PATH)
+    parser.add_argument("--all", action="store_true", help="Compute every grouping and write them to --output")
+    parser.add_argument("--output", default="triprequest_aggregates.json")
+    parser.add_argument("--verify", type=int, default=0, metavar="N", help="Check N random combinations against the server")
+    parser.add_argument("--seed", type=int, help="Random seed for --verify")
+    parser.add_argument("--interactive", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    print("=" * 80)
+    print("TRIP REQUEST ANALYTICS")
+    print("=" * 80)
+    print(f"Engine: {'NumPy ' + np.__version__ if np is not None else 'array (NumPy not installed)'}")
+
+    headers = None
+    if args.refresh or not os.path.exists(args.cache) or args.verify:
+        try:
+            headers, _user_id = authenticate(base_url)
+        except AuthenticationError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+    if args.refresh or not os.path.exists(args.cache):
+        table = RequestTable.from_rows(fetch_rows(base_url, headers, args.concurrency),
+                                       fetch_level_order(base_url, headers))
+        table.save(args.cache)
+        print(f"💾 Cached in {args.cache}")
+    else:
+        table, saved_at = RequestTable.load(args.cache)
+        print(f"💾 {len(table)} requests from cache ({saved_at}); --refresh to pull again")
+
+    try:
+        if args.all:
+            started = time.perf_counter()
+            results = OrderedDict(
+                (",".join(dims) or "total", aggregate(table, dims, ["-voteCount"]))
+                for dims in all_combinations())
+            elapsed = (time.perf_counter() - started) * 1000
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"✅ {len(results)} groupings in {elapsed:.1f}ms -> {args.output}")
+        if args.verify:
+            print(f"\n🔍 Verifying {args.verify} random combinations against /api/triprequests/aggregate")
+            failures = verify(table, base_url, headers, args.verify, args.seed)
+            print(f"{'✅' if not failures else '❌'} {args.verify - failures}/{args.verify} match")
+        if args.interactive:
+            interactive(table)
+        elif not args.all and not args.verify:
+            run_query(table, args)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    client.print_metrics()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,682 @@
+#!/usr/bin/env python3
+"""
+Webhook End-to-End Latency Benchmark
+Measures how long a trip change on the Main API (Django) takes to show up in
+the Gallery API, instead of sleeping 35 seconds and answering yes / no.
+
+For each of N trips the benchmark runs the lifecycle
+
+    published  create (and optionally approve) a trip -> gallery appears
+    updated    PATCH the trip title                   -> gallery renamed
+    deleted    DELETE the trip                        -> gallery soft-deleted
+    restored   POST --restore-path (if given)         -> gallery restored
+
+and timestamps the moment each change becomes observable:
+
+- poll (default): one shared watcher polls the Gallery API adaptively -
+  every --min-interval while changes keep arriving, backing off by 1.5x up
+  to --max-interval while nothing changes. New galleries are found with one
+  listing call per round for all pending trips; renames / deletes / restores
+  with GET /api/galleries/{id}. Each latency is the midpoint between the last
+  poll that did not see the change and the first one that did; the width of
+  that window is reported as the resolution.
+- capture: a small local HTTP endpoint (--capture-port) receives the webhook
+  calls themselves (point the staging Django GALLERY webhook URL at it), so
+  the delivery time is exact. --forward relays every call to the real Gallery
+  API so the galleries keep working.
+- both: delivery time from the capture endpoint, visibility time from polling
+  (the difference is the Gallery API's own processing time).
+
+The report gives per-event latency distributions, timeouts and stragglers,
+and the trend of latency over the run: a steadily growing latency means the
+Django async webhook queue is falling behind.
+
+Trips are tagged like trip_fixtures.py fixtures (batch webhook-<time>), so
+leftovers from an interrupted run can be removed with
+    python3 trip_fixtures.py cleanup --base-url ... --batch webhook-<time>
+
+Usage:
+    python3 webhook_latency.py --base-url https://staging.example --gallery-url https://media-staging.example --trips 20
+    python3 webhook_latency.py --base-url ... --gallery-url ... --observe both --capture-port 8899 --forward https://media-staging.example
+    python3 webhook_latency.py ... --restore-path "/api/trips/{id}/restore"
+
+Production is refused unless --allow-production is given.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from probe_client import GALLERY_API, MAIN_API, AuthenticationError, ProbeClient, authenticate, client, fetch_all
+from results_history import percentile
+from trip_fixtures import PRODUCTION_HOSTS, REQUEST_TIMEOUT, approve_one, build_trip, delete_one, extract_id
+
+EVENTS = ("published", "updated", "deleted", "restored")
+# Deprecated Gallery webhook names that report the same change
+EVENT_ALIASES = {"renamed": "updated", "rescheduled": "updated"}
+
+DEFAULT_TRIPS = 10
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 120.0
+DEFAULT_MIN_INTERVAL = 0.25
+DEFAULT_MAX_INTERVAL = 5.0
+BACKOFF_FACTOR = 1.5
+LISTING_PAGES = 2
+RESULTS_FILE = "webhook_latency_results.json"
+
+
+def trip_key(value):
+    """Normalize a trip id ("6307.0", 6307, "6307") for matching"""
+    try:
+        return str(int(float(value)))
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class Expectation:
+    """One change we are waiting to observe in the Gallery API"""
+
+    def __init__(self, event, trip_id, issued_at, check=None, gallery_id=None):
+        self.event = event
+        self.trip_id = trip_key(trip_id)
+        self.issued_at = issued_at
+        self.check = check  # gallery dict (None on 404) -> bool
+        self.gallery_id = gallery_id
+        self.gallery = None
+        self.last_negative = issued_at
+        self.visible_at = None
+        self.resolution = None
+        self.delivered_at = None
+        self.done = threading.Event()
+
+    def observe(self, gallery, sent_at, received_at):
+        if self.done.is_set():
+            return False
+        if not self.check(gallery):
+            self.last_negative = max(self.last_negative, sent_at)
+            return False
+        # The change happened after the last negative read and before this response arrived
+        self.gallery = gallery
+        self.visible_at = (self.last_negative + received_at) / 2
+        self.resolution = received_at - self.last_negative
+        self.done.set()
+        return True
+
+
+# ============================================================================
+# OBSERVERS
+# ============================================================================
+
+class GalleryWatcher:
+    """Shared adaptive poller that resolves every pending expectation"""
+
+    def __init__(self, gallery_url, headers, min_interval, max_interval, poll=True):
+        self.gallery_url = gallery_url
+        self.headers = headers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.poll = poll
+        # Polls must never be answered from a memo or joined to an earlier in-flight GET
+        self.client = ProbeClient(coalesce=False, memo_ttl=0)
+        self.polls = 0
+        self._lock = threading.Lock()
+        self._pending = {}  # (event, trip id) -> Expectation
+        self._early = {}  # (event, trip id) -> delivery time seen before the expectation existed
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._pool = ThreadPoolExecutor(max_workers=8)
+
+    def start(self):
+        if self.poll:
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._pool.shutdown()
+
+    def expect(self, expectation):
+        key = (expectation.event, expectation.trip_id)
+        with self._lock:
+            delivered_at = self._early.pop(key, None)
+            if delivered_at is not None:
+                expectation.delivered_at = delivered_at
+            self._pending[key] = expectation
+        if not self.poll and delivered_at is not None:
+            expectation.done.set()
+        self._wake.set()
+        return expectation
+
+    def forget(self, expectation):
+        with self._lock:
+            self._pending.pop((expectation.event, expectation.trip_id), None)
+
+    def delivered(self, event, trip_id, at):
+        """A webhook call arrived at the capture endpoint"""
+        key = (event, trip_key(trip_id))
+        with self._lock:
+            expectation = self._pending.get(key)
+            if expectation is None:
+                self._early.setdefault(key, at)
+                return
+            if expectation.delivered_at is None:
+                expectation.delivered_at = at
+        if not self.poll:
+            expectation.done.set()
+
+    # ------------------------------------------------------------------
+    # Polling
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        interval = self.min_interval
+        while not self._stop.is_set():
+            with self._lock:
+                pending = [e for e in self._pending.values() if not e.done.is_set()]
+            if not pending:
+                self._wake.wait(1.0)
+                self._wake.clear()
+                interval = self.min_interval
+                continue
+
+            changed = self._poll_once(pending)
+            # Stay fast while changes arrive or new work was queued, back off while idle
+            if changed or self._wake.is_set():
+                interval = self.min_interval
+            else:
+                interval = min(self.max_interval, interval * BACKOFF_FACTOR)
+            self._wake.clear()
+            self._wake.wait(interval)
+
+    def _poll_once(self, pending):
+        self.polls += 1
+        changed = 0
+        waiting_for_gallery = [e for e in pending if e.gallery_id is None]
+        if waiting_for_gallery:
+            changed += self._poll_listing(waiting_for_gallery)
+        by_gallery = {}
+        for expectation in pending:
+            if expectation.gallery_id is not None:
+                by_gallery.setdefault(expectation.gallery_id, []).append(expectation)
+        for result in self._pool.map(self._poll_gallery, by_gallery.items()):
+            changed += result
+        return changed
+
+    def _poll_listing(self, expectations):
+        """Newest galleries, matched on source_trip_id (one call for every pending trip)"""
+        wanted = {e.trip_id: e for e in expectations}
+        changed = 0
+        for page in range(1, LISTING_PAGES + 1):
+            sent_at = time.monotonic()
+            try:
+                response = self.client.get(f"{self.gallery_url}/api/galleries", headers=self.headers,
+                                           params={"sort_by": "newest", "limit": 100, "page": page})
+            except requests.exceptions.RequestException:
+                return changed
+            received_at = time.monotonic()
+            if response.status_code != 200:
+                return changed
+            data = response.json()
+            by_trip = {trip_key(g.get("source_trip_id")): g for g in data.get("galleries", [])
+                       if g.get("source_trip_id") is not None}
+            for trip_id in list(wanted):
+                gallery = by_trip.get(trip_id)
+                if gallery is not None and wanted[trip_id].observe(gallery, sent_at, received_at):
+                    wanted.pop(trip_id)
+                    changed += 1
+            if not wanted or not data.get("pagination", {}).get("has_more"):
+                break
+        for expectation in wanted.values():
+            expectation.last_negative = max(expectation.last_negative, sent_at)
+        return changed
+
+    def _poll_gallery(self, item):
+        gallery_id, expectations = item
+        sent_at = time.monotonic()
+        try:
+            response = self.client.get(f"{self.gallery_url}/api/galleries/{gallery_id}", headers=self.headers)
+        except requests.exceptions.RequestException:
+            return 0
+        received_at = time.monotonic()
+        if response.status_code == 404:
+            gallery = None
+        elif response.status_code == 200:
+            data = response.json()
+            gallery = data.get("gallery", data)
+        else:
+            return 0
+        return sum(1 for e in expectations if e.observe(gallery, sent_at, received_at))
+
+
+class WebhookCapture:
+    """Local endpoint that timestamps incoming /webhooks/trip/<event> calls"""
+
+    def __init__(self, port, watcher, forward=None):
+        self.watcher = watcher
+        self.forward = forward.rstrip("/") if forward else None
+        self.calls = 0
+        capture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                at = time.monotonic()
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                capture.received(self.path, body, at)
+                status, payload, content_type = capture.relay(self.path, body, self.headers)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+
+    def received(self, path, body, at):
+        self.calls += 1
+        event = urllib.parse.urlsplit(path).path.rstrip("/").rsplit("/", 1)[-1]
+        event = EVENT_ALIASES.get(event, event)
+        try:
+            trip_id = json.loads(body or b"{}").get("trip_id")
+        except (ValueError, AttributeError):
+            trip_id = None
+        if event in EVENTS and trip_id is not None:
+            self.watcher.delivered(event, trip_id, at)
+
+    def relay(self, path, body, headers):
+        if not self.forward:
+            return 200, b'{"success": true}', "application/json"
+        forwarded = {name: value for name, value in headers.items()
+                     if name.lower() in ("content-type", "authorization", "x-webhook-secret", "x-api-key")}
+        try:
+            response = client.post(f"{self.forward}{path}", data=body, headers=forwarded)
+        except requests.exceptions.RequestException as e:
+            return 502, json.dumps({"success": False, "error": str(e)}).encode("utf-8"), "application/json"
+        return (response.status_code, response.content,
+                response.headers.get("Content-Type", "application/json"))
+
+
+# ============================================================================
+# LIFECYCLE
+# ============================================================================
+
+def gallery_exists(gallery):
+    return gallery is not None and not gallery.get("soft_deleted_at")
+
+
+def gallery_named(title):
+    return lambda gallery: gallery is not None and gallery.get("name") == title
+
+
+def gallery_deleted(gallery):
+    return gallery is None or bool(gallery.get("soft_deleted_at"))
+
+
+class LatencyBenchmark:
+    def __init__(self, args, headers, user_id, levels, meeting_points, watcher):
+        self.args = args
+        self.base_url = args.base_url
+        self.headers = headers
+        self.user_id = user_id
+        self.levels = levels
+        self.meeting_points = meeting_points
+        self.watcher = watcher
+        self.batch = f"webhook-{datetime.now().strftime('%H%M%S')}"
+        self.started = time.monotonic()
+        self.records = []
+        self._lock = threading.Lock()
+
+    def _record(self, key, trip_id, event, issued_at, op_ms, expectation=None, error=None):
+        record = OrderedDict([
+            ("trip", key),
+            ("trip_id", trip_id),
+            ("event", event),
+            ("issued_at_s", round(issued_at - self.started, 3)),
+            ("operation_ms", round(op_ms, 1)),
+            ("status", "failed" if error else "timeout"),
+            ("latency_s", None),
+            ("resolution_s", None),
+            ("delivery_s", None),
+        ])
+        if error:
+            record["error"] = error
+        if expectation is not None:
+            if expectation.delivered_at is not None:
+                record["delivery_s"] = round(expectation.delivered_at - issued_at, 3)
+            if expectation.done.is_set():
+                record["status"] = "observed"
+                if expectation.visible_at is not None:
+                    record["latency_s"] = round(max(0.0, expectation.visible_at - issued_at), 3)
+                    record["resolution_s"] = round(expectation.resolution, 3)
+                else:
+                    record["latency_s"] = record["delivery_s"]
+                    record["resolution_s"] = 0.0
+        with self._lock:
+            self.records.append(record)
+        return record
+
+    def _wait(self, expectation):
+        expectation.done.wait(self.args.timeout)
+        self.watcher.forget(expectation)
+        return expectation
+
+    def _operation(self, label, method, path, ok, **kwargs):
+        """Issue a change exactly once: (response, acknowledged_at, op_ms, error).
+
+        No retries - a resend could apply the change twice (a second trip) and
+        would stretch issued_at / op_ms over the backoff. A failure is recorded
+        as such; a timed-out create may still exist and is left to
+        `trip_fixtures.py cleanup`.
+        """
+        started = time.monotonic()
+        try:
+            response = client.request(method, f"{self.base_url}{path}", headers=self.headers,
+                                      timeout=REQUEST_TIMEOUT, **kwargs)
+        except requests.exceptions.RequestException as e:
+            acknowledged = time.monotonic()
+            return None, acknowledged, (acknowledged - started) * 1000, f"{label} {type(e).__name__}: {e}"[:160]
+        acknowledged = time.monotonic()
+        error = None
+        if response.status_code not in ok:
+            error = f"{label} {response.status_code}: {response.text[:120]}"
+        return response, acknowledged, (acknowledged - started) * 1000, error
+
+    def lifecycle(self, index):
+        key = f"{self.batch}-{index:04d}"
+        events = self.args.events
+        trip = build_trip(key, index, self.batch, self.user_id, self.levels, self.meeting_points, 30)
+
+        response, issued_at, op_ms, error = self._operation("create", "POST", "/api/trips", (200, 201), json=trip)
+        trip_id = None
+        if not error:
+            try:
+                trip_id = extract_id(response.json())
+            except ValueError:
+                trip_id = None
+            if not trip_id:
+                error = "created but no id in response"
+        if error:
+            self._record(key, None, "published", issued_at, op_ms, error=error)
+            return
+        deleted = False
+        try:
+            if self.args.approve and not approve_one(self.base_url, self.headers, trip_id):
+                self._record(key, trip_id, "published", issued_at, op_ms, error="approve failed")
+                return
+
+            published = self._wait(self.watcher.expect(
+                Expectation("published", trip_id, issued_at, gallery_exists)))
+            record = self._record(key, trip_id, "published", issued_at, op_ms, published)
+            gallery_id = published.gallery.get("id") if published.gallery else None
+            if record["status"] != "observed" or (self.watcher.poll and not gallery_id):
+                return
+
+            if "updated" in events:
+                title = f"[fixture {key}] renamed {int(time.time() * 1000) % 10 ** 8}"
+                _response, issued_at, op_ms, error = self._operation(
+                    "patch", "PATCH", f"/api/trips/{trip_id}", (200,), json={"title": title})
+                if error:
+                    self._record(key, trip_id, "updated", issued_at, op_ms, error=error)
+                    return
+                updated = self._wait(self.watcher.expect(
+                    Expectation("updated", trip_id, issued_at, gallery_named(title), gallery_id)))
+                if self._record(key, trip_id, "updated", issued_at, op_ms, updated)["status"] != "observed":
+                    return
+
+            if "deleted" not in events:
+                return
+            _response, issued_at, op_ms, error = self._operation(
+                "delete", "DELETE", f"/api/trips/{trip_id}", (200, 202, 204))
+            if error:
+                self._record(key, trip_id, "deleted", issued_at, op_ms, error=error)
+                return
+            deleted = True
+            removed = self._wait(self.watcher.expect(
+                Expectation("deleted", trip_id, issued_at, gallery_deleted, gallery_id)))
+            if self._record(key, trip_id, "deleted", issued_at, op_ms, removed)["status"] != "observed":
+                return
+
+            if "restored" in events and self.args.restore_path:
+                path = self.args.restore_path.format(id=trip_id)
+                _response, issued_at, op_ms, error = self._operation("restore", "POST", path, (200, 201, 204))
+                if error:
+                    self._record(key, trip_id, "restored", issued_at, op_ms, error=error)
+                    return
+                deleted = False
+                restored = self._wait(self.watcher.expect(
+                    Expectation("restored", trip_id, issued_at, gallery_exists, gallery_id)))
+                self._record(key, trip_id, "restored", issued_at, op_ms, restored)
+        finally:
+            if not deleted and not self.args.keep:
+                self._cleanup(key, trip_id)
+
+    def _cleanup(self, key, trip_id):
+        """Delete a leftover trip; a failure is noted on its last record rather than ending the run"""
+        try:
+            error = delete_one(self.base_url, self.headers, trip_id)
+        except requests.exceptions.RequestException as e:
+            error = f"delete {type(e).__name__}: {e}"[:160]
+        if not error:
+            return
+        with self._lock:
+            for record in reversed(self.records):
+                if record["trip"] == key:
+                    record["cleanup_error"] = error
+                    break
+        print(f"   ⚠️  cleanup of {trip_id} failed: {error}")
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            futures = [pool.submit(self.lifecycle, index) for index in range(self.args.trips)]
+            for done, future in enumerate(futures, 1):
+                future.result()
+                print(f"   trip {done}/{len(futures)} done ({time.monotonic() - self.started:.1f}s)")
+        return self.records
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def trend(points):
+    """Least-squares slope of latency over issue time (seconds of latency per second of run)"""
+    if len(points) < 3:
+        return None
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+
+
+def summarize(records, straggler_s=None):
+    summary = OrderedDict()
+    for event in EVENTS:
+        rows = [r for r in records if r["event"] == event]
+        if not rows:
+            continue
+        observed = [r for r in rows if r["status"] == "observed" and r["latency_s"] is not None]
+        latencies = sorted(r["latency_s"] for r in observed)
+        deliveries = sorted(r["delivery_s"] for r in rows if r["delivery_s"] is not None)
+        median = percentile(latencies, 50)
+        # Stragglers: far slower than the typical propagation (or slower than an explicit limit)
+        limit = straggler_s if straggler_s is not None else (3 * median + 1.0 if median is not None else None)
+        stragglers = [r for r in observed if limit is not None and r["latency_s"] > limit]
+        slope = trend([(r["issued_at_s"], r["latency_s"]) for r in observed])
+        summary[event] = OrderedDict([
+            ("operations", len(rows)),
+            ("observed", len(observed)),
+            ("timeouts", sum(1 for r in rows if r["status"] == "timeout")),
+            ("failed", sum(1 for r in rows if r["status"] == "failed")),
+            ("cleanup_failed", sum(1 for r in rows if r.get("cleanup_error"))),
+            ("min_s", latencies[0] if latencies else None),
+            ("p50_s", median),
+            ("p90_s", percentile(latencies, 90)),
+            ("p95_s", percentile(latencies, 95)),
+            ("p99_s", percentile(latencies, 99)),
+            ("max_s", latencies[-1] if latencies else None),
+            ("mean_resolution_s", round(sum(r["resolution_s"] for r in observed) / len(observed), 3)
+             if observed else None),
+            ("delivery_p50_s", percentile(deliveries, 50)),
+            ("delivery_p95_s", percentile(deliveries, 95)),
+            ("trend_ms_per_s", round(slope * 1000, 1) if slope is not None else None),
+            ("straggler_limit_s", round(limit, 3) if limit is not None else None),
+            ("stragglers", [{"trip": r["trip"], "trip_id": r["trip_id"], "latency_s": r["latency_s"]}
+                            for r in sorted(stragglers, key=lambda r: -r["latency_s"])]),
+        ])
+    return summary
+
+
+def _fmt(value):
+    return f"{value:.2f}" if value is not None else "-"
+
+
+def print_summary(summary):
+    print(f"\n{'Event':<10} {'Ops':>5} {'Seen':>5} {'T/O':>4} {'p50':>7} {'p90':>7} {'p95':>7} {'p99':>7} "
+          f"{'max':>7} {'±res':>6} {'deliv p50':>10} {'trend':>10}")
+    print("-" * 96)
+    for event, row in summary.items():
+        trend_label = f"{row['trend_ms_per_s']:+.0f}ms/s" if row["trend_ms_per_s"] is not None else "-"
+        print(f"{event:<10} {row['operations']:>5} {row['observed']:>5} {row['timeouts']:>4} "
+              f"{_fmt(row['p50_s']):>7} {_fmt(row['p90_s']):>7} {_fmt(row['p95_s']):>7} {_fmt(row['p99_s']):>7} "
+              f"{_fmt(row['max_s']):>7} {_fmt(row['mean_resolution_s']):>6} {_fmt(row['delivery_p50_s']):>10} "
+              f"{trend_label:>10}")
+    print("-" * 96)
+    print("Latencies in seconds from the Main API acknowledging the change.")
+
+    for event, row in summary.items():
+        if row["timeouts"]:
+            print(f"⏱️  {event}: {row['timeouts']} change(s) never showed up")
+        if row["cleanup_failed"]:
+            print(f"🧹 {event}: {row['cleanup_failed']} trip(s) could not be deleted afterwards - "
+                  f"see `trip_fixtures.py cleanup`")
+        if row["stragglers"]:
+            listed = ", ".join(f"{s['trip_id']} ({s['latency_s']:.1f}s)" for s in row["stragglers"][:5])
+            print(f"🐢 {event}: {len(row['stragglers'])} straggler(s) over {row['straggler_limit_s']}s: {listed}")
+        # Growing latency across a run means work is queued faster than it is drained
+        if row["trend_ms_per_s"] is not None and row["trend_ms_per_s"] > 50 and row["observed"] >= 5:
+            print(f"⚠️  {event}: latency grows {row['trend_ms_per_s']:.0f}ms per second of run - "
+                  f"the webhook queue is falling behind")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure trip -> gallery webhook propagation latency")
+    parser.add_argument("--base-url", default=MAIN_API, help="Main API base URL")
+    parser.add_argument("--gallery-url", default=GALLERY_API, help="Gallery API base URL")
+    parser.add_argument("--trips", type=int, default=DEFAULT_TRIPS, help="Trip lifecycles to run (N)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Lifecycles in flight")
+    parser.add_argument("--events", default="published,updated,deleted,restored",
+                        help="Lifecycle steps to measure (published is always run)")
+    parser.add_argument("--approve", action="store_true", help="Approve each trip after creating it")
+    parser.add_argument("--restore-path", help="Main API path that restores a deleted trip, e.g. /api/trips/{id}/restore")
+    parser.add_argument("--observe", choices=("poll", "capture", "both"), default="poll")
+    parser.add_argument("--capture-port", type=int, default=8899, help="Port of the local webhook endpoint")
+    parser.add_argument("--forward", help="Relay captured webhook calls to this Gallery API base URL")
+    parser.add_argument("--min-interval", type=float, default=DEFAULT_MIN_INTERVAL, help="Fastest poll interval (s)")
+    parser.add_argument("--max-interval", type=float, default=DEFAULT_MAX_INTERVAL, help="Slowest poll interval (s)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Give up on a change after (s)")
+    parser.add_argument("--straggler", type=float, help="Straggler threshold in seconds (default: 3x median + 1s)")
+    parser.add_argument("--keep", action="store_true", help="Do not delete trips that were not deleted by the run")
+    parser.add_argument("--output", default=RESULTS_FILE)
+    parser.add_argument("--allow-production", action="store_true")
+    args = parser.parse_args()
+
+    args.base_url = args.base_url.rstrip("/")
+    args.gallery_url = args.gallery_url.rstrip("/")
+    args.events = {event.strip() for event in args.events.split(",") if event.strip()} | {"published"}
+    unknown = args.events - set(EVENTS)
+    if unknown:
+        print(f"❌ Unknown event(s): {', '.join(sorted(unknown))} (expected {', '.join(EVENTS)})")
+        sys.exit(1)
+    if urllib.parse.urlsplit(args.base_url).hostname in PRODUCTION_HOSTS and not args.allow_production:
+        print(f"❌ {args.base_url} is production; pass --allow-production if you really mean it")
+        sys.exit(1)
+    if "restored" in args.events and not args.restore_path:
+        # The Main API has no documented trip restore endpoint
+        print("ℹ️  No --restore-path given: the 'restored' step is skipped")
+        args.events.discard("restored")
+
+    print("=" * 80)
+    print("WEBHOOK END-TO-END LATENCY")
+    print("=" * 80)
+    print(f"Main API: {args.base_url}  Gallery API: {args.gallery_url}")
+    print(f"Trips: {args.trips}  Concurrency: {args.concurrency}  Observe: {args.observe}  "
+          f"Events: {', '.join(e for e in EVENTS if e in args.events)}")
+
+    try:
+        headers, user_id = authenticate(args.base_url)
+    except AuthenticationError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    if not user_id:
+        print("❌ Could not read our member id from /api/auth/profile/")
+        sys.exit(1)
+    levels = fetch_all(args.base_url, "/api/levels/", headers)
+    meeting_points = fetch_all(args.base_url, "/api/meetingpoints/", headers)
+    if not levels:
+        print("❌ No levels available")
+        sys.exit(1)
+
+    watcher = GalleryWatcher(args.gallery_url, headers, args.min_interval, args.max_interval,
+                             poll=args.observe != "capture")
+    capture = None
+    if args.observe != "poll":
+        capture = WebhookCapture(args.capture_port, watcher, args.forward)
+        capture.start()
+        print(f"📡 Capturing webhooks on port {args.capture_port}"
+              + (f", forwarding to {args.forward}" if args.forward else ""))
+    watcher.start()
+
+    benchmark = LatencyBenchmark(args, headers, user_id, levels, meeting_points, watcher)
+    print(f"\n🚀 Running {args.trips} lifecycles (batch '{benchmark.batch}')")
+    try:
+        records = benchmark.run()
+    finally:
+        watcher.stop()
+        if capture:
+            capture.stop()
+
+    summary = summarize(records, args.straggler)
+    print_summary(summary)
+    print(f"\nPolls: {watcher.polls}" + (f"  Webhook calls captured: {capture.calls}" if capture else ""))
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "timestamp": datetime.now().isoformat(),
+            "base_url": args.base_url,
+            "gallery_url": args.gallery_url,
+            "observe": args.observe,
+            "batch": benchmark.batch,
+            "summary": summary,
+            "records": sorted(records, key=lambda r: (r["issued_at_s"], r["trip"])),
+        }, f, indent=2)
+    print(f"📄 Results saved to: {args.output}")
+    client.print_metrics()
+
+
+if __name__ == "__main__":
+    main()